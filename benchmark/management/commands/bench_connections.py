@@ -0,0 +1,183 @@
+import asyncio
+import copy
+import statistics
+import time
+from unittest import mock
+
+import httpx
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from book.models import Book
+from borrowing.models import Borrowing
+from payment.models import Payment
+from user.models import User
+
+MODES = {
+    "per_request": {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False},
+    "persistent": {"CONN_MAX_AGE": 60, "CONN_HEALTH_CHECKS": True},
+    "pool": {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": True},
+}
+SERVERS = ["wsgi", "asgi"]
+BASE_URL = "http://testserver"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the time spent opening database connections per request "
+        "without connection reuse, with persistent connections and with a "
+        "connection pool, behind the WSGI and ASGI handlers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument(
+            "--modes", nargs="+", choices=list(MODES), default=list(MODES)
+        )
+        parser.add_argument(
+            "--servers", nargs="+", choices=SERVERS, default=SERVERS
+        )
+        parser.add_argument("--pool-size", type=int, default=4)
+
+    def handle(self, *args, **options):
+        modes = options["modes"]
+        user = self._seed()
+        url = reverse("payments:payments-list")
+        headers = {"Authorize": f"Bearer {AccessToken.for_user(user)}"}
+        saved = {
+            alias: copy.deepcopy(connections[alias].settings_dict)
+            for alias in connections
+        }
+        results = []
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]
+            ):
+                for server in options["servers"]:
+                    for mode in modes:
+                        self._configure(mode, options["pool_size"])
+                        results.append(
+                            (
+                                server,
+                                mode,
+                                self._bench(
+                                    server, url, headers, options["requests"]
+                                ),
+                            )
+                        )
+        finally:
+            self._reset(saved)
+            user.delete()
+            Book.objects.filter(title="Connection benchmark").delete()
+
+        self.stdout.write(
+            f"{options['requests']} sequential requests to {url}"
+        )
+        for server, mode, (elapsed, latencies, connects) in results:
+            done = len(latencies)
+            connect_ms = sum(connects) * 1000
+            self.stdout.write(
+                f"{server} {mode}: {done / elapsed:.1f} req/s, "
+                f"p50={statistics.median(latencies) * 1000:.2f}ms, "
+                f"{len(connects)} connect() calls, "
+                f"{connect_ms / done:.2f}ms connecting per request"
+            )
+
+    @staticmethod
+    def _seed():
+        user = User.objects.create_user(
+            email="connection-bench@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Connection benchmark",
+            author="Benchmark",
+            cover="SOFT",
+            inventory=1,
+            daily_fee=1,
+        )
+        borrowing = Borrowing.objects.create(
+            user=user, book=book, expected_return_date="2099-01-01"
+        )
+        Payment.objects.create(borrowing=borrowing, money_to_pay=1)
+        return user
+
+    @staticmethod
+    def _configure(mode, pool_size):
+        for alias in connections:
+            connection = connections[alias]
+            connection.close()
+            settings_dict = connection.settings_dict
+            settings_dict.update(MODES[mode])
+            options = settings_dict.setdefault("OPTIONS", {})
+            options.pop("pool", None)
+            if mode == "pool":
+                options["pool"] = {"min_size": 1, "max_size": pool_size}
+
+    @staticmethod
+    def _reset(saved):
+        for alias, settings_dict in saved.items():
+            connection = connections[alias]
+            connection.close()
+            connection.close_pool()
+            connection.settings_dict.clear()
+            connection.settings_dict.update(settings_dict)
+
+    def _bench(self, server, url, headers, count):
+        connects = []
+        connect = type(connections["default"]).connect
+
+        def timed_connect(connection):
+            started = time.perf_counter()
+            try:
+                return connect(connection)
+            finally:
+                connects.append(time.perf_counter() - started)
+
+        with mock.patch.object(
+            type(connections["default"]), "connect", timed_connect
+        ):
+            if server == "wsgi":
+                elapsed, latencies = self._load_wsgi(url, headers, count)
+            else:
+                elapsed, latencies = asyncio.run(
+                    self._load_asgi(url, headers, count)
+                )
+        for alias in connections:
+            connections[alias].close_pool()
+        return elapsed, latencies, connects
+
+    @staticmethod
+    def _load_wsgi(url, headers, count):
+        transport = httpx.WSGITransport(app=get_wsgi_application())
+        latencies = []
+        with httpx.Client(
+            transport=transport, base_url=BASE_URL, headers=headers
+        ) as http:
+            started = time.perf_counter()
+            for _ in range(count):
+                request_started = time.perf_counter()
+                http.get(url).raise_for_status()
+                latencies.append(time.perf_counter() - request_started)
+            elapsed = time.perf_counter() - started
+        return elapsed, latencies
+
+    @staticmethod
+    async def _load_asgi(url, headers, count):
+        transport = httpx.ASGITransport(app=get_asgi_application())
+        latencies = []
+        async with httpx.AsyncClient(
+            transport=transport, base_url=BASE_URL, headers=headers
+        ) as http:
+            started = time.perf_counter()
+            for _ in range(count):
+                request_started = time.perf_counter()
+                (await http.get(url)).raise_for_status()
+                latencies.append(time.perf_counter() - request_started)
+            elapsed = time.perf_counter() - started
+        return elapsed, latencies
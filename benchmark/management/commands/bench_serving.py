@@ -0,0 +1,202 @@
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from benchmark.stubs import StripeStub
+from book.models import Book
+from borrowing.models import Borrowing
+from payment.models import Payment
+from user.models import User
+
+SERVERS = {
+    "wsgi": [
+        "gunicorn",
+        "library_core.wsgi:application",
+        "--bind",
+        "127.0.0.1:{port}",
+        "--workers",
+        "{workers}",
+        "--log-level",
+        "warning",
+    ],
+    "asgi": [
+        "uvicorn",
+        "library_core.asgi:application",
+        "--port",
+        "{port}",
+        "--workers",
+        "{workers}",
+        "--log-level",
+        "warning",
+    ],
+}
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare request throughput of the WSGI and ASGI servers at the "
+        "same worker count by renewing payments against a stubbed Stripe "
+        "that answers after a fixed latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--concurrency", type=int, default=64)
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument(
+            "--stripe-latency",
+            type=float,
+            default=0.2,
+            help="Seconds the stubbed Stripe takes to answer.",
+        )
+        parser.add_argument(
+            "--servers",
+            nargs="+",
+            choices=list(SERVERS),
+            default=list(SERVERS),
+        )
+
+    def handle(self, *args, **options):
+        user, payments = self._seed(options["concurrency"])
+        stripe = StripeStub(options["stripe_latency"])
+        stripe.start()
+        env = {
+            **os.environ,
+            "STRIPE_API_BASE": stripe.url,
+            "STRIPE_SECRET_KEY": "sk_test_bench",
+        }
+        try:
+            results = {
+                name: self._bench(name, env, user, payments, options)
+                for name in options["servers"]
+            }
+        finally:
+            stripe.stop()
+            user.delete()
+            Book.objects.filter(title="Serving benchmark").delete()
+
+        self.stdout.write(
+            f"{options['requests']} renewals, {options['workers']} workers, "
+            f"{options['concurrency']} concurrent clients, Stripe latency "
+            f"{options['stripe_latency'] * 1000:.0f}ms"
+        )
+        for name, (elapsed, latencies, failed) in results.items():
+            done = len(latencies)
+            if not done:
+                self.stdout.write(f"{name}: all {failed} requests failed")
+                continue
+            self.stdout.write(
+                f"{name}: {done / elapsed:.1f} req/s, "
+                f"p50={statistics.median(latencies) * 1000:.0f}ms "
+                f"p95={self._p95(latencies) * 1000:.0f}ms "
+                f"failed={failed}"
+            )
+
+    @staticmethod
+    def _seed(count):
+        user = User.objects.create_user(
+            email="serving-bench@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Serving benchmark",
+            author="Benchmark",
+            cover="SOFT",
+            inventory=count,
+            daily_fee=1,
+        )
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(user=user, book=book, expected_return_date="2099-01-01")
+            for _ in range(count)
+        )
+        payments = Payment.objects.bulk_create(
+            Payment(
+                borrowing=borrowing,
+                money_to_pay=1,
+                status=Payment.Status.EXPIRED,
+            )
+            for borrowing in borrowings
+        )
+        return user, payments
+
+    def _bench(self, name, env, user, payments, options):
+        port = get_free_port()
+        command = [
+            part.format(port=port, workers=options["workers"])
+            for part in SERVERS[name]
+        ]
+        server = subprocess.Popen(
+            [sys.executable, "-m", *command], env=env
+        )
+        try:
+            self._wait_for(server, port)
+            return asyncio.run(
+                self._load(
+                    f"http://127.0.0.1:{port}",
+                    str(AccessToken.for_user(user)),
+                    payments,
+                    options,
+                )
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+    @staticmethod
+    def _wait_for(server, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError("The server exited on startup")
+            try:
+                socket.create_connection(("127.0.0.1", port), 0.1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+        raise CommandError("The server did not start in time")
+
+    @staticmethod
+    async def _load(base_url, token, payments, options):
+        urls = [f"/api/payments/{payment.id}/renew/" for payment in payments]
+        pending = iter(range(options["requests"]))
+        latencies, failed = [], 0
+
+        async def client(url, http):
+            nonlocal failed
+            for _ in pending:
+                started = time.perf_counter()
+                response = await http.get(url)
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    failed += 1
+
+        async with httpx.AsyncClient(
+            base_url=base_url,
+            headers={"Authorize": f"Bearer {token}"},
+            timeout=60,
+            limits=httpx.Limits(max_connections=options["concurrency"]),
+        ) as http:
+            started = time.perf_counter()
+            await asyncio.gather(*(client(url, http) for url in urls))
+            elapsed = time.perf_counter() - started
+        return elapsed, latencies, failed
+
+    @staticmethod
+    def _p95(latencies):
+        if len(latencies) < 2:
+            return max(latencies, default=0)
+        return statistics.quantiles(latencies, n=20)[-1]
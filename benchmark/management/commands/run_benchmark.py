@@ -0,0 +1,97 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from benchmark.runner import compare, run_benchmark
+from benchmark.scenarios import SCENARIOS
+from benchmark.seeding import get_seeded_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Run scripted scenarios against seeded data with stubbed Stripe "
+        "and Telegram and store latency, throughput and queries per "
+        "request as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scenarios",
+            nargs="+",
+            choices=list(SCENARIOS),
+            default=list(SCENARIOS),
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Requests per scenario.",
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument(
+            "--stripe-latency",
+            type=float,
+            default=0.1,
+            help="Seconds the Stripe stub takes to answer.",
+        )
+        parser.add_argument(
+            "--telegram-latency",
+            type=float,
+            default=0.05,
+            help="Seconds the Telegram stub takes to answer.",
+        )
+        parser.add_argument("--skew", type=float, default=1.1)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output",
+            help="Report path, benchmark-<timestamp>.json by default.",
+        )
+        parser.add_argument(
+            "--compare",
+            metavar="BASELINE",
+            help="A previous report to compare this run with.",
+        )
+
+    def handle(self, *args, **options):
+        if not get_seeded_users().exists():
+            raise CommandError("Run `seed_benchmark` first")
+
+        baseline = None
+        if options["compare"]:
+            with open(options["compare"]) as file:
+                baseline = json.load(file)
+
+        report = run_benchmark(
+            options["scenarios"],
+            count=options["requests"],
+            concurrency=options["concurrency"],
+            stripe_latency=options["stripe_latency"],
+            telegram_latency=options["telegram_latency"],
+            skew=options["skew"],
+            seed=options["seed"],
+        )
+        if report["debug"]:
+            self.stderr.write(
+                self.style.WARNING("DEBUG is on, numbers include its overhead")
+            )
+
+        for name, result in report["scenarios"].items():
+            latency = result["latency_ms"]
+            self.stdout.write(
+                f"{name}: {result['requests']} requests, "
+                f"{result['errors']} errors, {result['rps']} req/s, "
+                f"p50={latency['p50']}ms p95={latency['p95']}ms "
+                f"p99={latency['p99']}ms, "
+                f"{result['queries_per_request']['mean']} queries/request"
+            )
+        if baseline is not None:
+            for line in compare(report, baseline):
+                self.stdout.write(line)
+
+        output = options["output"] or (
+            f"benchmark-{timezone.now():%Y%m%d-%H%M%S}.json"
+        )
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Report written to {output}"))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmark.seeding import clear, get_seeded_users, seed
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed users, books, borrowings and payments with skewed activity "
+        "for `run_benchmark`, or remove them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--books", type=int, default=5000)
+        parser.add_argument("--borrowings", type=int, default=20000)
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.1,
+            help="Zipf exponent of book popularity and user activity.",
+        )
+        parser.add_argument(
+            "--late-share",
+            type=float,
+            default=0.15,
+            help="Share of past loans returned late with a fine.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Remove previously seeded rows before seeding.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Only remove previously seeded rows.",
+        )
+
+    def handle(self, *args, **options):
+        if options["clear"] or options["reset"]:
+            clear()
+            self.stdout.write("Removed seeded benchmark data")
+            if options["clear"]:
+                return
+        elif get_seeded_users().exists():
+            raise CommandError(
+                "Benchmark data is already seeded, pass --reset to replace it"
+            )
+
+        counts = seed(
+            users=options["users"],
+            books=options["books"],
+            borrowings=options["borrowings"],
+            skew=options["skew"],
+            late_share=options["late_share"],
+            random_seed=options["seed"],
+        )
+        seeded = ", ".join(f"{count} {name}" for name, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Seeded {seeded}"))
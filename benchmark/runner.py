@@ -0,0 +1,179 @@
+"""
+Run benchmark scenarios and report latency, throughput and SQL cost.
+
+Requests go through Django's test client, so every request runs the
+full middleware and view stack while its queries are counted on the
+worker thread's own connection. Stripe and Telegram are replaced by
+local stubs for the whole run.
+"""
+import math
+import queue
+import subprocess
+import threading
+import time
+from collections import Counter
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from benchmark.scenarios import SCENARIOS
+from benchmark.stubs import StripeStub, TelegramStub
+
+
+def percentile(values: list, share: float) -> float:
+    """Nearest-rank percentile of sorted `values`."""
+    if not values:
+        return 0
+    return values[max(0, math.ceil(share * len(values)) - 1)]
+
+
+def mean(values: list) -> float:
+    return round(sum(values) / len(values), 2) if values else 0
+
+
+def summarize(samples: list[tuple], elapsed: float) -> dict:
+    latencies = sorted(latency * 1000 for latency, _, _ in samples)
+    queries = sorted(count for _, count, _ in samples)
+    statuses = Counter(str(status) for _, _, status in samples)
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, _, status in samples if status >= 400),
+        "statuses": dict(sorted(statuses.items())),
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(samples) / elapsed, 2) if elapsed else 0,
+        "latency_ms": {
+            "mean": mean(latencies),
+            "p50": round(percentile(latencies, 0.50), 2),
+            "p95": round(percentile(latencies, 0.95), 2),
+            "p99": round(percentile(latencies, 0.99), 2),
+            "max": round(latencies[-1], 2) if latencies else 0,
+        },
+        "queries_per_request": {
+            "mean": mean(queries),
+            "p95": percentile(queries, 0.95),
+            "max": queries[-1] if queries else 0,
+        },
+    }
+
+
+def run_scenario(scenario, count: int, concurrency: int) -> dict:
+    """Prepare `count` requests and perform them on `concurrency` threads."""
+    jobs = queue.SimpleQueue()
+    for request in scenario.prepare(count):
+        jobs.put(request)
+    samples, lock = [], threading.Lock()
+    stripe_calls = len(scenario.stripe.requests)
+    telegram_calls = len(scenario.telegram.requests)
+
+    def worker():
+        client = APIClient(raise_request_exception=False)
+        try:
+            while True:
+                try:
+                    request = jobs.get_nowait()
+                except queue.Empty:
+                    return
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    status = scenario.perform(client, request)
+                    latency = time.perf_counter() - started
+                with lock:
+                    samples.append((latency, len(queries), status))
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    result = summarize(samples, elapsed)
+    result["stripe_calls"] = len(scenario.stripe.requests) - stripe_calls
+    result["telegram_calls"] = (
+        len(scenario.telegram.requests) - telegram_calls
+    )
+    return result
+
+
+def get_commit() -> str | None:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+    except OSError:
+        return None
+    return output.stdout.strip() or None
+
+
+def run_benchmark(
+    scenarios: list[str],
+    count: int,
+    concurrency: int,
+    stripe_latency: float,
+    telegram_latency: float,
+    skew: float = 1.1,
+    seed: int = 0,
+) -> dict:
+    report = {
+        "created_at": timezone.now().isoformat(),
+        "commit": get_commit(),
+        "debug": settings.DEBUG,
+        "options": {
+            "requests": count,
+            "concurrency": concurrency,
+            "stripe_latency": stripe_latency,
+            "telegram_latency": telegram_latency,
+            "skew": skew,
+            "seed": seed,
+        },
+        "scenarios": {},
+    }
+    with (
+        StripeStub(stripe_latency) as stripe,
+        TelegramStub(telegram_latency) as telegram,
+        # New borrowings get their checkout session from Celery, off the
+        # request path, so the task is not run here.
+        mock.patch("borrowing.views.create_payment_checkout_session"),
+        override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]
+        ),
+    ):
+        for name in scenarios:
+            scenario = SCENARIOS[name](stripe, telegram, skew, seed)
+            report["scenarios"][name] = run_scenario(
+                scenario, count, concurrency
+            )
+    return report
+
+
+def compare(report: dict, baseline: dict) -> list[str]:
+    """One line per scenario in both reports with the relative changes."""
+
+    def change(new, old) -> str:
+        if not old:
+            return f"{old} -> {new}"
+        return f"{old} -> {new} ({(new - old) / old:+.0%})"
+
+    lines = []
+    for name, result in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        rps = change(result["rps"], before["rps"])
+        p95 = change(result["latency_ms"]["p95"], before["latency_ms"]["p95"])
+        queries = change(
+            result["queries_per_request"]["mean"],
+            before["queries_per_request"]["mean"],
+        )
+        lines.append(f"{name}: rps {rps}, p95 ms {p95}, queries {queries}")
+    return lines
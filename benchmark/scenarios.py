@@ -0,0 +1,285 @@
+"""
+Scripted benchmark scenarios.
+
+A scenario prepares its requests up front, outside the measurement,
+then performs them one at a time through the full middleware stack.
+Every prepared request can be performed exactly once, so scenarios
+that change state, like borrowing or paying, stay valid at any
+concurrency.
+"""
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from benchmark.seeding import (
+    ADMIN_EMAIL,
+    SEED_CHAT_PREFIX,
+    get_seeded_books,
+    get_seeded_users,
+    zipf_weights,
+)
+from borrowing.models import Borrowing, UserLoanState
+from borrowing.services import record_loans_opened
+from notification.dispatcher import dispatch_notifications
+from notification.models import Notification
+from payment.models import Payment
+from payment.services import create_pending_payments
+from user.models import User
+from user.serializers import TokenObtainPairSerializer
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    data: dict = None
+    token: str = None
+
+
+class Scenario:
+    name = None
+
+    def __init__(self, stripe, telegram, skew: float = 1.1, seed: int = 0):
+        self.stripe = stripe
+        self.telegram = telegram
+        self.skew = skew
+        self.rng = random.Random(seed)
+        self.tokens = {}
+
+    def prepare(self, count: int) -> list:
+        """Build up to `count` requests."""
+        raise NotImplementedError
+
+    def perform(self, client, request: Request) -> int:
+        """Send one prepared request and return its status code."""
+        headers = {}
+        if request.token:
+            headers["HTTP_AUTHORIZE"] = f"Bearer {request.token}"
+        send = getattr(client, request.method.lower())
+        if request.data is None:
+            return send(request.path, **headers).status_code
+        return send(
+            request.path, request.data, format="json", **headers
+        ).status_code
+
+    def get_token(self, user) -> str:
+        if user.pk not in self.tokens:
+            # Issued as on login, with the claims of stateless reads
+            refresh = TokenObtainPairSerializer.get_token(user)
+            self.tokens[user.pk] = str(refresh.access_token)
+        return self.tokens[user.pk]
+
+    def pick_books(self, count: int) -> list[int]:
+        """Seeded book ids drawn by popularity."""
+        book_ids = list(get_seeded_books().values_list("pk", flat=True))
+        return self.rng.choices(
+            book_ids,
+            cum_weights=zipf_weights(len(book_ids), self.skew),
+            k=count,
+        )
+
+    def pick_users(self, count: int, **filters) -> list[User]:
+        """Distinct seeded users drawn by activity."""
+        users = list(get_seeded_users().filter(**filters))
+        weights = zipf_weights(len(users), self.skew)
+        picked = {}
+        # Bounded, as the tail of a skewed draw is reached only rarely.
+        for _ in range(count * 20 if users else 0):
+            if len(picked) == count:
+                break
+            (user,) = self.rng.choices(users, cum_weights=weights)
+            picked[user.pk] = user
+        return list(picked.values())
+
+
+class BrowseScenario(Scenario):
+    """Anonymous catalog browsing: book pages, details and searches."""
+
+    name = "browse"
+
+    def prepare(self, count):
+        pages = max(1, get_seeded_books().count() // 10)
+        requests = []
+        for book_id in self.pick_books(count):
+            roll = self.rng.random()
+            if roll < 0.6:
+                path = reverse("books:books-detail", args=[book_id])
+            elif roll < 0.9:
+                page = min(pages, 1 + int(self.rng.expovariate(0.5)))
+                path = f"{reverse('books:books-list')}?page={page}"
+            else:
+                path = f"{reverse('books:books-list')}?search=" + (
+                    self.rng.choice(["river", "silent empire", "moon"])
+                )
+            requests.append(Request("GET", path))
+        return requests
+
+
+class BorrowScenario(Scenario):
+    """Readers without pending payments borrow a popular book each."""
+
+    name = "borrow"
+
+    def prepare(self, count):
+        users = self.pick_users(count, loan_state__pending_payments=0)
+        active = dict(
+            UserLoanState.objects.filter(
+                pk__in=[user.pk for user in users]
+            ).values_list("pk", "active_book_ids")
+        )
+        due = timezone.now().date() + timedelta(days=14)
+        requests = []
+        for user, book_id in zip(users, self.pick_books(len(users))):
+            if book_id in active.get(user.pk, []):
+                continue
+            requests.append(
+                Request(
+                    "POST",
+                    reverse("borrowings:borrowings-list"),
+                    {"book": book_id, "expected_return_date": str(due)},
+                    self.get_token(user),
+                )
+            )
+        return requests
+
+
+class ReturnWithFineScenario(Scenario):
+    """Overdue books are returned, opening a fine checkout on Stripe."""
+
+    name = "return_fine"
+
+    @transaction.atomic
+    def prepare(self, count):
+        users = self.pick_users(count)
+        today = timezone.now().date()
+        loans = Borrowing.objects.bulk_create(
+            Borrowing(
+                user=user,
+                book_id=book_id,
+                expected_return_date=today + timedelta(days=1),
+            )
+            for user, book_id in zip(users, self.pick_books(len(users)))
+        )
+        # Loans start today on insert; back-date them past their due date
+        for loan in loans:
+            loan.borrow_date = today - timedelta(days=17)
+            loan.expected_return_date = today - timedelta(days=3)
+        Borrowing.objects.bulk_update(
+            loans, ["borrow_date", "expected_return_date"]
+        )
+        record_loans_opened(loans)
+        return [
+            Request(
+                "POST",
+                reverse(
+                    "borrowings:borrowings-return-borrowing-book",
+                    args=[loan.pk],
+                ),
+                token=self.get_token(loan.user),
+            )
+            for loan in loans
+        ]
+
+
+class PaymentSuccessScenario(Scenario):
+    """Readers come back from a paid Stripe checkout."""
+
+    name = "payment_success"
+
+    @transaction.atomic
+    def prepare(self, count):
+        users = self.pick_users(count)
+        loans = []
+        for user in users:
+            loan = (
+                Borrowing.objects.select_related("book", "user")
+                .filter(user=user)
+                .order_by("-pk")
+                .first()
+            )
+            if loan is not None:
+                loans.append(loan)
+
+        payments = create_pending_payments(loans, Payment.Type.PAYMENT)
+        for payment in payments:
+            payment.session_id = f"cs_bench_{payment.pk}"
+            self.stripe.add_session(
+                payment.session_id, status="complete", payment_status="paid"
+            )
+        Payment.objects.bulk_update(payments, ["session_id"])
+        return [
+            Request(
+                "GET",
+                f"{reverse('payments:payments-payment-success')}"
+                f"?session_id={payment.session_id}",
+                token=self.get_token(payment.borrowing.user),
+            )
+            for payment in payments
+        ]
+
+
+class AdminListScenario(Scenario):
+    """An admin pages through borrowings and payments."""
+
+    name = "admin_list"
+
+    def prepare(self, count):
+        admin = User.objects.get(email=ADMIN_EMAIL)
+        readers = self.pick_users(10)
+        requests = []
+        for _ in range(count):
+            page = 1 + int(self.rng.expovariate(0.3))
+            roll = self.rng.random()
+            if roll < 0.5:
+                path = f"{reverse('borrowings:borrowings-list')}?page={page}"
+            elif roll < 0.8:
+                path = f"{reverse('payments:payments-list')}?page={page}"
+            else:
+                path = (
+                    f"{reverse('borrowings:borrowings-list')}"
+                    f"?user_id={self.rng.choice(readers).pk}"
+                )
+            requests.append(Request("GET", path, token=self.get_token(admin)))
+        return requests
+
+
+class NotifyScenario(Scenario):
+    """
+    The notification dispatcher drains the outbox to Telegram. Each run
+    sends up to `NOTIFICATION_BATCH_SIZE` rows over a few chats.
+    """
+
+    name = "notify"
+    chats = 10
+
+    def prepare(self, count):
+        Notification.objects.bulk_create(
+            Notification(
+                chat_id=f"{SEED_CHAT_PREFIX}{i % self.chats}",
+                message=f"Benchmark notification {i}",
+            )
+            for i in range(count * settings.NOTIFICATION_BATCH_SIZE)
+        )
+        return [None] * count
+
+    def perform(self, client, request):
+        stats = dispatch_notifications()
+        return 500 if stats["failed"] else 200
+
+
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in [
+        BrowseScenario,
+        BorrowScenario,
+        ReturnWithFineScenario,
+        PaymentSuccessScenario,
+        AdminListScenario,
+        NotifyScenario,
+    ]
+}
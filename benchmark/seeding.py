@@ -0,0 +1,240 @@
+"""
+Seed users, books, borrowings and payments for benchmarks.
+
+Activity is skewed the way a real library's is: book popularity and
+user activity both follow a Zipf distribution, so a few books and
+readers account for most loans. Seeded rows are recognisable by
+their prefixes and domain and removed by `clear`.
+"""
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from book.models import Book
+from book.signals import BOOKS_LIST_NAMESPACE
+from borrowing.models import Borrowing
+from borrowing.services import refresh_loan_states
+from library_core.cache import bump_namespace
+from notification.models import Notification
+from payment.models import Payment
+from user.models import User
+
+SEED_EMAIL_DOMAIN = "bench.example.com"
+SEED_TITLE_PREFIX = "Bench"
+SEED_CHAT_PREFIX = "bench-"
+SEED_PASSWORD = "bench-password"
+ADMIN_EMAIL = f"admin@{SEED_EMAIL_DOMAIN}"
+BATCH_SIZE = 2000
+
+WORDS = (
+    "shadow river winter garden silent empire golden night stone forest "
+    "secret ocean crown fire glass mountain hidden war city dream island "
+    "storm last journey broken light memory lost kingdom song wolf moon"
+).split()
+NAMES = (
+    "anna james maria john elena david sofia peter olga thomas clara "
+    "smith garcia novak rossi kowalski brown dubois tanaka silva petrov"
+).split()
+
+
+def zipf_weights(count: int, skew: float) -> list[float]:
+    """Cumulative weights giving rank `i` a share of 1 / (i + 1) ** skew."""
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+def get_seeded_users():
+    return User.objects.filter(
+        email__endswith=f"@{SEED_EMAIL_DOMAIN}", is_staff=False
+    ).order_by("pk")
+
+
+def get_seeded_books():
+    return Book.objects.filter(title__startswith=SEED_TITLE_PREFIX).order_by(
+        "pk"
+    )
+
+
+def build_loan(rng, today, days_ago, late_share):
+    """Dates of a loan started `days_ago`, returned or still active."""
+    borrow_date = today - timedelta(days=days_ago)
+    expected = borrow_date + timedelta(days=rng.randint(7, 28))
+    if expected >= today:
+        returned = rng.random() < 0.3
+        actual = borrow_date + timedelta(
+            days=rng.randint(0, (today - borrow_date).days)
+        )
+    else:
+        returned = rng.random() < 0.95
+        late = rng.random() < late_share
+        actual = (
+            expected + timedelta(days=rng.randint(1, 20))
+            if late
+            else borrow_date + timedelta(days=rng.randint(1, 7))
+        )
+        actual = min(actual, today)
+    return borrow_date, expected, actual if returned else None
+
+
+def build_payments(rng, loans) -> list[Payment]:
+    """
+    A payment per loan, mostly paid, and a fine per late return. A few
+    payments of active loans are still pending or expired.
+    """
+    payments = []
+    for loan in loans:
+        created_at = timezone.make_aware(
+            datetime.combine(loan.borrow_date, time(12))
+        )
+        status = Payment.Status.PAID
+        if loan.actual_return_date is None:
+            (status,) = rng.choices(
+                [
+                    Payment.Status.PAID,
+                    Payment.Status.PENDING,
+                    Payment.Status.EXPIRED,
+                ],
+                weights=[92, 5, 3],
+            )
+        payments.append(
+            Payment(
+                borrowing=loan,
+                type=Payment.Type.PAYMENT,
+                status=status,
+                money_to_pay=loan.get_payment_amount(),
+                created_at=created_at,
+                paid_at=created_at if status == Payment.Status.PAID else None,
+            )
+        )
+
+        if loan.actual_return_date and loan.is_overdue:
+            fined_at = timezone.make_aware(
+                datetime.combine(loan.actual_return_date, time(12))
+            )
+            paid = rng.random() < 0.85
+            payments.append(
+                Payment(
+                    borrowing=loan,
+                    type=Payment.Type.FINE,
+                    status=(
+                        Payment.Status.PAID if paid else Payment.Status.PENDING
+                    ),
+                    money_to_pay=loan.get_fine_amount(),
+                    created_at=fined_at,
+                    paid_at=fined_at if paid else None,
+                )
+            )
+    return payments
+
+
+@transaction.atomic
+def seed(
+    users: int,
+    books: int,
+    borrowings: int,
+    skew: float = 1.1,
+    late_share: float = 0.15,
+    random_seed: int = 0,
+) -> dict:
+    """Insert the rows and return how many of each were created."""
+    rng = random.Random(random_seed)
+    today = timezone.now().date()
+    password = make_password(SEED_PASSWORD)
+
+    User.objects.create_superuser(email=ADMIN_EMAIL, password=SEED_PASSWORD)
+    readers = User.objects.bulk_create(
+        (
+            User(email=f"reader{i}@{SEED_EMAIL_DOMAIN}", password=password)
+            for i in range(users)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    catalog = Book.objects.bulk_create(
+        (
+            Book(
+                title=" ".join(
+                    [SEED_TITLE_PREFIX, *rng.sample(WORDS, 3), str(i)]
+                ).title(),
+                author=" ".join(rng.sample(NAMES, 2)).title(),
+                cover=rng.choice(["HARD", "SOFT"]),
+                inventory=rng.randint(1, 20),
+                daily_fee=Decimal(rng.randint(50, 500)) / 100,
+            )
+            for i in range(books)
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+    user_weights = zipf_weights(len(readers), skew)
+    book_weights = zipf_weights(len(catalog), skew)
+    loans, active_pairs = [], set()
+    for _ in range(borrowings):
+        (user,) = rng.choices(readers, cum_weights=user_weights)
+        (book,) = rng.choices(catalog, cum_weights=book_weights)
+        borrow_date, expected, actual = build_loan(
+            rng, today, rng.randint(0, 365), late_share
+        )
+        if actual is None and (user.pk, book.pk) in active_pairs:
+            actual = min(expected, today)
+        if actual is None:
+            active_pairs.add((user.pk, book.pk))
+        loans.append(
+            Borrowing(
+                user=user,
+                book=book,
+                borrow_date=borrow_date,
+                expected_return_date=expected,
+                actual_return_date=actual,
+            )
+        )
+
+    # borrow_date is set to today on insert, so loans go in open and due
+    # tomorrow to pass the date checks, then get their seeded dates.
+    loan_dates = [
+        (loan.borrow_date, loan.expected_return_date, loan.actual_return_date)
+        for loan in loans
+    ]
+    for loan in loans:
+        loan.expected_return_date = today + timedelta(days=1)
+        loan.actual_return_date = None
+    loans = Borrowing.objects.bulk_create(loans, batch_size=BATCH_SIZE)
+    for loan, (borrow_date, expected, actual) in zip(loans, loan_dates):
+        loan.borrow_date = borrow_date
+        loan.expected_return_date = expected
+        loan.actual_return_date = actual
+    Borrowing.objects.bulk_update(
+        loans,
+        ["borrow_date", "expected_return_date", "actual_return_date"],
+        batch_size=BATCH_SIZE,
+    )
+
+    payments = build_payments(rng, loans)
+    created = [payment.created_at for payment in payments]
+    payments = Payment.objects.bulk_create(payments, batch_size=BATCH_SIZE)
+    for payment, created_at in zip(payments, created):
+        payment.created_at = created_at
+    Payment.objects.bulk_update(
+        payments, ["created_at"], batch_size=BATCH_SIZE
+    )
+
+    refresh_loan_states(*(user.pk for user in readers))
+    transaction.on_commit(lambda: bump_namespace(BOOKS_LIST_NAMESPACE))
+    return {
+        "users": len(readers),
+        "books": len(catalog),
+        "borrowings": len(loans),
+        "payments": len(payments),
+    }
+
+
+@transaction.atomic
+def clear() -> None:
+    """Delete every seeded row; loans and payments go with their users."""
+    User.objects.filter(email__endswith=f"@{SEED_EMAIL_DOMAIN}").delete()
+    get_seeded_books().delete()
+    Notification.objects.filter(chat_id__startswith=SEED_CHAT_PREFIX).delete()
+    transaction.on_commit(lambda: bump_namespace(BOOKS_LIST_NAMESPACE))
@@ -0,0 +1,149 @@
+"""
+Local stand-ins for the Stripe and Telegram APIs.
+
+Each stub answers after a configurable latency, so benchmarks measure
+the application with realistic third-party delays and no network.
+Used as a context manager, a stub also points the client library at
+itself for the duration of the block.
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs
+
+import stripe
+
+from notification.telegram_bot import TelegramBot
+
+
+class ThreadingStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Concurrent benchmark clients overflow the default backlog of 5.
+    request_queue_size = 128
+
+
+class StubServer:
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.requests = []
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.reply("GET")
+
+            def do_POST(self):
+                self.reply("POST")
+
+            def reply(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                data = parse_qs(self.rfile.read(length).decode())
+                with server.lock:
+                    server.requests.append((method, self.path))
+                time.sleep(server.latency)
+
+                code, payload = server.handle(method, self.path, data)
+                body = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingStubServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self.active_patches = []
+
+    def handle(self, method: str, path: str, data: dict) -> tuple:
+        """Return the status code and JSON payload for a request."""
+        raise NotImplementedError
+
+    def get_patches(self) -> list:
+        """Patches pointing the client library at this stub."""
+        return []
+
+    def start(self) -> None:
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        self.active_patches = self.get_patches()
+        for patch in self.active_patches:
+            patch.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for patch in self.active_patches:
+            patch.stop()
+        self.stop()
+
+
+class StripeStub(StubServer):
+    """Create and retrieve checkout sessions kept in memory."""
+
+    def __init__(self, latency: float = 0):
+        super().__init__(latency)
+        self.sessions = {}
+
+    def add_session(self, session_id: str, **fields) -> None:
+        self.sessions[session_id] = {
+            "status": "open",
+            "payment_status": "unpaid",
+            "url": f"https://checkout.stripe.com/c/{session_id}",
+            **fields,
+        }
+
+    def handle(self, method, path, data):
+        path = path.split("?")[0].rstrip("/")
+        if method == "POST" and path == "/v1/checkout/sessions":
+            session_id = f"cs_stub_{uuid.uuid4().hex}"
+            self.add_session(session_id)
+        else:
+            session_id = path.rsplit("/", 1)[-1]
+
+        session = self.sessions.get(session_id)
+        if session is None:
+            return 404, {"error": {
+                "type": "invalid_request_error",
+                "message": f"No such checkout.session: {session_id}",
+            }}
+        return 200, {"id": session_id, "object": "checkout.session", **session}
+
+    def get_patches(self):
+        return [
+            mock.patch.object(stripe, "api_base", self.url),
+            mock.patch.object(stripe, "api_key", "sk_test_stub"),
+        ]
+
+
+class TelegramStub(StubServer):
+    """Accept every `sendMessage` and keep the messages per chat."""
+
+    def __init__(self, latency: float = 0):
+        super().__init__(latency)
+        self.messages = {}
+
+    def handle(self, method, path, data):
+        if not path.endswith("/sendMessage"):
+            return 404, {"ok": False, "description": "Not Found"}
+
+        chat_id = data.get("chat_id", [""])[0]
+        with self.lock:
+            self.messages.setdefault(chat_id, []).append(
+                data.get("text", [""])[0]
+            )
+        return 200, {"ok": True, "result": {"chat": {"id": chat_id}}}
+
+    def get_patches(self):
+        return [mock.patch.object(TelegramBot, "API_URL", self.url)]
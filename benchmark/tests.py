@@ -0,0 +1,111 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from benchmark.runner import compare, run_benchmark
+from benchmark.scenarios import SCENARIOS
+from benchmark.seeding import clear, get_seeded_books, get_seeded_users, seed
+from borrowing.models import Borrowing, UserLoanState
+from payment.models import Payment
+from user.models import User
+
+
+class BenchmarkTests(TransactionTestCase):
+    # Scenarios run on worker threads with their own connections, which
+    # only see committed rows.
+
+    def setUp(self):
+        self.counts = seed(users=40, books=30, borrowings=300)
+
+    def test_seed_is_skewed_and_consistent(self):
+        self.assertEqual(self.counts["users"], 40)
+        self.assertEqual(get_seeded_books().count(), 30)
+        self.assertGreaterEqual(self.counts["payments"], 300)
+
+        loans = Borrowing.objects.filter(book__in=get_seeded_books())
+        top_book = get_seeded_books().first()
+        self.assertGreater(
+            loans.filter(book=top_book).count(), loans.count() / 30 * 3
+        )
+        today = timezone.now().date()
+        self.assertFalse(loans.filter(borrow_date__gt=today).exists())
+        self.assertFalse(
+            Payment.objects.filter(
+                type=Payment.Type.FINE, borrowing__actual_return_date=None
+            ).exists()
+        )
+        for state in UserLoanState.objects.filter(
+            user__in=get_seeded_users()
+        ):
+            self.assertEqual(
+                state.active_loans,
+                loans.filter(
+                    user=state.user, actual_return_date__isnull=True
+                ).count(),
+            )
+
+    def test_scenarios_report_latency_and_queries(self):
+        report = run_benchmark(
+            list(SCENARIOS),
+            count=4,
+            concurrency=2,
+            stripe_latency=0,
+            telegram_latency=0,
+        )
+
+        scenarios = report["scenarios"]
+        self.assertEqual(list(scenarios), list(SCENARIOS))
+        for name, result in scenarios.items():
+            self.assertGreater(result["requests"], 0, name)
+            self.assertEqual(result["errors"], 0, (name, result["statuses"]))
+            self.assertLessEqual(
+                result["latency_ms"]["p50"], result["latency_ms"]["p99"]
+            )
+        self.assertGreater(
+            scenarios["borrow"]["queries_per_request"]["max"], 0
+        )
+        self.assertEqual(scenarios["return_fine"]["stripe_calls"], 4)
+        self.assertEqual(scenarios["payment_success"]["stripe_calls"], 4)
+        self.assertEqual(scenarios["browse"]["stripe_calls"], 0)
+        self.assertGreater(scenarios["notify"]["telegram_calls"], 0)
+        self.assertEqual(
+            Payment.objects.filter(
+                session_id__startswith="cs_bench_",
+                status=Payment.Status.PAID,
+            ).count(),
+            4,
+        )
+
+        lines = compare(report, report)
+        self.assertEqual(len(lines), len(SCENARIOS))
+        self.assertIn("(+0%)", lines[0])
+
+    def test_clear_removes_seeded_rows(self):
+        clear()
+        self.assertFalse(get_seeded_users().exists())
+        self.assertFalse(get_seeded_books().exists())
+        self.assertFalse(Borrowing.objects.exists())
+
+
+class ConnectionBenchmarkTests(TransactionTestCase):
+    def test_persistent_connections_are_reused(self):
+        settings_dict = dict(connection.settings_dict)
+        out = StringIO()
+
+        call_command(
+            "bench_connections",
+            requests=3,
+            modes=["per_request", "persistent"],
+            servers=["wsgi"],
+            stdout=out,
+        )
+
+        output = out.getvalue()
+        self.assertIn("wsgi per_request: ", output)
+        self.assertIn(" 3 connect() calls", output)
+        self.assertIn(" 1 connect() calls", output)
+        self.assertEqual(connection.settings_dict, settings_dict)
+        self.assertFalse(User.objects.exists())
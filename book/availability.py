@@ -0,0 +1,175 @@
+"""
+Live per-book availability mirrored in Redis.
+
+`Book.inventory` in Postgres stays the source of truth and decides
+every reservation. Once a stock change commits, the same delta is
+applied to the mirror by a Lua script that only touches counters that
+exist, so a partial delta never creates one. Counters missing on read
+are loaded from the database, and `reconcile_availability` repairs any
+drift left by lost updates.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from book.models import Book
+
+logger = logging.getLogger(__name__)
+
+# KEYS: counters, ARGV: a delta per counter. Counters are floored at 0.
+ADJUST_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call("EXISTS", key) == 1 then
+        if redis.call("INCRBY", key, ARGV[i]) < 0 then
+            redis.call("SET", key, 0, "KEEPTTL")
+        end
+    end
+end
+"""
+# KEYS: counters, ARGV: the values read before and the values to store,
+# so a counter that changed in between is left for the next run.
+REPAIR_SCRIPT = """
+local repaired = 0
+for i, key in ipairs(KEYS) do
+    if redis.call("GET", key) == ARGV[i] then
+        redis.call("SET", key, ARGV[#KEYS + i], "EX", ARGV[#ARGV])
+        repaired = repaired + 1
+    end
+end
+return repaired
+"""
+
+
+def get_redis():
+    return get_redis_connection("default")
+
+
+def availability_key(book_id: int) -> str:
+    return cache.make_key(f"availability:{book_id}")
+
+
+def load_availability(book_ids) -> dict[int, int]:
+    return dict(
+        Book.objects.filter(pk__in=book_ids).values_list("pk", "inventory")
+    )
+
+
+def get_availability(book_ids) -> dict[int, int]:
+    """
+    Available copies per book id, read from Redis in one round trip.
+    Counters that are missing are loaded from the database and stored
+    unless set meanwhile. Unknown ids are left out, the rest keep the
+    order they were given in.
+    """
+    book_ids = list(dict.fromkeys(book_ids))
+    if not book_ids:
+        return {}
+    try:
+        values = get_redis().mget([availability_key(pk) for pk in book_ids])
+    except RedisError:
+        logger.warning("Reading availability from the database instead")
+        return load_availability(book_ids)
+
+    available = {
+        book_id: int(value)
+        for book_id, value in zip(book_ids, values)
+        if value is not None
+    }
+    missing = [book_id for book_id in book_ids if book_id not in available]
+    if missing:
+        loaded = load_availability(missing)
+        store_availability(loaded, only_missing=True)
+        available.update(loaded)
+    return {pk: available[pk] for pk in book_ids if pk in available}
+
+
+def store_availability(
+    inventories: dict[int, int], only_missing: bool = False
+) -> None:
+    if not inventories:
+        return
+    try:
+        with get_redis().pipeline(transaction=False) as pipeline:
+            for book_id, inventory in inventories.items():
+                pipeline.set(
+                    availability_key(book_id),
+                    inventory,
+                    ex=settings.BOOK_AVAILABILITY_TIMEOUT,
+                    nx=only_missing,
+                )
+            pipeline.execute()
+    except RedisError:
+        logger.exception("Could not store availability")
+
+
+def adjust_availability(deltas: dict[int, int]) -> None:
+    """Add `deltas` to the mirrored counters once the transaction commits."""
+    deltas = {book_id: delta for book_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    def adjust():
+        try:
+            redis = get_redis()
+            redis.register_script(ADJUST_SCRIPT)(
+                keys=list(map(availability_key, deltas)),
+                args=list(deltas.values()),
+                client=redis,
+            )
+        except RedisError:
+            logger.exception("Could not adjust availability")
+
+    transaction.on_commit(adjust)
+
+
+def set_availability(inventories: dict[int, int]) -> None:
+    """Overwrite mirrored counters once the transaction commits."""
+    transaction.on_commit(lambda: store_availability(inventories))
+
+
+def forget_availability(*book_ids: int) -> None:
+    def forget():
+        try:
+            get_redis().delete(*map(availability_key, book_ids))
+        except RedisError:
+            logger.exception("Could not forget availability")
+
+    transaction.on_commit(forget)
+
+
+def reconcile_availability(batch_size: int = 1000) -> int:
+    """
+    Compare the mirrored counters with `Book.inventory` batch by batch
+    and overwrite those that drifted. Missing counters are left to be
+    loaded on read. Returns the number of counters repaired.
+    """
+    redis = get_redis()
+    repair = redis.register_script(REPAIR_SCRIPT)
+    books = Book.objects.order_by("pk").values_list("pk", "inventory")
+    repaired, last_pk = 0, 0
+    while batch := list(books.filter(pk__gt=last_pk)[:batch_size]):
+        last_pk = batch[-1][0]
+        keys = [availability_key(book_id) for book_id, _ in batch]
+        drifted = [
+            (key, stored, inventory)
+            for key, stored, (_, inventory) in zip(
+                keys, redis.mget(keys), batch
+            )
+            if stored is not None and int(stored) != inventory
+        ]
+        if drifted:
+            keys, stored, inventories = zip(*drifted)
+            repaired += repair(
+                keys=list(keys),
+                args=[
+                    *stored,
+                    *inventories,
+                    settings.BOOK_AVAILABILITY_TIMEOUT,
+                ],
+                client=redis,
+            )
+    return repaired
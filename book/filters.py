@@ -0,0 +1,67 @@
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db.models import Q
+from django.db.models.functions import Greatest
+from rest_framework.filters import BaseFilterBackend
+
+from book.models import SEARCH_CONFIG, get_search_vector
+
+
+def search_books(queryset, term: str):
+    """
+    Filter `queryset` to books matching `term` and order them by rank.
+
+    A book matches when the full-text query hits the `book_search_idx`
+    vector or when the term is trigram-similar to a word of the title or
+    author, which tolerates typos. Each condition is backed by its own
+    GIN index, so PostgreSQL answers the OR with a bitmap index scan.
+    """
+    vector = get_search_vector()
+    query = SearchQuery(term, config=SEARCH_CONFIG, search_type="websearch")
+    return (
+        queryset.annotate(search=vector)
+        .filter(
+            Q(search=query)
+            | Q(title__trigram_word_similar=term)
+            | Q(author__trigram_word_similar=term)
+        )
+        .annotate(
+            rank=SearchRank(vector, query)
+            + Greatest(
+                TrigramWordSimilarity(term, "title"),
+                TrigramWordSimilarity(term, "author"),
+            )
+        )
+        .order_by("-rank", "id")
+    )
+
+
+class BookSearchFilter(BaseFilterBackend):
+    """Search books by title and author with `?search=`."""
+
+    search_param = "search"
+
+    def get_search_term(self, request) -> str:
+        return request.query_params.get(self.search_param, "").strip()
+
+    def filter_queryset(self, request, queryset, view):
+        term = self.get_search_term(request)
+        if not term:
+            return queryset
+
+        return search_books(queryset, term)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.search_param,
+                "required": False,
+                "in": "query",
+                "description": "Search books by title and author, "
+                "tolerating typos. Results are ordered by relevance.",
+                "schema": {"type": "string"},
+            }
+        ]
@@ -0,0 +1,116 @@
+import queue
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from book.models import Book
+from book.services import release_copy, reserve_copy
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer a single book with concurrent borrows and returns and "
+        "check that the final inventory is exact."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--borrows", type=int, default=2000)
+        parser.add_argument("--returns", type=int, default=500)
+        parser.add_argument("--inventory", type=int, default=1000)
+        parser.add_argument(
+            "--mode",
+            choices=["atomic", "rmw"],
+            default="atomic",
+            help="'rmw' replays the old read-modify-write code for "
+            "comparison.",
+        )
+
+    def handle(self, *args, **options):
+        book = Book.objects.create(
+            title="Inventory benchmark",
+            author="Benchmark",
+            cover="SOFT",
+            inventory=options["inventory"],
+            daily_fee=1,
+        )
+        reserve, release = self._get_operations(options["mode"])
+        lock = threading.Lock()
+        counters = {"reserved": 0, "rejected": 0}
+
+        def borrow():
+            ok = reserve(book.id)
+            with lock:
+                counters["reserved" if ok else "rejected"] += 1
+
+        def give_back():
+            release(book.id)
+
+        operations = (
+            [borrow] * options["borrows"] + [give_back] * options["returns"]
+        )
+        jobs = queue.Queue()
+        for job in operations:
+            jobs.put(job)
+        total = len(operations)
+
+        def worker():
+            try:
+                while True:
+                    try:
+                        job = jobs.get_nowait()
+                    except queue.Empty:
+                        return
+                    job()
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker)
+            for _ in range(options["threads"])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        book.refresh_from_db()
+        expected = (
+            options["inventory"] - counters["reserved"] + options["returns"]
+        )
+        book.delete()
+
+        self.stdout.write(
+            f"{total} operations on {options['threads']} threads "
+            f"in {elapsed:.2f}s ({total / elapsed:.0f} ops/s)\n"
+            f"reserved={counters['reserved']} "
+            f"rejected={counters['rejected']} "
+            f"final inventory={book.inventory} expected={expected}"
+        )
+        if book.inventory != expected:
+            raise CommandError("Inventory drifted under contention")
+        self.stdout.write(self.style.SUCCESS("Inventory is exact"))
+
+    @staticmethod
+    def _get_operations(mode):
+        if mode == "atomic":
+            return reserve_copy, release_copy
+
+        def reserve(book_id):
+            book = Book.objects.get(pk=book_id)
+            if book.inventory <= 0:
+                return False
+            book.inventory -= 1
+            book.save(update_fields=["inventory"])
+            return True
+
+        def release(book_id):
+            book = Book.objects.get(pk=book_id)
+            book.inventory += 1
+            book.save(update_fields=["inventory"])
+
+        return reserve, release
@@ -0,0 +1,107 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from book.filters import search_books
+from book.models import Book
+
+WORDS = (
+    "shadow river winter garden silent empire golden night stone forest "
+    "secret ocean crown fire glass mountain hidden war city dream island "
+    "storm last journey broken light memory lost kingdom song wolf moon "
+    "house letter road blood mirror winds summer children star paper"
+).split()
+FIRST_NAMES = (
+    "anna james maria john elena david sofia peter olga thomas clara "
+    "victor irene samuel laura mark nina oscar helen paul"
+).split()
+LAST_NAMES = (
+    "smith ivanenko garcia novak müller rossi kowalski brown dubois "
+    "tanaka silva petrov jensen moreau walker fischer kovacs larsen"
+).split()
+
+SEED_SQL = """
+    INSERT INTO book_book (title, author, cover, inventory, daily_fee)
+    SELECT
+        initcap(
+            w[1 + floor(random() * cardinality(w))::int] || ' '
+            || w[1 + floor(random() * cardinality(w))::int] || ' '
+            || w[1 + floor(random() * cardinality(w))::int]
+        ) || ' ' || n,
+        initcap(
+            f[1 + floor(random() * cardinality(f))::int] || ' '
+            || l[1 + floor(random() * cardinality(l))::int]
+        ),
+        CASE WHEN random() < 0.5 THEN 'HARD' ELSE 'SOFT' END,
+        floor(random() * 10)::int,
+        1 + round((random() * 4)::numeric, 2)
+    FROM generate_series(1, %s) AS n,
+        (SELECT %s::text[] AS w, %s::text[] AS f, %s::text[] AS l) AS words
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large catalog, run book searches against it and check "
+        "that every query plan is served by the search indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=1_000_000)
+        parser.add_argument(
+            "--terms",
+            nargs="+",
+            default=["silent empire", "shadw rivr", "kowalski", "moon"],
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the seeded books instead of deleting them.",
+        )
+
+    def handle(self, *args, **options):
+        last_id = Book.objects.order_by("-id").values_list(
+            "id", flat=True
+        ).first() or 0
+
+        started = time.perf_counter()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                SEED_SQL,
+                [options["books"], WORDS, FIRST_NAMES, LAST_NAMES],
+            )
+            cursor.execute("ANALYZE book_book")
+        self.stdout.write(
+            f"Seeded {options['books']} books "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+        seq_scans = []
+        try:
+            for term in options["terms"]:
+                queryset = search_books(Book.objects.all(), term)[:10]
+                plan = queryset.explain(analyze=True, buffers=True)
+
+                started = time.perf_counter()
+                results = list(queryset)
+                elapsed = (time.perf_counter() - started) * 1000
+
+                self.stdout.write(
+                    f"\n{term!r}: {len(results)} results in "
+                    f"{elapsed:.1f}ms\n{plan}"
+                )
+                if "Seq Scan on book_book" in plan:
+                    seq_scans.append(term)
+        finally:
+            if not options["keep"]:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "DELETE FROM book_book WHERE id > %s", [last_id]
+                    )
+
+        if seq_scans:
+            raise CommandError(
+                f"Sequential scan used for: {', '.join(seq_scans)}"
+            )
+        self.stdout.write(self.style.SUCCESS("All searches used indexes"))
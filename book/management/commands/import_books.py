@@ -0,0 +1,45 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from book.importer import FORMATS, IMPORT_BATCH_SIZE, import_books
+
+
+class Command(BaseCommand):
+    help = (
+        "Import books from a CSV or JSON Lines file, upserting on "
+        "(title, author, cover)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=Path)
+        parser.add_argument(
+            "--format",
+            choices=FORMATS,
+            help="File format; taken from the file extension by default.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=IMPORT_BATCH_SIZE
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or path.suffix.lstrip(".").lower()
+        if file_format not in FORMATS:
+            raise CommandError(
+                f"Unknown format {file_format!r}; use --format"
+            )
+
+        with path.open(encoding="utf-8", newline="") as stream:
+            stats = import_books(stream, file_format, options["batch_size"])
+
+        for error in stats["errors"]:
+            self.stderr.write(
+                f"line {error['line']}: {json.dumps(error['errors'])}"
+            )
+        self.stdout.write(
+            f"{stats['rows']} rows in {stats['seconds']}s "
+            f"({stats['rows_per_second']} rows/s): "
+            f"{stats['imported']} imported, {stats['invalid']} invalid"
+        )
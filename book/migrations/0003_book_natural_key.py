@@ -0,0 +1,62 @@
+# Generated by Django 5.0.8 on 2026-10-18 18:23
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_books(apps, schema_editor):
+    """
+    Fold books sharing a title, author and cover into the one with the
+    lowest id before the natural key is enforced. Their copies are
+    summed and loans move to the kept row, whose daily fee wins.
+    """
+    Book = apps.get_model("book", "Book")
+    Borrowing = apps.get_model("borrowing", "Borrowing")
+    UserLoanState = apps.get_model("borrowing", "UserLoanState")
+
+    duplicates = (
+        Book.objects.values("title", "author", "cover")
+        .annotate(copies=Count("id"))
+        .filter(copies__gt=1)
+    )
+    for natural_key in duplicates:
+        del natural_key["copies"]
+        kept, *merged = Book.objects.filter(**natural_key).order_by("id")
+        merged_ids = [book.id for book in merged]
+
+        kept.inventory += sum(book.inventory for book in merged)
+        kept.save(update_fields=["inventory"])
+        Borrowing.objects.filter(book_id__in=merged_ids).update(
+            book_id=kept.id
+        )
+        for state in UserLoanState.objects.filter(
+            active_book_ids__overlap=merged_ids
+        ):
+            state.active_book_ids = [
+                kept.id if book_id in merged_ids else book_id
+                for book_id in state.active_book_ids
+            ]
+            state.save(update_fields=["active_book_ids"])
+        Book.objects.filter(id__in=merged_ids).delete()
+
+    # Check the deferred foreign keys of the moved loans now, as Postgres
+    # will not alter a table with pending trigger events
+    schema_editor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0002_book_search'),
+        ('borrowing', '0004_user_loan_state'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_books, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='book',
+            constraint=models.UniqueConstraint(fields=('title', 'author', 'cover'), name='book_title_author_cover_uniq'),
+        ),
+    ]
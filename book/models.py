@@ -1,5 +1,15 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
 
+# Text search configuration shared by the search index and the queries
+# against it. PostgreSQL only uses the index when both match exactly.
+SEARCH_CONFIG = "english"
+
+
+def get_search_vector() -> SearchVector:
+    return SearchVector("title", "author", config=SEARCH_CONFIG)
+
 
 class Book(models.Model):
     COVER_CHOICES = [
@@ -13,5 +23,27 @@ class Book(models.Model):
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(max_digits=6, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            GinIndex(get_search_vector(), name="book_search_idx"),
+            GinIndex(
+                fields=["title"],
+                opclasses=["gin_trgm_ops"],
+                name="book_title_trgm_idx",
+            ),
+            GinIndex(
+                fields=["author"],
+                opclasses=["gin_trgm_ops"],
+                name="book_author_trgm_idx",
+            ),
+        ]
+        constraints = [
+            # Natural key the catalog import upserts on
+            models.UniqueConstraint(
+                fields=["title", "author", "cover"],
+                name="book_title_author_cover_uniq",
+            ),
+        ]
+
     def __str__(self):
         return self.title
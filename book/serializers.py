@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 from .models import Book
@@ -14,3 +15,44 @@ class BookSerializer(serializers.ModelSerializer):
             "inventory",
             "daily_fee",
         ]
+
+
+class BookImportSerializer(BookSerializer):
+    """
+    Field rules of `BookSerializer` without the uniqueness check, since
+    imported rows may update existing books.
+    """
+
+    class Meta(BookSerializer.Meta):
+        validators = []
+
+
+class BookImportUploadSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=["csv", "jsonl"], required=False)
+
+
+class BookAvailabilityQuerySerializer(serializers.Serializer):
+    ids = serializers.CharField(
+        help_text="Comma-separated book ids, at most "
+        f"{settings.BOOK_AVAILABILITY_MAX_IDS}."
+    )
+
+    def validate_ids(self, value):
+        try:
+            ids = [int(pk) for pk in value.split(",") if pk.strip()]
+        except ValueError:
+            raise serializers.ValidationError("Ids must be integers.")
+        if not ids:
+            raise serializers.ValidationError("No ids given.")
+        if len(ids) > settings.BOOK_AVAILABILITY_MAX_IDS:
+            raise serializers.ValidationError(
+                f"At most {settings.BOOK_AVAILABILITY_MAX_IDS} ids are "
+                "allowed."
+            )
+        return ids
+
+
+class BookAvailabilitySerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    available = serializers.IntegerField()
@@ -0,0 +1,71 @@
+from django.db.models import Case, F, IntegerField, Value, When
+
+from book.availability import adjust_availability
+from book.models import Book
+from book.signals import BOOKS_LIST_NAMESPACE
+from library_core.cache import invalidate_namespace
+
+
+def reserve_copy(book_id: int) -> bool:
+    """
+    Take one copy of a book out of stock.
+
+    The decrement is a single conditional
+    `UPDATE ... SET inventory = inventory - 1 WHERE inventory > 0`,
+    so concurrent borrowers can never oversell the last copy. Returns
+    whether a copy was reserved.
+    """
+    reserved = Book.objects.filter(pk=book_id, inventory__gt=0).update(
+        inventory=F("inventory") - 1
+    )
+    if reserved:
+        adjust_availability({book_id: -1})
+        invalidate_namespace(BOOKS_LIST_NAMESPACE)
+    return bool(reserved)
+
+
+def release_copy(book_id: int, quantity: int = 1) -> None:
+    """Put returned copies back in stock without a read-modify-write."""
+    Book.objects.filter(pk=book_id).update(
+        inventory=F("inventory") + quantity
+    )
+    adjust_availability({book_id: quantity})
+    invalidate_namespace(BOOKS_LIST_NAMESPACE)
+
+
+def reserve_copies(book_ids) -> set[int]:
+    """
+    Take one copy of each book out of stock in one locked statement
+    pair. Returns the ids of the books that had a copy left.
+    """
+    reserved = set(
+        Book.objects.select_for_update()
+        .filter(pk__in=book_ids, inventory__gt=0)
+        .values_list("pk", flat=True)
+    )
+    if reserved:
+        Book.objects.filter(pk__in=reserved).update(
+            inventory=F("inventory") - 1
+        )
+        adjust_availability({book_id: -1 for book_id in reserved})
+        invalidate_namespace(BOOKS_LIST_NAMESPACE)
+    return reserved
+
+
+def release_copies(quantities: dict[int, int]) -> None:
+    """Put back `quantities` of copies per book id in one UPDATE."""
+    if not quantities:
+        return
+
+    Book.objects.filter(pk__in=quantities).update(
+        inventory=F("inventory")
+        + Case(
+            *[
+                When(pk=book_id, then=Value(quantity))
+                for book_id, quantity in quantities.items()
+            ],
+            output_field=IntegerField(),
+        )
+    )
+    adjust_availability(quantities)
+    invalidate_namespace(BOOKS_LIST_NAMESPACE)
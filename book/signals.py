@@ -1,14 +1,25 @@
-from django.core.cache import cache
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+from book.availability import forget_availability, set_availability
 from book.models import Book
+from library_core.cache import invalidate_namespace
 
-
-def cache_invalidate_by_prefix(prefix: str) -> int:
-    return cache.delete_pattern(f"*.{prefix}.*")
+BOOKS_LIST_NAMESPACE = "books_list"
 
 
 @receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
 def book_save_invalidate_cache(sender, **kwargs):
-    cache_invalidate_by_prefix("books_list")
+    invalidate_namespace(BOOKS_LIST_NAMESPACE)
+
+
+@receiver(post_save, sender=Book)
+def book_save_set_availability(sender, instance, update_fields, **kwargs):
+    if update_fields is None or "inventory" in update_fields:
+        set_availability({instance.pk: instance.inventory})
+
+
+@receiver(post_delete, sender=Book)
+def book_delete_forget_availability(sender, instance, **kwargs):
+    forget_availability(instance.pk)
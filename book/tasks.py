@@ -0,0 +1,16 @@
+import logging
+
+from celery import shared_task
+
+from book.availability import reconcile_availability
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def reconcile_book_availability() -> int:
+    """Repair mirrored availability counters that drifted from stock."""
+    repaired = reconcile_availability()
+    if repaired:
+        logger.warning("Repaired %s drifted availability counters", repaired)
+    return repaired
@@ -1,9 +1,22 @@
+import time
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from django.utils.http import http_date
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from book.models import Book
+from book.availability import reconcile_availability
+from book.services import (
+    release_copies,
+    release_copy,
+    reserve_copies,
+    reserve_copy,
+)
 
 User = get_user_model()
 
@@ -84,3 +97,274 @@ class BookServiceTests(APITestCase):
         self.client.force_authenticate(user=self.user)
         response = self.client.delete(self.book_detail_url(book.id))
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BookListCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("books:books-list")
+        Book.objects.create(
+            title="First", author="Author", cover="HARD",
+            inventory=1, daily_fee=1,
+        )
+
+    def test_list_is_invalidated_on_book_save(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["count"], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.create(
+                title="Second", author="Author", cover="SOFT",
+                inventory=1, daily_fee=1,
+            )
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.data["count"], 2)
+
+    def test_list_is_served_from_cache(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class BookConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("books:books-list")
+        self.book = Book.objects.create(
+            title="First", author="Author", cover="HARD",
+            inventory=1, daily_fee=1,
+        )
+        self.detail_url = reverse("books:books-detail", args=[self.book.id])
+
+    def test_matching_etag_is_not_modified_without_queries(self):
+        response = self.client.get(self.url)
+        etag = response.headers["ETag"]
+        self.assertNotIn("Last-Modified", response.headers)
+        self.assertIn("no-cache", response.headers["Cache-Control"])
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.headers["ETag"], etag)
+
+    def test_etag_changes_with_availability(self):
+        etag = self.client.get(self.detail_url).headers["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_copy(self.book.id)
+
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["inventory"], 0)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    def test_changes_within_one_second_are_not_hidden(self):
+        Book.objects.filter(pk=self.book.id).update(inventory=2)
+        with mock.patch("time.time", return_value=1_800_000_000.2):
+            with self.captureOnCommitCallbacks(execute=True):
+                reserve_copy(self.book.id)
+            etag = self.client.get(self.detail_url).headers["ETag"]
+            with self.captureOnCommitCallbacks(execute=True):
+                reserve_copy(self.book.id)
+
+            by_etag = self.client.get(
+                self.detail_url, HTTP_IF_NONE_MATCH=etag
+            )
+            by_date = self.client.get(
+                self.detail_url,
+                HTTP_IF_MODIFIED_SINCE=http_date(time.time()),
+            )
+
+        self.assertEqual(by_etag.status_code, status.HTTP_200_OK)
+        self.assertEqual(by_etag.data["inventory"], 0)
+        self.assertEqual(by_date.status_code, status.HTTP_200_OK)
+
+
+class InventoryReservationTests(APITestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Last Copy", author="Author", cover="HARD",
+            inventory=1, daily_fee=1,
+        )
+
+    def test_reserve_last_copy_once(self):
+        self.assertTrue(reserve_copy(self.book.id))
+        self.assertFalse(reserve_copy(self.book.id))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+
+    def test_release_copy(self):
+        reserve_copy(self.book.id)
+        release_copy(self.book.id)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 1)
+
+
+class BookAvailabilityTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("books:books-availability")
+        self.books = [
+            Book.objects.create(
+                title=f"Book {i}", author="Author", cover="HARD",
+                inventory=3, daily_fee=1,
+            )
+            for i in range(3)
+        ]
+        self.ids = [book.id for book in self.books]
+
+    def get_availability(self, ids):
+        response = self.client.get(
+            self.url, {"ids": ",".join(map(str, ids))}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {row["id"]: row["available"] for row in response.data}
+
+    def test_counters_are_read_from_redis_once_loaded(self):
+        with self.assertNumQueries(1):
+            available = self.get_availability([*self.ids, 0])
+        self.assertEqual(available, dict.fromkeys(self.ids, 3))
+
+        with self.assertNumQueries(0):
+            self.get_availability(self.ids)
+
+    def test_stock_changes_are_mirrored_after_commit(self):
+        self.get_availability(self.ids)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_copies(self.ids[:2])
+        with self.captureOnCommitCallbacks(execute=True):
+            release_copies({self.ids[0]: 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[2].inventory = 10
+            self.books[2].save()
+
+        with self.assertNumQueries(0):
+            available = self.get_availability(self.ids)
+        self.assertEqual(list(available.values()), [3, 2, 10])
+
+    def test_reconcile_repairs_drift(self):
+        self.get_availability(self.ids)
+        # A change made without the services, e.g. by hand in SQL
+        Book.objects.filter(pk=self.ids[1]).update(inventory=7)
+
+        self.assertEqual(reconcile_availability(batch_size=2), 1)
+        self.assertEqual(self.get_availability(self.ids)[self.ids[1]], 7)
+        self.assertEqual(reconcile_availability(), 0)
+
+    def test_invalid_ids(self):
+        response = self.client.get(self.url, {"ids": "1,x"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with self.settings(BOOK_AVAILABILITY_MAX_IDS=2):
+            response = self.client.get(self.url, {"ids": "1,2,3"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BookSearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse("books:books-list")
+        for title, author in [
+            ("The Silent Empire", "Anna Smith"),
+            ("Silent Garden", "Peter Novak"),
+            ("Golden River", "Maria Silva"),
+        ]:
+            Book.objects.create(
+                title=title, author=author, cover="SOFT",
+                inventory=1, daily_fee=1,
+            )
+
+    def get_titles(self, term):
+        response = self.client.get(self.url, {"search": term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book["title"] for book in response.data["results"]]
+
+    def test_results_are_ranked(self):
+        self.assertEqual(
+            self.get_titles("silent empire")[0], "The Silent Empire"
+        )
+
+    def test_search_by_author(self):
+        self.assertEqual(self.get_titles("novak"), ["Silent Garden"])
+
+    def test_search_tolerates_typos(self):
+        self.assertEqual(self.get_titles("goldn"), ["Golden River"])
+
+    def test_no_match(self):
+        self.assertEqual(self.get_titles("zzzz"), [])
+
+
+class BookImportTests(APITestCase):
+    CSV = (
+        "title,author,cover,inventory,daily_fee\n"
+        "Dune,Frank Herbert,HARD,3,1.50\n"
+        "Emma,Jane Austen,SOFT,x,1\n"
+        "Dune,Frank Herbert,HARD,5,1.75\n"
+    )
+
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.url = reverse("books:books-import-catalog")
+        Book.objects.create(
+            title="Dune", author="Frank Herbert", cover="HARD",
+            inventory=1, daily_fee=1,
+        )
+
+    def upload(self, name, content):
+        return self.client.post(
+            self.url,
+            {"file": SimpleUploadedFile(name, content.encode())},
+            format="multipart",
+        )
+
+    def test_import_requires_admin(self):
+        response = self.upload("books.csv", self.CSV)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_csv_upserts_valid_rows(self):
+        self.client.force_authenticate(user=self.admin_user)
+        with mock.patch("book.importer.invalidate_namespace") as invalidate:
+            response = self.upload("books.csv", self.CSV)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["rows"], 3)
+        self.assertEqual(response.data["invalid"], 1)
+        self.assertEqual(response.data["errors"][0]["line"], 3)
+        invalidate.assert_called_once()
+        book = Book.objects.get()
+        self.assertEqual(book.inventory, 5)
+
+    def test_jsonl_import(self):
+        self.client.force_authenticate(user=self.admin_user)
+        lines = [
+            '{"title": "Emma", "author": "Jane Austen", "cover": "SOFT", '
+            '"inventory": 2, "daily_fee": "1.00"}',
+            "not json",
+        ]
+        response = self.upload("books.jsonl", "\n".join(lines))
+
+        self.assertEqual(response.data["imported"], 1)
+        self.assertEqual(response.data["invalid"], 1)
+        self.assertTrue(Book.objects.filter(title="Emma").exists())
+
+    def test_create_duplicate_book_is_rejected(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(
+            reverse("books:books-list"),
+            {
+                "title": "Dune",
+                "author": "Frank Herbert",
+                "cover": "HARD",
+                "inventory": 2,
+                "daily_fee": "1.50",
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("unique set", response.data["error"])
+        self.assertEqual(Book.objects.count(), 1)
@@ -1,12 +1,26 @@
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
+import io
+
 from drf_spectacular.utils import extend_schema
 from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 
+from book.availability import get_availability
+from book.filters import BookSearchFilter
+from book.importer import FORMATS, import_books
 from book.models import Book
 from book.permissions import IsAdminOrReadOnly
-from book.serializers import BookSerializer
+from book.serializers import (
+    BookAvailabilityQuerySerializer,
+    BookAvailabilitySerializer,
+    BookImportUploadSerializer,
+    BookSerializer,
+)
+from book.signals import BOOKS_LIST_NAMESPACE
+from library_core.cache import cache_response, conditional_response
+from library_core.db import ReplicaReadMixin
 
 
 @extend_schema(
@@ -14,17 +28,20 @@ from book.serializers import BookSerializer
     summary="Books API",
     description="Endpoints related to managing books within the library system.",
 )
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = [IsAdminOrReadOnly]
+    filter_backends = [BookSearchFilter]
 
-    @method_decorator(cache_page(60 * 5, key_prefix="books_list_view"))
     @extend_schema(
         summary="List all books",
-        description="Retrieve a list of all books.",
+        description="Retrieve a list of all books. Use `search` to find "
+        "books by title or author, ranked by relevance.",
         responses={200: BookSerializer(many=True), 400: "Bad request"},
     )
+    @conditional_response(BOOKS_LIST_NAMESPACE)
+    @cache_response(BOOKS_LIST_NAMESPACE, timeout=60 * 5)
     def list(self, request, *args, **kwargs):
         return super().list(request, *args, **kwargs)
 
@@ -42,6 +59,8 @@ class BookViewSet(viewsets.ModelViewSet):
         summary="Retrieve a book",
         description="Retrieve the details of a specific book using its ID.",
     )
+    @conditional_response(BOOKS_LIST_NAMESPACE)
+    @cache_response(BOOKS_LIST_NAMESPACE, timeout=60 * 5)
     def retrieve(self, request, *args, **kwargs):
         try:
             return super().retrieve(request, *args, **kwargs)
@@ -77,3 +96,59 @@ class BookViewSet(viewsets.ModelViewSet):
             return super().destroy(request, *args, **kwargs)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(
+        summary="Live availability of books",
+        description="Available copies of up to `BOOK_AVAILABILITY_MAX_IDS` "
+        "books in one call, read from Redis counters kept in step with "
+        "stock. Unknown ids are left out.",
+        parameters=[BookAvailabilityQuerySerializer],
+        responses=BookAvailabilitySerializer(many=True),
+    )
+    @action(methods=["GET"], detail=False, url_path="availability")
+    def availability(self, request):
+        serializer = BookAvailabilityQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        available = get_availability(serializer.validated_data["ids"])
+        return Response(
+            BookAvailabilitySerializer(
+                [
+                    {"id": book_id, "available": count}
+                    for book_id, count in available.items()
+                ],
+                many=True,
+            ).data
+        )
+
+    @extend_schema(
+        summary="Import books",
+        description="Upload a CSV or JSON Lines file (`file`, with an "
+        "optional `format`) to upsert books on (title, author, cover). "
+        "Returns counters, the first invalid rows and throughput. "
+        "Requires admin privileges.",
+        request=BookImportUploadSerializer,
+    )
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="import",
+        permission_classes=[IsAdminUser],
+        parser_classes=[MultiPartParser],
+    )
+    def import_catalog(self, request):
+        serializer = BookImportUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.validated_data["file"]
+        file_format = serializer.validated_data.get("format") or (
+            upload.name.rsplit(".", 1)[-1].lower()
+        )
+        if file_format not in FORMATS:
+            return Response(
+                {"format": f"Unknown format {file_format!r}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        stream = io.TextIOWrapper(upload, encoding="utf-8", newline="")
+        return Response(
+            import_books(stream, file_format), status=status.HTTP_200_OK
+        )
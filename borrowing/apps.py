@@ -6,4 +6,4 @@ class BorrowingConfig(AppConfig):
     name = "borrowing"
 
     def ready(self):
-        pass
+        import borrowing.signals  # noqa: F401
@@ -0,0 +1,65 @@
+from django.core.cache import cache
+
+from library_core.cache import invalidate_namespace, versioned_key
+
+BORROWINGS_LIST_TIMEOUT = 60 * 15
+STAFF_SCOPE = "borrowings:staff"
+STATS_KEYS = {
+    "hits": "borrowings:stats:hits",
+    "misses": "borrowings:stats:misses",
+}
+LIST_QUERY_PARAMS = ("page", "page_size", "pagination", "cursor")
+
+
+def get_scope(user) -> str:
+    """
+    Staff see every user's borrowings, so their lists share one scope
+    that changes with any borrowing; everyone else has a scope of
+    their own.
+    """
+    if user.is_staff or user.is_superuser:
+        return STAFF_SCOPE
+    return f"borrowings:user:{user.pk}"
+
+
+def get_list_cache_key(request) -> str:
+    user = request.user
+    scope = get_scope(user)
+    params = request.query_params
+    is_staff = scope == STAFF_SCOPE
+
+    return versioned_key(
+        scope,
+        "list",
+        user.pk,
+        is_staff,
+        params.get("is_active", "").lower(),
+        params.get("user_id", "") if is_staff else "",
+        request.get_host(),
+        *(params.get(name, "") for name in LIST_QUERY_PARAMS),
+    )
+
+
+def invalidate_user_borrowings(*user_ids) -> None:
+    """
+    Drop the cached borrowing lists of the given users and of staff
+    once the current transaction commits.
+    """
+    scopes = {f"borrowings:user:{user_id}" for user_id in user_ids}
+    invalidate_namespace(STAFF_SCOPE, *scopes)
+
+
+def record(outcome: str) -> None:
+    key = STATS_KEYS[outcome]
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_stats() -> dict:
+    values = cache.get_many(STATS_KEYS.values())
+    return {
+        outcome: values.get(key, 0) for outcome, key in STATS_KEYS.items()
+    }
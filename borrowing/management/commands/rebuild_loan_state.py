@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from borrowing.models import UserLoanState
+from borrowing.services import compute_loan_states, save_loan_states
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the per-user loan state projection from the borrowing "
+        "and payment tables, or only report where it has drifted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only compare the stored states with the source tables "
+            "and fail if any differ.",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = compute_loan_states()
+            stored = UserLoanState.objects.in_bulk()
+            drifted = [
+                user_id
+                for user_id, state in expected.items()
+                if not self._is_equal(state, stored.get(user_id))
+            ]
+
+            if options["check"]:
+                for user_id in drifted:
+                    self.stdout.write(
+                        f"user {user_id}: stored {stored.get(user_id)}, "
+                        f"expected {expected[user_id]}"
+                    )
+                if drifted:
+                    raise CommandError(
+                        f"Loan state drifted for {len(drifted)} of "
+                        f"{len(expected)} users"
+                    )
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Loan state matches for {len(expected)} users"
+                    )
+                )
+                return
+
+            save_loan_states([expected[user_id] for user_id in drifted])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt loan state for {len(drifted)} of "
+                f"{len(expected)} users"
+            )
+        )
+
+    @staticmethod
+    def _is_equal(expected, stored) -> bool:
+        if stored is None:
+            return not expected.active_loans and not expected.pending_payments
+        return (
+            stored.active_loans == expected.active_loans
+            and stored.pending_payments == expected.pending_payments
+            and sorted(stored.active_book_ids) == expected.active_book_ids
+        )
@@ -0,0 +1,56 @@
+# Generated by Django 5.0.8 on 2026-10-18 18:18
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+POPULATE_SQL = """
+    INSERT INTO borrowing_userloanstate (
+        user_id, active_loans, active_book_ids, pending_payments, updated_at
+    )
+    SELECT
+        u.id,
+        COALESCE(loans.count, 0),
+        COALESCE(loans.book_ids, '{}'),
+        COALESCE(pending.count, 0),
+        now()
+    FROM user_user u
+    LEFT JOIN (
+        SELECT user_id, count(*) AS count,
+            array_agg(book_id ORDER BY book_id) AS book_ids
+        FROM borrowing_borrowing
+        WHERE actual_return_date IS NULL
+        GROUP BY user_id
+    ) loans ON loans.user_id = u.id
+    LEFT JOIN (
+        SELECT b.user_id, count(*) AS count
+        FROM payment_payment p
+        JOIN borrowing_borrowing b ON b.id = p.borrowing_id
+        WHERE p.status = 'PENDING'
+        GROUP BY b.user_id
+    ) pending ON pending.user_id = u.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowing', '0003_active_borrowing_indexes'),
+        ('payment', '0001_initial'),
+        ('user', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLoanState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='loan_state', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('active_loans', models.IntegerField(default=0)),
+                ('active_book_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+                ('pending_payments', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunSQL(POPULATE_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.8 on 2026-10-18 18:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('book', '0003_book_natural_key'),
+        ('borrowing', '0004_user_loan_state'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(condition=models.Q(('actual_return_date__isnull', False)), fields=['actual_return_date'], name='borrowing_returned_date_idx'),
+        ),
+    ]
@@ -10,3 +10,28 @@ class GenericMethodsMixin:
                 self.action, self.serializer_class
             )
         return self.serializer_class
+
+
+class KeysetPaginationMixin:
+    """
+    Switch the view to `keyset_pagination_class` when the client opts in,
+    falling back to the default `pagination_class` otherwise.
+    """
+
+    keyset_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            request = getattr(self, "request", None)
+            if (
+                request is not None
+                and self.keyset_pagination_class is not None
+                and self.keyset_pagination_class.is_requested(request)
+            ):
+                self._paginator = self.keyset_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
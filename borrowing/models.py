@@ -1,6 +1,7 @@
 from decimal import Decimal
 
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
 from django.db import models
 from rest_framework.exceptions import ValidationError
 
@@ -23,6 +24,44 @@ class Borrowing(models.Model):
         related_name="borrowings"
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["borrow_date", "id"],
+                name="borrowing_borrow_date_id_idx",
+            ),
+            models.Index(
+                fields=["user", "book"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_active_user_book_idx",
+            ),
+            models.Index(
+                fields=["expected_return_date"],
+                condition=models.Q(actual_return_date__isnull=True),
+                name="borrowing_active_due_idx",
+            ),
+            models.Index(
+                fields=["actual_return_date"],
+                condition=models.Q(actual_return_date__isnull=False),
+                name="borrowing_returned_date_idx",
+            ),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(
+                    expected_return_date__gt=models.F("borrow_date")
+                ),
+                name="expected_return_after_borrow",
+            ),
+            models.CheckConstraint(
+                condition=models.Q(
+                    actual_return_date__gte=models.F("borrow_date")
+                )
+                | models.Q(actual_return_date__isnull=True),
+                name="actual_return_after_borrow_or_null",
+            ),
+        ]
+
     @property
     def days(self):
         delta = self.expected_return_date - self.borrow_date
@@ -94,3 +133,30 @@ class Borrowing(models.Model):
             f"Borrowed '{self.book}' on {self.borrow_date}, "
             f"expected return by {self.expected_return_date}"
         )
+
+
+class UserLoanState(models.Model):
+    """
+    Per-user projection of active loans and pending payments, so borrow
+    eligibility is a primary-key lookup instead of scans over borrowings
+    and payments. Kept current by `borrowing.services` in the same
+    transaction as the change; `rebuild_loan_state` rebuilds and checks
+    it from the source tables.
+    """
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="loan_state",
+    )
+    active_loans = models.IntegerField(default=0)
+    active_book_ids = ArrayField(models.BigIntegerField(), default=list)
+    pending_payments = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return (
+            f"{self.user_id}: {self.active_loans} active loans, "
+            f"{self.pending_payments} pending payments"
+        )
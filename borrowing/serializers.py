@@ -1,9 +1,12 @@
+from django.conf import settings
+from django.db.models import Exists, OuterRef
 from django.utils import timezone
 from rest_framework import serializers
 
+from book.models import Book
 from book.serializers import BookSerializer
-from borrowing.models import Borrowing
-from payment.models import Payment
+from book.services import reserve_copy
+from borrowing.models import Borrowing, UserLoanState
 from payment.serializers import PaymentSerializer
 
 
@@ -67,21 +70,40 @@ class BorrowingCreateSerializer(serializers.ModelSerializer):
             "book",
         )
 
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get("request")
+        if request is not None:
+            fields["book"].queryset = self.get_book_queryset(request.user)
+        return fields
+
+    @staticmethod
+    def get_book_queryset(user):
+        """
+        Books annotated with the borrower's eligibility, so resolving the
+        `book` id also decides whether the loan is allowed in one query.
+        Both checks are primary-key lookups of the user's loan state.
+        """
+        loan_state = UserLoanState.objects.filter(pk=user.pk)
+        return Book.objects.annotate(
+            has_pending_payment=Exists(
+                loan_state.filter(pending_payments__gt=0)
+            ),
+            has_active_borrowing=Exists(
+                loan_state.filter(active_book_ids__contains=[OuterRef("pk")])
+            ),
+        )
+
     def validate(self, attrs):
-        user = self.context["request"].user
         book = attrs.get("book")
 
-        if Payment.objects.filter(
-            borrowing__user=user, status=Payment.Status.PENDING
-        ).exists():
+        if book.has_pending_payment:
             raise serializers.ValidationError(
                 "You have pending payments. "
                 "Please complete them before borrowing a new book."
             )
 
-        if Borrowing.objects.filter(
-            user=user, book=book, actual_return_date__isnull=True
-        ).exists():
+        if book.has_active_borrowing:
             raise serializers.ValidationError(
                 "You have already borrowed this book."
             )
@@ -103,8 +125,9 @@ class BorrowingCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         book = validated_data.get("book")
+        if not reserve_copy(book.id):
+            raise serializers.ValidationError("The book is out of stock")
         book.inventory -= 1
-        book.save(update_fields=["inventory"])
 
         return super().create(validated_data)
 
@@ -113,3 +136,31 @@ class BorrowingReturnSerializer(serializers.ModelSerializer):
     class Meta:
         model = Borrowing
         fields = ("id",)
+
+
+class BorrowingBulkItemSerializer(serializers.Serializer):
+    book = serializers.IntegerField()
+    expected_return_date = serializers.DateField()
+
+    def validate(self, attrs):
+        Borrowing.validate_dates(
+            timezone.now().date(),
+            attrs["expected_return_date"],
+            actual_return_date=None,
+            error=serializers.ValidationError,
+        )
+        return attrs
+
+
+class BorrowingBulkCheckoutSerializer(serializers.Serializer):
+    items = BorrowingBulkItemSerializer(
+        many=True, min_length=1, max_length=settings.BORROWING_BULK_MAX_ITEMS
+    )
+
+
+class BorrowingBulkReturnSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=settings.BORROWING_BULK_MAX_ITEMS,
+    )
@@ -0,0 +1,234 @@
+from collections import Counter, defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import BigIntegerField, Count, F, Func, Value
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from book.models import Book
+from book.services import release_copies, reserve_copies
+from borrowing.cache import invalidate_user_borrowings
+from borrowing.models import Borrowing, UserLoanState
+from notification.services import enqueue_notification
+from payment.models import Payment
+
+
+class ArrayCat(Func):
+    function = "array_cat"
+    output_field = ArrayField(BigIntegerField())
+
+
+class ArrayRemove(Func):
+    function = "array_remove"
+    output_field = ArrayField(BigIntegerField())
+
+
+def compute_loan_states(user_ids=None) -> dict[int, UserLoanState]:
+    """
+    Build loan states from the borrowing and payment tables, for every
+    user or only for `user_ids`.
+    """
+    users = get_user_model().objects.all()
+    borrowings = Borrowing.objects.filter(actual_return_date__isnull=True)
+    payments = Payment.objects.filter(status=Payment.Status.PENDING)
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+        borrowings = borrowings.filter(user_id__in=user_ids)
+        payments = payments.filter(borrowing__user_id__in=user_ids)
+
+    states = {
+        user_id: UserLoanState(user_id=user_id)
+        for user_id in users.values_list("pk", flat=True)
+    }
+    loans = borrowings.values("user_id").annotate(
+        count=Count("id"), book_ids=ArrayAgg("book_id", ordering="book_id")
+    )
+    for row in loans:
+        state = states[row["user_id"]]
+        state.active_loans = row["count"]
+        state.active_book_ids = row["book_ids"]
+
+    pending = payments.values("borrowing__user_id").annotate(count=Count("id"))
+    for row in pending:
+        states[row["borrowing__user_id"]].pending_payments = row["count"]
+    return states
+
+
+def save_loan_states(states) -> None:
+    UserLoanState.objects.bulk_create(
+        states,
+        update_conflicts=True,
+        unique_fields=["user"],
+        update_fields=[
+            "active_loans",
+            "active_book_ids",
+            "pending_payments",
+            "updated_at",
+        ],
+        batch_size=1000,
+    )
+
+
+def refresh_loan_states(*user_ids) -> None:
+    """Overwrite the stored states of `user_ids` from the source tables."""
+    save_loan_states(compute_loan_states(user_ids).values())
+
+
+def update_loan_state(
+    user_id: int, refresh_missing: bool = True, **changes
+) -> None:
+    """
+    Apply relative `changes` to a user's state in one UPDATE, so
+    concurrent changes never overwrite each other. With
+    `refresh_missing`, a user without a state yet gets one computed from
+    the source tables, which already include the caller's change.
+    """
+    updated = UserLoanState.objects.filter(pk=user_id).update(
+        updated_at=Now(), **changes
+    )
+    if not updated and refresh_missing:
+        refresh_loan_states(user_id)
+
+
+def group_books_by_user(borrowings) -> dict[int, list[int]]:
+    book_ids = defaultdict(list)
+    for borrowing in borrowings:
+        book_ids[borrowing.user_id].append(borrowing.book_id)
+    return book_ids
+
+
+def record_loans_opened(borrowings) -> None:
+    for user_id, book_ids in group_books_by_user(borrowings).items():
+        update_loan_state(
+            user_id,
+            active_loans=F("active_loans") + len(book_ids),
+            active_book_ids=ArrayCat(
+                "active_book_ids",
+                Value(book_ids, output_field=ArrayCat.output_field),
+            ),
+        )
+
+
+def record_loans_closed(borrowings) -> None:
+    for user_id, book_ids in group_books_by_user(borrowings).items():
+        active_book_ids = F("active_book_ids")
+        for book_id in book_ids:
+            active_book_ids = ArrayRemove(active_book_ids, Value(book_id))
+        update_loan_state(
+            user_id,
+            refresh_missing=False,
+            active_loans=F("active_loans") - len(book_ids),
+            active_book_ids=active_book_ids,
+        )
+
+
+def record_pending_payments(deltas: Counter) -> None:
+    """Add per-user `deltas` to the users' pending payment counts."""
+    for user_id, delta in deltas.items():
+        if delta:
+            update_loan_state(
+                user_id,
+                refresh_missing=delta > 0,
+                pending_payments=F("pending_payments") + delta,
+            )
+
+
+@transaction.atomic
+def borrow_books(user, items: list[dict]) -> tuple[list[dict], list]:
+    """
+    Check out several books for `user` in one transaction.
+
+    `items` hold a `book` id and an `expected_return_date` each.
+    Eligibility is read once from the locked loan state and stock is
+    reserved for all books with one locked SELECT and one UPDATE.
+    Returns a result per item, in order, and the created borrowings.
+    """
+    state = (
+        UserLoanState.objects.select_for_update()
+        .filter(pk=user.pk)
+        .first()
+    )
+    if state and state.pending_payments:
+        error = (
+            "You have pending payments. "
+            "Please complete them before borrowing a new book."
+        )
+        return [{"book": item["book"], "error": error} for item in items], []
+
+    books = Book.objects.in_bulk([item["book"] for item in items])
+    active_book_ids = set(state.active_book_ids if state else [])
+    results, requested = [], []
+    for item in items:
+        result = {"book": item["book"]}
+        results.append(result)
+        if item["book"] not in books:
+            result["error"] = "Book not found."
+        elif item["book"] in active_book_ids:
+            result["error"] = "You have already borrowed this book."
+        else:
+            active_book_ids.add(item["book"])
+            requested.append((result, item))
+
+    reserved = reserve_copies([item["book"] for _, item in requested])
+    borrow_date = timezone.now().date()
+    borrowings = []
+    for result, item in requested:
+        if item["book"] not in reserved:
+            result["error"] = "The book is out of stock"
+            continue
+        borrowing = Borrowing(
+            user=user,
+            book=books[item["book"]],
+            borrow_date=borrow_date,
+            expected_return_date=item["expected_return_date"],
+        )
+        borrowings.append(borrowing)
+        result["borrowing"] = borrowing
+
+    if borrowings:
+        Borrowing.objects.bulk_create(borrowings)
+        record_loans_opened(borrowings)
+        invalidate_user_borrowings(user.pk)
+        enqueue_notification(
+            f"{len(borrowings)} borrowings successful registered "
+            f"by {user.email}"
+        )
+    return results, borrowings
+
+
+@transaction.atomic
+def return_borrowings(queryset, ids: list[int]) -> tuple[dict, list]:
+    """
+    Return the borrowings of `queryset` with the given `ids` at once.
+
+    Rows are locked, stamped with one `bulk_update` and their copies put
+    back with one aggregated inventory UPDATE. Returns an outcome per id
+    (`returned`, `already_returned` or `not_found`) and the borrowings
+    that were returned.
+    """
+    ids = list(dict.fromkeys(ids))
+    found = queryset.select_for_update(of=("self",)).in_bulk(ids)
+    actual_return_date = timezone.now().date()
+    outcomes, returned = {}, []
+    for pk in ids:
+        borrowing = found.get(pk)
+        if borrowing is None:
+            outcomes[pk] = "not_found"
+        elif borrowing.actual_return_date:
+            outcomes[pk] = "already_returned"
+        else:
+            borrowing.actual_return_date = actual_return_date
+            returned.append(borrowing)
+            outcomes[pk] = "returned"
+
+    if returned:
+        Borrowing.objects.bulk_update(returned, ["actual_return_date"])
+        release_copies(Counter(borrowing.book_id for borrowing in returned))
+        record_loans_closed(returned)
+        invalidate_user_borrowings(
+            *{borrowing.user_id for borrowing in returned}
+        )
+    return outcomes, returned
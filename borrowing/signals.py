@@ -1,26 +1,95 @@
-from django.conf import settings
-from django.db.models.signals import post_save
+from collections import Counter
+
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver, Signal
 
-from book.signals import cache_invalidate_by_prefix
+from book.models import Book
+from borrowing.cache import invalidate_user_borrowings
 from borrowing.models import Borrowing
-from notification.telegram_bot import TelegramBot
+from borrowing.services import (
+    record_loans_closed,
+    record_loans_opened,
+    record_pending_payments,
+)
+from notification.services import enqueue_notification
 from payment.models import Payment
 
 payment_successful = Signal()
 
 
 @receiver(post_save, sender=Borrowing)
-def borrowing_save_invalidate_cache(sender, **kwargs):
-    cache_invalidate_by_prefix("borrowings")
+@receiver(post_delete, sender=Borrowing)
+def borrowing_save_invalidate_cache(sender, instance, **kwargs):
+    invalidate_user_borrowings(instance.user_id)
+
+
+@receiver(post_save, sender=Book)
+def book_save_invalidate_cache(sender, instance, created, **kwargs):
+    """Borrowing lists show the book title, so drop its borrowers' lists."""
+    if not created:
+        invalidate_user_borrowings(
+            *Borrowing.objects.filter(book=instance)
+            .values_list("user_id", flat=True)
+            .distinct()
+        )
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_delete, sender=Payment)
+def payment_save_invalidate_cache(sender, instance, **kwargs):
+    invalidate_user_borrowings(instance.borrowing.user_id)
+
+
+@receiver(post_save, sender=Borrowing)
+def borrowing_created_update_loan_state(sender, instance, created, **kwargs):
+    if created and instance.actual_return_date is None:
+        record_loans_opened([instance])
+
+
+@receiver(post_delete, sender=Borrowing)
+def borrowing_deleted_update_loan_state(sender, instance, **kwargs):
+    if instance.actual_return_date is None:
+        record_loans_closed([instance])
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved_update_loan_state(
+    sender, instance, created, update_fields=None, **kwargs
+):
+    """
+    Count new pending payments, and status changes saved through
+    `Payment.save()` as in the admin. Changes are judged against the
+    status the instance was loaded with, without a lock, so concurrent
+    code settles payments with `save_status_changes` instead.
+    """
+    loaded_status = getattr(instance, "_loaded_status", None)
+    if created:
+        delta = int(instance.status == Payment.Status.PENDING)
+    elif loaded_status is None or (
+        update_fields is not None and "status" not in update_fields
+    ):
+        return
+    else:
+        delta = (instance.status == Payment.Status.PENDING) - (
+            loaded_status == Payment.Status.PENDING
+        )
+    instance._loaded_status = instance.status
+    if delta:
+        record_pending_payments(
+            Counter({instance.borrowing.user_id: delta})
+        )
+
+
+@receiver(post_delete, sender=Payment)
+def payment_deleted_update_loan_state(sender, instance, **kwargs):
+    if instance.status == Payment.Status.PENDING:
+        record_pending_payments(Counter({instance.borrowing.user_id: -1}))
 
 
 @receiver(payment_successful, sender=Payment)
 def payment_successful_handler(sender, instance, **kwargs):
-    bot = TelegramBot(settings.TELEGRAM_BOT_TOKEN)
-    bot.send_message_to_chat(
-        chat_id=settings.TELEGRAM_CHAT_ID,
-        message=f"Payment for borrowing successful\n"
+    enqueue_notification(
+        f"Payment for borrowing successful\n"
         f"Book: {instance.borrowing.book}\n"
         f"Price: {instance.money_to_pay / 100}$\n"
         f"Payment type: {instance.type}\n"
@@ -1,45 +1,121 @@
 from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
 
 from celery import shared_task
-from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
 from borrowing.models import Borrowing
+from notification.models import DigestCheckpoint
+from notification.services import enqueue_notification
 from notification.telegram_bot import TelegramBot
 
+OVERDUE_CHUNK_SIZE = 2000
+
+
+def format_user_digest(email: str, loans: list, tomorrow) -> list[str]:
+    lines = [f"User: {email}"]
+    overdue = [loan for loan in loans if loan[1] < tomorrow]
+    due_tomorrow = [loan for loan in loans if loan[1] == tomorrow]
+    if overdue:
+        lines.append("Overdue:")
+        lines += [f"- {title} (expected {date})" for title, date in overdue]
+    if due_tomorrow:
+        lines.append("Due tomorrow:")
+        lines += [f"- {title}" for title, _ in due_tomorrow]
+    return lines
+
+
+def build_digest_messages(
+    header: str, lines: list[str], limit: int
+) -> list[str]:
+    """
+    Pack lines under `header` into as few messages of at most `limit`
+    characters as possible.
+    """
+    messages = []
+    text = header
+    for line in lines:
+        line = line[: limit - len(header) - 1]
+        if len(text) + len(line) + 1 > limit:
+            messages.append(text)
+            text = header
+        text = f"{text}\n{line}"
+    if text != header:
+        messages.append(text)
+    return messages
+
 
 @shared_task
 def send_notification_overdue_tasks():
-    queryset = Borrowing.objects.filter(
-        expected_return_date__lte=timezone.now().date() + timedelta(days=1),
-        actual_return_date__isnull=True,
+    """
+    Queue a digest of overdue and due-tomorrow borrowings grouped by user.
+
+    Active loans are streamed in one joined query ordered by user, and
+    every digest message holds complete users only. The daily checkpoint
+    is moved past those users in the same transaction that queues the
+    message, so a crashed run resumes without sending anything twice.
+    Returns the number of queued messages.
+    """
+    today = timezone.now().date()
+    tomorrow = today + timedelta(days=1)
+    header = f"Overdue borrowings for {today}"
+    limit = TelegramBot.MAX_MESSAGE_LENGTH
+
+    checkpoint, _ = DigestCheckpoint.objects.get_or_create(
+        name=f"overdue:{today.isoformat()}"
     )
+    if checkpoint.completed_at:
+        return 0
 
-    bot = TelegramBot(token=settings.TELEGRAM_BOT_TOKEN)
-    chat_id = settings.TELEGRAM_CHAT_ID
-    if not queryset.exists():
-        bot.send_message_to_chat(
-            message="No overdue borrowings",
-            chat_id=chat_id,
+    rows = (
+        Borrowing.objects.filter(
+            expected_return_date__lte=tomorrow,
+            actual_return_date__isnull=True,
+            user_id__gt=checkpoint.last_user_id,
         )
-    for borrowing in queryset:
-        message = ""
-        if (borrowing.expected_return_date
-                == timezone.now().date() + timedelta(days=1)):
-            message = (
-                f"Tomorrow borrowing book will be overdue\n"
-                f"Book: {borrowing.book}\n"
-                f"User: {borrowing.user}\n"
-            )
-        else:
-            message = (
-                f"Borrowing book overdue found\n"
-                f"Book: {borrowing.book}\n"
-                f"User: {borrowing.user.email}\n"
-                f"Expected date {borrowing.expected_return_date}\n"
-            )
-
-        bot.send_message_to_chat(
-            message=message,
-            chat_id=chat_id,
+        .order_by("user_id", "expected_return_date", "id")
+        .values_list(
+            "user_id", "user__email", "book__title", "expected_return_date"
         )
+        .iterator(chunk_size=OVERDUE_CHUNK_SIZE)
+    )
+
+    queued = 0
+
+    def flush(lines: list[str], last_user_id: int) -> None:
+        """Queue `lines` and move the checkpoint past their users."""
+        nonlocal queued
+        for message in build_digest_messages(header, lines, limit):
+            enqueue_notification(message)
+            queued += 1
+        checkpoint.last_user_id = last_user_id
+        checkpoint.save(update_fields=["last_user_id", "updated_at"])
+
+    is_resumed = checkpoint.last_user_id > 0
+    lines, size, last_user_id = [], len(header), None
+    for user_id, user_rows in groupby(rows, key=itemgetter(0)):
+        user_rows = list(user_rows)
+        block = format_user_digest(
+            user_rows[0][1], [row[2:] for row in user_rows], tomorrow
+        )
+        block_size = sum(len(line) + 1 for line in block)
+        if lines and size + block_size > limit:
+            with transaction.atomic():
+                flush(lines, last_user_id)
+            lines, size = [], len(header)
+        lines += block
+        size += block_size
+        last_user_id = user_id
+
+    with transaction.atomic():
+        if lines:
+            flush(lines, last_user_id)
+        elif not is_resumed:
+            enqueue_notification("No overdue borrowings")
+            queued += 1
+
+        checkpoint.completed_at = timezone.now()
+        checkpoint.save(update_fields=["completed_at", "updated_at"])
+    return queued
@@ -1,14 +1,42 @@
-from datetime import timezone
-from unittest import TestCase
+import asyncio
+import json
+import warnings
+from base64 import urlsafe_b64encode
+from datetime import timedelta, timezone
+from io import StringIO
+from unittest import TestCase, mock, skipUnless
 
+import httpx
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import F
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone as django_timezone
 from jsonschema.exceptions import ValidationError
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
 from book.models import Book
-from borrowing.models import Borrowing
+from borrowing.cache import get_scope
+from borrowing.models import Borrowing, UserLoanState
+from borrowing.services import compute_loan_states
+from borrowing.tasks import send_notification_overdue_tasks
+from library_core.db import (
+    ReplicaRouter,
+    get_read_database,
+    pin_to_primary,
+    reading_from,
+)
+from notification.models import DigestCheckpoint, Notification
+from payment.models import Payment
+from payment.services import cancel_borrowing_checkout, save_status_changes
 from user.models import User
 
 
@@ -220,3 +248,818 @@ class BorrowingFilterTests(TestCase):
         response = self.client.get(reverse("borrowing-list"))
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.data), 1)
+
+
+class BorrowingKeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="keyset@example.com", password="password"
+        )
+        self.book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=10, daily_fee=1
+        )
+        self.borrowings = [
+            Borrowing.objects.create(
+                user=self.user,
+                book=self.book,
+                expected_return_date="2099-01-01",
+            )
+            for _ in range(5)
+        ]
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("borrowings:borrowings-list")
+
+    def test_walk_all_pages(self):
+        seen = []
+        response = self.client.get(
+            self.url, {"pagination": "keyset", "page_size": 2}
+        )
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            seen.extend(item["id"] for item in response.data["results"])
+            if response.data["next"] is None:
+                break
+            response = self.client.get(response.data["next"])
+
+        self.assertEqual(seen, [b.id for b in self.borrowings])
+
+    def test_page_size_is_capped(self):
+        response = self.client.get(
+            self.url, {"pagination": "keyset", "page_size": 10_000}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertIsNone(response.data["next"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_malformed_cursor_values(self):
+        for position in (
+            ["x", 1], [None, None], [{"a": 1}, 1], ["2024-01-01", "zz"]
+        ):
+            cursor = urlsafe_b64encode(json.dumps(position).encode())
+            response = self.client.get(self.url, {"cursor": cursor.decode()})
+            self.assertEqual(
+                response.status_code, status.HTTP_404_NOT_FOUND, position
+            )
+
+
+@override_settings(
+    CACHES={
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "borrowing-list-cache-tests",
+        }
+    }
+)
+class BorrowingListCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="cached@example.com", password="password"
+        )
+        self.other_user = User.objects.create_user(
+            email="other@example.com", password="password"
+        )
+        self.book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=10, daily_fee=1
+        )
+        Borrowing.objects.create(
+            user=self.user, book=self.book, expected_return_date="2099-01-01"
+        )
+        self.url = reverse("borrowings:borrowings-list")
+
+    def test_cache_is_per_user(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(len(response.data["results"]), 1)
+
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data["results"]), 0)
+
+    def test_cache_is_invalidated_by_own_borrowings_only(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(self.url)
+        self.client.force_authenticate(user=self.other_user)
+        self.client.get(self.url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Borrowing.objects.create(
+                user=self.other_user,
+                book=self.book,
+                expected_return_date="2099-01-01",
+            )
+
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data["results"]), 1)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "HIT")
+
+    def test_renamed_book_is_shown_in_cached_lists(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(self.url)
+
+        self.book.title = "Renamed Book"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book.save(update_fields=["title"])
+
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["book"], "Renamed Book")
+
+    def test_cache_stats(self):
+        admin = User.objects.create_superuser(
+            email="stats@example.com", password="password"
+        )
+        self.client.force_authenticate(user=self.user)
+        self.client.get(self.url)
+        self.client.get(self.url)
+
+        stats_url = reverse("borrowings:borrowings-cache-stats")
+        response = self.client.get(stats_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(stats_url)
+        self.assertEqual(response.data, {"hits": 1, "misses": 1})
+
+
+class BorrowingCheckoutPipelineTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="borrower@example.com", password="password"
+        )
+        self.book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=2, daily_fee=1
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("borrowings:borrowings-list")
+
+    @mock.patch("borrowing.views.create_payment_checkout_session")
+    def test_create_commits_pending_payment_before_stripe(self, task):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                self.url,
+                {"book": self.book.id, "expected_return_date": "2099-01-01"},
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        payment = Payment.objects.get(pk=response.data["payment_id"])
+        self.assertEqual(payment.status, Payment.Status.PENDING)
+        self.assertIsNone(payment.session_id)
+        task.delay.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        task.delay.assert_called_once()
+        self.assertEqual(task.delay.call_args.args[0], payment.id)
+
+
+@override_settings(TELEGRAM_CHAT_ID="chat")
+class OverdueDigestTests(APITestCase):
+    def setUp(self):
+        self.book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=50, daily_fee=1
+        )
+        self.today = django_timezone.now().date()
+        self.users = [
+            User.objects.create_user(
+                email=f"reader{index}@example.com", password="password"
+            )
+            for index in range(3)
+        ]
+        for user in self.users:
+            for days in (-2, -1, 1, 5):
+                Borrowing.objects.create(
+                    user=user,
+                    book=self.book,
+                    expected_return_date=self.today + timedelta(days=days + 7),
+                )
+        Borrowing.objects.update(
+            borrow_date=self.today - timedelta(days=7),
+            expected_return_date=F("expected_return_date") - timedelta(days=7),
+        )
+        Notification.objects.all().delete()
+
+    def test_digest_groups_loans_per_user_in_one_query(self):
+        with self.assertNumQueries(10):
+            queued = send_notification_overdue_tasks()
+
+        self.assertEqual(queued, 1)
+        message = Notification.objects.get().message
+        for user in self.users:
+            self.assertEqual(message.count(user.email), 1)
+        self.assertEqual(message.count("Overdue:"), 3)
+        self.assertEqual(message.count("Due tomorrow:"), 3)
+        self.assertEqual(message.count("- Test Book"), 9)
+
+    @mock.patch("borrowing.tasks.TelegramBot.MAX_MESSAGE_LENGTH", 250)
+    def test_messages_hold_whole_users(self):
+        queued = send_notification_overdue_tasks()
+
+        self.assertEqual(queued, 3)
+        for notification in Notification.objects.all():
+            self.assertLessEqual(len(notification.message), 250)
+            self.assertEqual(notification.message.count("User:"), 1)
+
+    def test_resumes_after_checkpoint(self):
+        DigestCheckpoint.objects.create(
+            name=f"overdue:{self.today.isoformat()}",
+            last_user_id=self.users[1].id,
+        )
+
+        send_notification_overdue_tasks()
+        send_notification_overdue_tasks()
+
+        message = Notification.objects.get().message
+        self.assertNotIn(self.users[0].email, message)
+        self.assertNotIn(self.users[1].email, message)
+        self.assertIn(self.users[2].email, message)
+
+    def test_crash_before_completion_does_not_resend(self):
+        Borrowing.objects.all().delete()
+        Notification.objects.all().delete()
+        save = DigestCheckpoint.save
+
+        def crash_on_completion(checkpoint, *args, **kwargs):
+            if checkpoint.completed_at:
+                raise RuntimeError("worker lost")
+            return save(checkpoint, *args, **kwargs)
+
+        with mock.patch.object(DigestCheckpoint, "save", crash_on_completion):
+            with self.assertRaises(RuntimeError):
+                send_notification_overdue_tasks()
+        send_notification_overdue_tasks()
+
+        self.assertEqual(
+            Notification.objects.get().message, "No overdue borrowings"
+        )
+
+
+class HotQueryPlanTests(APITestCase):
+    """
+    The hottest borrowing and payment lookups must stay index-backed.
+    Each query is explained against a seeded dataset where only a small
+    share of loans is active and a small share of payments is pending.
+    """
+
+    USERS = 500
+    BORROWINGS = 30000
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(email=f"reader{index}@example.com", password="!")
+            for index in range(cls.USERS)
+        )
+        books = Book.objects.bulk_create(
+            Book(
+                title=f"Book {index}", author="Author", cover="SOFT",
+                inventory=10, daily_fee=1,
+            )
+            for index in range(cls.USERS)
+        )
+        today = django_timezone.now().date()
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(
+                user=users[index % cls.USERS],
+                book=books[index * 7 % cls.USERS],
+                expected_return_date=today + timedelta(days=1),
+            )
+            for index in range(cls.BORROWINGS)
+        )
+        # Loans start today on insert; back-date them with their due dates
+        for index, borrowing in enumerate(borrowings):
+            borrowing.borrow_date = today - timedelta(days=60)
+            borrowing.expected_return_date = today + timedelta(
+                days=index % 60 - 30
+            )
+            borrowing.actual_return_date = (
+                None if index % 40 == 0 else today - timedelta(days=1)
+            )
+        Borrowing.objects.bulk_update(
+            borrowings,
+            ["borrow_date", "expected_return_date", "actual_return_date"],
+            batch_size=5000,
+        )
+        Payment.objects.bulk_create(
+            Payment(
+                borrowing=borrowing,
+                session_id=f"cs_test_{index}",
+                money_to_pay=100,
+                status=(
+                    Payment.Status.PENDING
+                    if index % 50 == 0
+                    else Payment.Status.PAID
+                ),
+            )
+            for index, borrowing in enumerate(borrowings)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        cls.user, cls.book = users[0], books[0]
+        cls.today = today
+
+    def assertIndexScan(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertNotIn("Seq Scan", plan, msg=plan)
+        self.assertIn(index_name, plan, msg=plan)
+
+    def test_active_borrowing_of_book(self):
+        self.assertIndexScan(
+            Borrowing.objects.filter(
+                user=self.user, book=self.book, actual_return_date__isnull=True
+            ),
+            "borrowing_active_user_book_idx",
+        )
+
+    def test_overdue_borrowings(self):
+        self.assertIndexScan(
+            Borrowing.objects.filter(
+                expected_return_date__lte=self.today - timedelta(days=25),
+                actual_return_date__isnull=True,
+            ),
+            "borrowing_active_due_idx",
+        )
+
+    def test_pending_payments_of_user(self):
+        self.assertIndexScan(
+            Payment.objects.filter(
+                borrowing__user=self.user, status=Payment.Status.PENDING
+            ),
+            "payment_pending_borrowing_idx",
+        )
+
+    def test_pending_payments_batch(self):
+        self.assertIndexScan(
+            Payment.objects.filter(
+                status=Payment.Status.PENDING, id__gt=0
+            ).order_by("id")[:100],
+            "payment_pending_id_idx",
+        )
+
+    def test_payment_by_session_id(self):
+        self.assertIndexScan(
+            Payment.objects.filter(session_id="cs_test_50"),
+            "payment_payment_session_id",
+        )
+
+
+@override_settings(TELEGRAM_CHAT_ID=None)
+class BorrowingCreateQueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="borrower@example.com", password="password"
+        )
+        self.book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=2, daily_fee=1
+        )
+        UserLoanState.objects.create(user=self.user)
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("borrowings:borrowings-list")
+        self.data = {
+            "book": self.book.id,
+            "expected_return_date": "2099-01-01",
+        }
+
+    @mock.patch("borrowing.views.create_payment_checkout_session")
+    def test_borrow_query_count(self, task):
+        # savepoint, eligibility, reserve, borrowing, loan state, payment,
+        # loan state, release
+        with self.assertNumQueries(8):
+            response = self.client.post(self.url, self.data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    @mock.patch("borrowing.views.create_payment_checkout_session")
+    def test_rejected_borrow_query_count(self, task):
+        Borrowing.objects.create(
+            user=self.user, book=self.book, expected_return_date="2099-01-01"
+        )
+        # savepoint, eligibility, rollback, release
+        with self.assertNumQueries(4):
+            response = self.client.post(self.url, self.data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("already borrowed", str(response.data))
+
+
+@override_settings(TELEGRAM_CHAT_ID=None)
+class UserLoanStateTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="borrower@example.com", password="password"
+        )
+        self.books = [
+            Book.objects.create(
+                title=f"Book {index}", author="Author", inventory=2,
+                daily_fee=1,
+            )
+            for index in range(2)
+        ]
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("borrowings:borrowings-list")
+
+    def borrow(self, book):
+        return self.client.post(
+            self.url, {"book": book.id, "expected_return_date": "2099-01-01"}
+        )
+
+    def assertStateIsExact(self):
+        state = UserLoanState.objects.get(pk=self.user.pk)
+        expected = compute_loan_states([self.user.pk])[self.user.pk]
+        self.assertEqual(state.active_loans, expected.active_loans)
+        self.assertEqual(
+            sorted(state.active_book_ids), expected.active_book_ids
+        )
+        self.assertEqual(state.pending_payments, expected.pending_payments)
+        return state
+
+    @mock.patch("borrowing.views.create_payment_checkout_session")
+    def test_state_follows_borrow_pay_and_return(self, task):
+        response = self.borrow(self.books[0])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        state = self.assertStateIsExact()
+        self.assertEqual(state.active_book_ids, [self.books[0].id])
+        self.assertEqual(state.pending_payments, 1)
+
+        response = self.borrow(self.books[1])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("pending payments", str(response.data))
+
+        payment = Payment.objects.get()
+        payment.status = Payment.Status.PAID
+        save_status_changes([payment])
+        self.assertEqual(self.assertStateIsExact().pending_payments, 0)
+
+        response = self.borrow(self.books[0])
+        self.assertIn("already borrowed", str(response.data))
+
+        borrowing = Borrowing.objects.get()
+        self.client.post(
+            reverse("borrowings:borrowings-return-borrowing-book",
+                    args=[borrowing.id])
+        )
+        self.assertEqual(self.assertStateIsExact().active_loans, 0)
+
+    def test_cancelled_checkout_is_removed(self):
+        borrowing = Borrowing.objects.create(
+            user=self.user, book=self.books[0],
+            expected_return_date="2099-01-01",
+        )
+        Payment.objects.create(borrowing=borrowing, money_to_pay=100)
+        self.assertEqual(self.assertStateIsExact().active_loans, 1)
+
+        cancel_borrowing_checkout(Payment.objects.get())
+
+        state = self.assertStateIsExact()
+        self.assertEqual(state.active_loans, 0)
+        self.assertEqual(state.pending_payments, 0)
+
+    def test_concurrent_settlements_count_once(self):
+        borrowing = Borrowing.objects.create(
+            user=self.user, book=self.books[0],
+            expected_return_date="2099-01-01",
+        )
+        Payment.objects.create(borrowing=borrowing, money_to_pay=100)
+        # The success redirect and the webhook load the same pending row
+        redirect, webhook = Payment.objects.get(), Payment.objects.get()
+        for payment in (redirect, webhook):
+            payment.status = Payment.Status.PAID
+
+        with mock.patch("payment.services.payment_successful") as signal:
+            self.assertEqual(save_status_changes([redirect]), [redirect])
+            self.assertEqual(save_status_changes([webhook]), [])
+
+        signal.send.assert_called_once()
+        self.assertEqual(self.assertStateIsExact().pending_payments, 0)
+
+    def test_status_saved_on_the_model_updates_state(self):
+        borrowing = Borrowing.objects.create(
+            user=self.user, book=self.books[0],
+            expected_return_date="2099-01-01",
+        )
+        Payment.objects.create(borrowing=borrowing, money_to_pay=100)
+        payment = Payment.objects.get()
+
+        payment.status = Payment.Status.EXPIRED
+        payment.save()
+        self.assertEqual(self.assertStateIsExact().pending_payments, 0)
+        payment.save()
+        payment.status = Payment.Status.PENDING
+        payment.save()
+        self.assertEqual(self.assertStateIsExact().pending_payments, 1)
+
+    def test_rebuild_command_repairs_drift(self):
+        Borrowing.objects.create(
+            user=self.user, book=self.books[0],
+            expected_return_date="2099-01-01",
+        )
+        UserLoanState.objects.filter(pk=self.user.pk).update(
+            active_loans=5, active_book_ids=[]
+        )
+
+        with self.assertRaises(CommandError):
+            call_command("rebuild_loan_state", "--check", stdout=StringIO())
+        call_command("rebuild_loan_state", stdout=StringIO())
+        call_command("rebuild_loan_state", "--check", stdout=StringIO())
+        self.assertStateIsExact()
+
+
+@override_settings(TELEGRAM_CHAT_ID=None)
+class BorrowingBulkTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="kiosk@example.com", password="password"
+        )
+        self.books = [
+            Book.objects.create(
+                title=f"Book {index}", author="Author", inventory=1,
+                daily_fee=1,
+            )
+            for index in range(3)
+        ]
+        self.client.force_authenticate(user=self.user)
+
+    @mock.patch("borrowing.views.create_payment_checkout_session")
+    def test_bulk_checkout_reports_each_item(self, task):
+        self.books[2].inventory = 0
+        self.books[2].save()
+        items = [
+            {"book": book.id, "expected_return_date": "2099-01-01"}
+            for book in [self.books[0], self.books[0], *self.books[1:]]
+        ]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("borrowings:borrowings-bulk-checkout"),
+                {"items": items},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertIn("payment_id", results[0])
+        self.assertIn("already borrowed", results[1]["error"])
+        self.assertIn("payment_id", results[2])
+        self.assertIn("out of stock", results[3]["error"])
+        self.assertEqual(Borrowing.objects.count(), 2)
+        self.assertEqual(task.delay.call_count, 2)
+        state = UserLoanState.objects.get(pk=self.user.pk)
+        self.assertEqual(state.active_loans, 2)
+        self.assertEqual(state.pending_payments, 2)
+
+    @mock.patch("borrowing.views.create_payment_checkout_session")
+    def test_bulk_return(self, task):
+        today = django_timezone.now().date()
+        borrowings = [
+            Borrowing.objects.create(
+                user=self.user, book=book, expected_return_date="2099-01-01"
+            )
+            for book in self.books[:2]
+        ]
+        Borrowing.objects.filter(pk=borrowings[1].pk).update(
+            borrow_date=today - timedelta(days=10),
+            expected_return_date=today - timedelta(days=3),
+        )
+        other = User.objects.create_user(
+            email="other@example.com", password="password"
+        )
+        foreign = Borrowing.objects.create(
+            user=other, book=self.books[2], expected_return_date="2099-01-01"
+        )
+        ids = [borrowings[0].id, borrowings[1].id, foreign.id]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("borrowings:borrowings-bulk-return"),
+                {"ids": ids},
+                format="json",
+            )
+
+        results = {item["id"]: item for item in response.data["results"]}
+        self.assertEqual(results[borrowings[0].id]["status"], "returned")
+        self.assertNotIn("payment_id", results[borrowings[0].id])
+        self.assertIn("payment_id", results[borrowings[1].id])
+        self.assertEqual(results[foreign.id]["status"], "not_found")
+        self.assertEqual(Payment.objects.get().type, Payment.Type.FINE)
+        task.delay.assert_called_once()
+        for book in self.books[:2]:
+            book.refresh_from_db()
+            self.assertEqual(book.inventory, 2)
+        self.assertEqual(
+            UserLoanState.objects.get(pk=self.user.pk).active_loans, 0
+        )
+
+        response = self.client.post(
+            reverse("borrowings:borrowings-bulk-return"),
+            {"ids": ids[:1]},
+            format="json",
+        )
+        self.assertEqual(
+            response.data["results"][0]["status"], "already_returned"
+        )
+
+
+@override_settings(TELEGRAM_CHAT_ID=None)
+class BorrowingExportTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.user = User.objects.create_user(
+            email="reader@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Test, Book", author="Author", inventory=5, daily_fee=1
+        )
+        for user in (self.user, self.admin_user):
+            Borrowing.objects.create(
+                user=user, book=book, expected_return_date="2099-01-01"
+            )
+
+    def export(self, export_format, **params):
+        response = self.client.get(
+            reverse("borrowings:borrowings-export", args=[export_format]),
+            params,
+            HTTP_ACCEPT="text/csv",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_contains_own_borrowings_only(self):
+        self.client.force_authenticate(user=self.user)
+        lines = self.export("csv").splitlines()
+
+        self.assertEqual(lines[0].split(",")[:2], ["id", "borrow_date"])
+        self.assertEqual(len(lines), 2)
+        self.assertIn('"Test, Book"', lines[1])
+        self.assertIn(self.user.email, lines[1])
+
+    def test_ndjson_applies_list_filters(self):
+        self.client.force_authenticate(user=self.admin_user)
+        rows = [
+            json.loads(line)
+            for line in self.export("ndjson", user_id=self.user.id)
+            .splitlines()
+        ]
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["user__email"], self.user.email)
+        self.assertEqual(rows[0]["expected_return_date"], "2099-01-01")
+
+
+@override_settings(TELEGRAM_CHAT_ID=None, ALLOWED_HOSTS=["testserver"])
+class BorrowingAsgiExportTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="reader@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Book", author="Author", inventory=5, daily_fee=1
+        )
+        for _ in range(3):
+            Borrowing.objects.create(
+                user=self.user, book=book, expected_return_date="2099-01-01"
+            )
+
+    async def export(self):
+        transport = httpx.ASGITransport(app=get_asgi_application())
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://testserver"
+        ) as http:
+            return await http.get(
+                reverse("borrowings:borrowings-export", args=["csv"]),
+                headers={
+                    "Authorize": f"Bearer {AccessToken.for_user(self.user)}"
+                },
+            )
+
+    def test_export_is_streamed_in_chunks(self):
+        with (
+            mock.patch("borrowing.export.EXPORT_CHUNK_SIZE", 2),
+            warnings.catch_warnings(record=True) as caught,
+        ):
+            warnings.simplefilter("always")
+            response = asyncio.run(self.export())
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.text.splitlines()), 4)
+        self.assertFalse(
+            [w for w in caught if "iterators" in str(w.message)]
+        )
+
+
+@override_settings(REPLICA_DATABASE="replica")
+class ReplicaRoutingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="reader@example.com", password="password"
+        )
+
+    def test_router_follows_read_context(self):
+        router = ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Book))
+        with reading_from("replica"):
+            self.assertEqual(router.db_for_read(Book), "replica")
+            self.assertEqual(router.db_for_write(Book), "default")
+        self.assertIsNone(router.db_for_read(Book))
+
+    @mock.patch("library_core.db.measure_lag", return_value=0)
+    def test_pinned_users_read_from_primary(self, measure_lag):
+        self.assertEqual(get_read_database(AnonymousUser()), "replica")
+        self.assertEqual(get_read_database(self.user), "replica")
+
+        pin_to_primary(self.user)
+        self.assertIsNone(get_read_database(self.user))
+        self.assertEqual(get_read_database(AnonymousUser()), "replica")
+        # The lag verdict is cached between checks
+        self.assertEqual(measure_lag.call_count, 1)
+
+    @mock.patch("library_core.db.measure_lag", return_value=10)
+    def test_lagging_replica_is_skipped(self, measure_lag):
+        self.assertIsNone(get_read_database(AnonymousUser()))
+
+    def test_successful_writes_pin_the_user(self):
+        self.client.force_authenticate(user=self.user)
+        with mock.patch("library_core.db.measure_lag", return_value=0):
+            self.assertEqual(get_read_database(self.user), "replica")
+            response = self.client.patch(
+                reverse("users:user_manage"), {"first_name": "Ann"}
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIsNone(get_read_database(self.user))
+
+
+@skipUnless("replica" in settings.DATABASES, "no replica database alias")
+@override_settings(REPLICA_DATABASE="replica")
+class ReplicaReadTests(TransactionTestCase):
+    # The test runner collects the databases of skipped classes too
+    databases = {"default"} | ({"replica"} & settings.DATABASES.keys())
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email="reader@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Book", author="Author", inventory=5, daily_fee=1
+        )
+        self.borrowing = Borrowing.objects.create(
+            user=self.user, book=book, expected_return_date="2099-01-01"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def read(self, url):
+        with CaptureQueriesContext(connections["default"]) as primary:
+            with CaptureQueriesContext(connections["replica"]) as replica:
+                response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(primary), len(replica)
+
+    def retrieve(self):
+        return self.read(
+            reverse("borrowings:borrowings-detail", args=[self.borrowing.id])
+        )
+
+    def test_reads_follow_own_writes_to_primary(self):
+        primary, replica = self.retrieve()
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        self.client.patch(reverse("users:user_manage"), {"first_name": "A"})
+
+        primary, replica = self.retrieve()
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_cache_misses_after_a_bump_read_from_primary(self):
+        url = reverse("borrowings:borrowings-list")
+        primary, replica = self.read(url)
+        self.assertGreater(replica, 0)
+
+        # A change the user did not make, so they are not pinned
+        self.borrowing.expected_return_date = "2099-02-01"
+        self.borrowing.save()
+        primary, replica = self.read(url)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        # Once the bump is older than the pin window
+        self.borrowing.save()
+        cache.delete(f"namespace:{get_scope(self.user)}:bumped")
+        primary, replica = self.read(url)
+        self.assertGreater(replica, 0)
@@ -1,53 +1,91 @@
 import stripe
+from adrf.viewsets import GenericViewSet
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
+from django.urls import reverse
 from django.utils import timezone
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from drf_spectacular.utils import extend_schema, OpenApiParameter
-from rest_framework import viewsets, mixins, status
+from rest_framework import mixins, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from stripe import StripeError
 
+from book.services import release_copy
+from borrowing.cache import (
+    BORROWINGS_LIST_TIMEOUT,
+    get_list_cache_key,
+    get_scope,
+    get_stats,
+    invalidate_user_borrowings,
+    record,
+)
+from borrowing.export import (
+    EXPORT_FORMATS,
+    ExportContentNegotiation,
+    export_response,
+)
 from borrowing.filters import BorrowingFilterBackend
-from borrowing.mixins import GenericMethodsMixin
+from borrowing.mixins import GenericMethodsMixin, KeysetPaginationMixin
 from borrowing.models import Borrowing
+from borrowing.pagination import BorrowingKeysetPagination
 from borrowing.serializers import (
     BorrowingSerializer,
     BorrowingListSerializer,
     BorrowingDetailSerializer,
     BorrowingCreateSerializer,
     BorrowingReturnSerializer,
+    BorrowingBulkCheckoutSerializer,
+    BorrowingBulkReturnSerializer,
 )
+from borrowing.services import (
+    borrow_books,
+    record_loans_closed,
+    return_borrowings,
+)
+from library_core.cache import filling
+from library_core.db import ReplicaReadMixin
 from payment.models import Payment
-from payment.services import create_payment_session
+from payment.services import (
+    acreate_payment_session,
+    build_payment,
+    create_pending_payments,
+    get_checkout_urls,
+)
+from payment.tasks import create_payment_checkout_session
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
 
 @extend_schema(tags=["Borrowings"])
 class BorrowingViewSet(
+    ReplicaReadMixin,
     GenericMethodsMixin,
+    KeysetPaginationMixin,
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
-    viewsets.GenericViewSet,
+    GenericViewSet,
 ):
-    queryset = Borrowing.objects.select_related("book", "user")
+    queryset = Borrowing.objects.select_related("book", "user").order_by(
+        "borrow_date", "id"
+    )
     serializer_class = BorrowingSerializer
     permission_classes = [IsAuthenticated]
     filter_backends = [BorrowingFilterBackend]
+    keyset_pagination_class = BorrowingKeysetPagination
     action_serializers = {
         "list": BorrowingListSerializer,
         "retrieve": BorrowingDetailSerializer,
         "create": BorrowingCreateSerializer,
         "return_borrowing_book": BorrowingReturnSerializer,
         "create_payment": BorrowingReturnSerializer,
+        "bulk_checkout": BorrowingBulkCheckoutSerializer,
+        "bulk_return": BorrowingBulkReturnSerializer,
     }
 
-    @method_decorator(cache_page(60 * 15), name="borrowings")
     @extend_schema(
         summary="List all borrowings",
         description="Retrieve a list of all borrowings with details"
@@ -67,6 +105,13 @@ class BorrowingViewSet(
                 required=False,
                 type=int,
             ),
+            OpenApiParameter(
+                name="pagination",
+                description="Set to `keyset` to page with opaque cursors "
+                "ordered by (borrow_date, id) instead of page numbers",
+                required=False,
+                type=str,
+            ),
         ],
         responses={
             200: BorrowingListSerializer(many=True),
@@ -74,33 +119,188 @@ class BorrowingViewSet(
         },
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        cache_key = get_list_cache_key(request)
+        data = cache.get(cache_key)
+        if data is not None:
+            record("hits")
+            return Response(data, headers={"X-Cache": "HIT"})
+
+        record("misses")
+        with filling(get_scope(request.user)):
+            response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(cache_key, response.data, BORROWINGS_LIST_TIMEOUT)
+        response["X-Cache"] = "MISS"
+        return response
+
+    @extend_schema(
+        summary="Export borrowings",
+        description="Stream every borrowing visible to the user as CSV or"
+        " NDJSON. Accepts the same `is_active` and `user_id` filters as"
+        " the list.",
+        responses={
+            (200, media_type): str for media_type in EXPORT_FORMATS.values()
+        },
+    )
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path=r"export/(?P<export_format>csv|ndjson)",
+        url_name="export",
+        content_negotiation_class=ExportContentNegotiation,
+    )
+    def export(self, request, export_format=None):
+        return export_response(
+            self.filter_queryset(self.get_queryset()),
+            [
+                "id",
+                "borrow_date",
+                "expected_return_date",
+                "actual_return_date",
+                "user_id",
+                "user__email",
+                "book_id",
+                "book__title",
+            ],
+            export_format,
+            filename="borrowings",
+        )
+
+    @extend_schema(
+        summary="Borrowing list cache statistics",
+        description="Hit and miss counters of the borrowing list cache. "
+        "Requires admin privileges.",
+    )
+    @action(
+        methods=["GET"],
+        detail=False,
+        permission_classes=[IsAdminUser],
+        url_path="cache-stats",
+    )
+    def cache_stats(self, request):
+        return Response(get_stats(), status=status.HTTP_200_OK)
 
     @extend_schema(
         summary="Create a new borrowing",
-        description="Create a new borrowing record."
-        "Requires authentication.",
+        description="Create a new borrowing record with a pending payment."
+        " The Stripe checkout session is created in the background; poll"
+        " `checkout_url` until it returns the session url."
+        " Requires authentication.",
     )
-    @transaction.atomic
-    def create(self, request, *args, **kwargs):
-        response = super().create(request, *args, **kwargs)
-        borrowing_id = response.data.get("id")
-        borrowing = Borrowing.objects.get(id=borrowing_id)
+    async def create(self, request, *args, **kwargs):
+        borrowing, payment = await sync_to_async(self._create_borrowing)(
+            request
+        )
+        return Response(
+            {
+                "id": borrowing.id,
+                "payment_id": payment.id,
+                "checkout_url": self._get_checkout_url(request, payment),
+            },
+            status=status.HTTP_201_CREATED,
+        )
 
-        try:
-            payment = create_payment_session(
-                borrowing, request, Payment.Type.PAYMENT
+    @extend_schema(
+        summary="Borrow several books",
+        description="Borrow up to `BORROWING_BULK_MAX_ITEMS` books in one"
+        " transaction. Each item gets its own result: the borrowing with a"
+        " pending payment and its `checkout_url`, or an `error`."
+        " Requires authentication.",
+    )
+    @action(methods=["POST"], detail=False, url_path="bulk-checkout")
+    def bulk_checkout(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            results, borrowings = borrow_books(
+                request.user, serializer.validated_data["items"]
             )
-        except StripeError:
-            borrowing.delete()
-            return Response(
-                {"detail": "Error while creating payment session"},
-                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            payments = create_pending_payments(
+                borrowings, Payment.Type.PAYMENT
+            )
+            self._schedule_checkout_sessions(request, payments)
+
+        payments = dict(zip(borrowings, payments))
+        for result in results:
+            borrowing = result.pop("borrowing", None)
+            if borrowing is not None:
+                payment = payments[borrowing]
+                result.update(
+                    id=borrowing.id,
+                    payment_id=payment.id,
+                    checkout_url=self._get_checkout_url(request, payment),
+                )
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary="Return several borrowed books",
+        description="Return up to `BORROWING_BULK_MAX_ITEMS` borrowings in"
+        " one transaction. Each id gets a `status` of `returned`,"
+        " `already_returned` or `not_found`; overdue returns also get a"
+        " fine `payment_id` and `checkout_url`.",
+    )
+    @action(methods=["POST"], detail=False, url_path="bulk-return")
+    def bulk_return(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        with transaction.atomic():
+            outcomes, returned = return_borrowings(
+                self.filter_queryset(self.get_queryset()),
+                serializer.validated_data["ids"],
             )
+            overdue = [
+                borrowing for borrowing in returned if borrowing.is_overdue
+            ]
+            fines = create_pending_payments(overdue, Payment.Type.FINE)
+            self._schedule_checkout_sessions(request, fines)
 
+        results = {
+            pk: {"id": pk, "status": outcome}
+            for pk, outcome in outcomes.items()
+        }
+        for borrowing, fine in zip(overdue, fines):
+            results[borrowing.id].update(
+                payment_id=fine.id,
+                checkout_url=self._get_checkout_url(request, fine),
+            )
         return Response(
-            {"payment_url": payment.session_url},
-            status=status.HTTP_201_CREATED,
+            {"results": list(results.values())}, status=status.HTTP_200_OK
+        )
+
+    @transaction.atomic
+    def _create_borrowing(self, request) -> tuple[Borrowing, Payment]:
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        borrowing = serializer.instance
+
+        payment = build_payment(borrowing, Payment.Type.PAYMENT)
+        payment.save()
+        self._schedule_checkout_sessions(request, [payment])
+        return borrowing, payment
+
+    @staticmethod
+    def _schedule_checkout_sessions(request, payments) -> None:
+        success_url, cancel_url = get_checkout_urls(request)
+        payment_ids = [payment.id for payment in payments]
+
+        def schedule():
+            for payment_id in payment_ids:
+                create_payment_checkout_session.delay(
+                    payment_id, success_url, cancel_url
+                )
+
+        transaction.on_commit(schedule)
+
+    @staticmethod
+    def _get_checkout_url(request, payment) -> str:
+        return request.build_absolute_uri(
+            reverse(
+                "payments:payments-payment-checkout",
+                kwargs={"pk": payment.id},
+            )
         )
 
     def perform_create(self, serializer):
@@ -126,18 +326,17 @@ class BorrowingViewSet(
         permission_classes=[IsAuthenticated],
         url_path="return",
     )
-    def return_borrowing_book(self, request, pk=None):
-        borrowing = self.get_object()
-        if borrowing.actual_return_date:
+    async def return_borrowing_book(self, request, pk=None):
+        borrowing = await self.aget_object()
+        return_book = sync_to_async(self._return_book)
+        if borrowing.actual_return_date or not await return_book(borrowing):
             return Response(
                 {"message": "Book has already been returned"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        self._return_book(borrowing)
-
         if borrowing.is_overdue:
-            return self._handle_overdue_payment(borrowing, request)
+            return await self._handle_overdue_payment(borrowing, request)
 
         return Response(
             {
@@ -147,15 +346,24 @@ class BorrowingViewSet(
             status=status.HTTP_200_OK,
         )
 
-    def _return_book(self, borrowing):
-        borrowing.book.inventory += 1
-        borrowing.actual_return_date = timezone.now().date()
-        borrowing.save()
-        borrowing.book.save()
+    @transaction.atomic
+    def _return_book(self, borrowing) -> bool:
+        actual_return_date = timezone.now().date()
+        returned = Borrowing.objects.filter(
+            pk=borrowing.pk, actual_return_date__isnull=True
+        ).update(actual_return_date=actual_return_date)
+        if not returned:
+            return False
+
+        borrowing.actual_return_date = actual_return_date
+        release_copy(borrowing.book_id)
+        record_loans_closed([borrowing])
+        invalidate_user_borrowings(borrowing.user_id)
+        return True
 
-    def _handle_overdue_payment(self, borrowing, request):
+    async def _handle_overdue_payment(self, borrowing, request):
         try:
-            payment = create_payment_session(
+            payment = await acreate_payment_session(
                 borrowing, request, Payment.Type.FINE
             )
         except StripeError:
@@ -0,0 +1,154 @@
+"""
+Generation-based cache namespaces.
+
+Every namespace has a version counter stored in the cache, and keys
+built with `versioned_key` embed the current version. Invalidating a
+namespace is a single INCR: entries written under older versions are
+never read again and simply expire, so no keyspace scan is needed.
+A version also doubles as the ETag of conditional requests.
+
+Entries outlive replica lag, so for `REPLICA_PIN_SECONDS` after a bump
+the reads that fill a namespace go to the primary. Otherwise they are
+routed like any other read.
+"""
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+
+from library_core.db import reading_from
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def _version_key(namespace: str) -> str:
+    return f"namespace:{namespace}:version"
+
+
+def _bumped_key(namespace: str) -> str:
+    return f"namespace:{namespace}:bumped"
+
+
+def get_namespace_version(namespace: str) -> int:
+    """
+    A missing counter is seeded from the clock, so an evicted counter
+    never rolls back to a version that older entries were stored under.
+    """
+    key = _version_key(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_namespace(namespace: str) -> None:
+    key = _version_key(namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+    if settings.REPLICA_DATABASE:
+        cache.set(_bumped_key(namespace), True, settings.REPLICA_PIN_SECONDS)
+
+
+@contextmanager
+def filling(namespace: str):
+    """
+    Route the reads that fill an entry of `namespace`. Right after a
+    bump the replica may not have the change yet, and an entry filled
+    from it would serve the old rows until the next bump, so those
+    reads go to the primary.
+    """
+    if settings.REPLICA_DATABASE and cache.get(_bumped_key(namespace)):
+        with reading_from(None):
+            yield
+    else:
+        yield
+
+
+def invalidate_namespace(*namespaces: str) -> None:
+    """Bump the given namespaces once the current transaction commits."""
+
+    def bump():
+        for namespace in namespaces:
+            bump_namespace(namespace)
+
+    transaction.on_commit(bump)
+
+
+def versioned_key(namespace: str, *parts) -> str:
+    version = get_namespace_version(namespace)
+    return ":".join([namespace, str(version), *map(str, parts)])
+
+
+def cache_response(namespace: str, timeout: int):
+    """
+    Cache the data of successful DRF responses of a view method under
+    the request's host and full path in `namespace`.
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            key = versioned_key(
+                namespace, request.get_host(), request.get_full_path()
+            )
+            data = cache.get(key)
+            if data is not None:
+                return Response(data)
+
+            with filling(namespace):
+                response = view_method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, response.data, timeout)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def conditional_response(namespace: str):
+    """
+    Answer conditional GETs of a view method from the version of
+    `namespace` alone. The ETag comes from the version read before the
+    view runs, so a matching `If-None-Match` gets a 304 without touching
+    the database or a serializer. Responses must be revalidated before
+    reuse, since any bump changes them.
+
+    No Last-Modified is sent: at one-second resolution it would hide a
+    second bump within the same second from `If-Modified-Since`.
+    """
+
+    def set_validators(response, etag):
+        response.headers["ETag"] = etag
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ["Accept"])
+        return response
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            version = get_namespace_version(namespace)
+            etag = (
+                f'"{namespace}-{version}-{request.accepted_renderer.format}"'
+            )
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            return set_validators(response, etag)
+
+        return wrapper
+
+    return decorator
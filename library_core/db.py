@@ -0,0 +1,169 @@
+"""
+Read replica routing with bounded staleness.
+
+Viewsets using `ReplicaReadMixin` run their safe actions with reads
+routed to `REPLICA_DATABASE`. A user who has just written is pinned to
+the primary for `REPLICA_PIN_SECONDS`, so they always read their own
+writes, and everyone reads from the primary while the replica lags
+more than `REPLICA_MAX_LAG` seconds behind. Everything else, writes
+included, uses `default`.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+_read_database = ContextVar("read_database", default=None)
+
+LAG_SQL = """
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(
+        EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+    )
+END
+"""
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_database.get()
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary.
+        return True
+
+
+@contextmanager
+def reading_from(alias: str | None):
+    """Route reads in the block to `alias`, or the primary for None."""
+    token = _read_database.set(alias)
+    try:
+        yield
+    finally:
+        _read_database.reset(token)
+
+
+def _pin_key(user_id) -> str:
+    return f"replica:pin:{user_id}"
+
+
+def _lag_key(alias: str) -> str:
+    return f"replica:{alias}:lagging"
+
+
+def pin_to_primary(user) -> None:
+    if user is not None and user.is_authenticated:
+        cache.set(_pin_key(user.pk), True, settings.REPLICA_PIN_SECONDS)
+
+
+def measure_lag(alias: str) -> float:
+    """Seconds the replica is behind; 0 when it has replayed all WAL."""
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(LAG_SQL)
+        (lag,) = cursor.fetchone()
+    return float(lag or 0)
+
+
+def is_lagging(alias: str) -> bool:
+    try:
+        return measure_lag(alias) > settings.REPLICA_MAX_LAG
+    except DatabaseError:
+        return True
+
+
+def get_read_database(user) -> str | None:
+    """
+    The replica alias if `user` may read from it now, else None. The
+    pin and the cached lag verdict are read in one round trip; the lag
+    is measured at most every `REPLICA_LAG_CHECK_INTERVAL` seconds.
+    """
+    alias = settings.REPLICA_DATABASE
+    if not alias:
+        return None
+
+    lag_key = _lag_key(alias)
+    pin_key = _pin_key(user.pk) if user.is_authenticated else None
+    state = cache.get_many([lag_key, pin_key] if pin_key else [lag_key])
+    if pin_key in state:
+        return None
+
+    lagging = state.get(lag_key)
+    if lagging is None:
+        lagging = is_lagging(alias)
+        cache.set(lag_key, lagging, settings.REPLICA_LAG_CHECK_INTERVAL)
+    return None if lagging else alias
+
+
+class ReplicaReadMixin:
+    """Run `replica_actions` with reads routed to the replica."""
+
+    replica_actions = ("list", "retrieve")
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (
+            self.action in self.replica_actions
+            and request.method in SAFE_METHODS
+        ):
+            # Async views run `initial` in a worker thread whose context
+            # is copied back, so the previous value is restored by hand
+            # rather than through a token bound to that thread's context.
+            self._replica_previous = (_read_database.get(),)
+            _read_database.set(get_read_database(request.user))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        previous = getattr(self, "_replica_previous", None)
+        if previous is not None:
+            _read_database.set(*previous)
+            self._replica_previous = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class ReplicaPinMiddleware:
+    """Pin users to the primary after each successful unsafe request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self._pins(request, response):
+            pin_to_primary(getattr(request, "user", None))
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self._pins(request, response):
+            await sync_to_async(pin_to_primary)(
+                getattr(request, "user", None)
+            )
+        return response
+
+    @staticmethod
+    def _pins(request, response) -> bool:
+        return (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+        )
@@ -0,0 +1,211 @@
+"""
+Per-request SQL and timing instrumentation.
+
+With `INSTRUMENTATION_ENABLED`, every request counts its SQL queries,
+the time spent running them and the time spent in third-party APIs
+wrapped in `measure`. The totals are logged as one JSON line, added to
+the histograms in `library_core.metrics` and, with
+`INSTRUMENTATION_SERVER_TIMING`, sent back in a Server-Timing header.
+
+Disabled, the middleware drops out of the stack, no query wrapper is
+installed and `measure` only checks the setting.
+"""
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from asgiref.sync import (
+    iscoroutinefunction,
+    markcoroutinefunction,
+    sync_to_async,
+)
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+from library_core import metrics
+
+logger = logging.getLogger(__name__)
+
+_stats = ContextVar("request_stats", default=None)
+
+
+@dataclass
+class RequestStats:
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    db_time: float = 0.0
+    # (service, seconds) for every external call
+    calls: list = field(default_factory=list)
+
+    def get_call_times(self) -> dict[str, float]:
+        times = {}
+        for service, elapsed in self.calls:
+            times[service] = times.get(service, 0.0) + elapsed
+        return times
+
+
+def time_query(execute, sql, params, many, context):
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def add_query_timer(sender=None, connection=None, **kwargs) -> None:
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def install_query_timer() -> None:
+    """
+    Time queries on every connection, including the ones async views
+    use from `sync_to_async` worker threads.
+    """
+    connection_created.connect(
+        add_query_timer, dispatch_uid="library_core.instrumentation"
+    )
+    for connection in connections.all(initialized_only=True):
+        add_query_timer(connection=connection)
+
+
+@contextmanager
+def measure(service: str):
+    """
+    Time a call to `service`. Inside a request the call is reported
+    with the request; elsewhere, as in Celery, it is recorded at once.
+    """
+    if not settings.INSTRUMENTATION_ENABLED:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stats = _stats.get()
+        if stats is None:
+            metrics.record((metrics.EXTERNAL_CALL_DURATION, elapsed, service))
+        else:
+            stats.calls.append((service, elapsed))
+
+
+def get_view_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    return match.view_name if match else "unmatched"
+
+
+def get_server_timing(stats: RequestStats, duration: float) -> str:
+    entries = [
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"'
+    ]
+    for service, elapsed in stats.get_call_times().items():
+        entries.append(f"{service};dur={elapsed * 1000:.1f}")
+    entries.append(f"total;dur={duration * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def report(request, response, stats: RequestStats) -> None:
+    duration = time.perf_counter() - stats.started
+    view = get_view_name(request)
+    if settings.INSTRUMENTATION_SERVER_TIMING:
+        response["Server-Timing"] = get_server_timing(stats, duration)
+
+    logger.info(
+        json.dumps(
+            {
+                "view": view,
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "duration_ms": round(duration * 1000, 1),
+                "queries": stats.queries,
+                "db_ms": round(stats.db_time * 1000, 1),
+                "external_ms": {
+                    service: round(elapsed * 1000, 1)
+                    for service, elapsed in stats.get_call_times().items()
+                },
+            }
+        )
+    )
+    metrics.record(
+        (
+            metrics.REQUEST_DURATION,
+            duration,
+            view,
+            request.method,
+            response.status_code,
+        ),
+        (metrics.REQUEST_QUERIES, stats.queries, view),
+        (metrics.REQUEST_DB_DURATION, stats.db_time, view),
+        *(
+            (metrics.EXTERNAL_CALL_DURATION, elapsed, service)
+            for service, elapsed in stats.calls
+        ),
+    )
+
+
+class InstrumentationMiddleware:
+    """Collect `RequestStats` for each request and report them."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTATION_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        install_query_timer()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _stats.reset(token)
+        report(request, response, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _stats.reset(token)
+        await sync_to_async(report)(request, response, stats)
+        return response
+
+
+def metrics_view(request):
+    """Prometheus text exposition of `library_core.metrics`."""
+    if not settings.INSTRUMENTATION_ENABLED:
+        raise Http404
+
+    token = settings.INSTRUMENTATION_METRICS_TOKEN
+    if token and not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponseForbidden()
+
+    return HttpResponse(
+        metrics.render(), content_type="text/plain; version=0.0.4"
+    )
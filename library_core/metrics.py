@@ -0,0 +1,143 @@
+"""
+Prometheus-style histograms kept in Redis.
+
+Every web worker and Celery process adds its observations to the same
+hashes, so a scrape of any worker sees the whole deployment. Each
+observation increments only the bucket it falls in; buckets are made
+cumulative when the metrics are rendered.
+"""
+import json
+import logging
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def get_redis():
+    return get_redis_connection("default")
+
+
+class Histogram:
+    def __init__(
+        self, name: str, documentation: str, labels: tuple, buckets: tuple
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+
+    @property
+    def key(self) -> str:
+        return cache.make_key(f"metrics:{self.name}")
+
+    def observe(self, pipeline, value: float, *label_values) -> None:
+        """Queue one observation on a Redis `pipeline`."""
+        series = json.dumps(label_values)
+        bucket = bisect_left(self.buckets, value)
+        pipeline.hincrby(self.key, f"{series}|{bucket}", 1)
+        pipeline.hincrbyfloat(self.key, f"{series}|sum", value)
+
+    def render(self, fields: dict) -> list[str]:
+        series = defaultdict(lambda: {"sum": 0.0, "counts": {}})
+        for field, value in fields.items():
+            labels, _, part = field.decode().rpartition("|")
+            if part == "sum":
+                series[labels]["sum"] = float(value)
+            else:
+                series[labels]["counts"][int(part)] = int(value)
+
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        for labels, data in sorted(series.items()):
+            pairs = [
+                f'{name}="{escape(value)}"'
+                for name, value in zip(self.labels, json.loads(labels))
+            ]
+            total = 0
+            for index, bound in enumerate([*self.buckets, "+Inf"]):
+                total += data["counts"].get(index, 0)
+                bucket = ",".join([*pairs, f'le="{bound}"'])
+                lines.append(f"{self.name}_bucket{{{bucket}}} {total}")
+            selector = f"{{{','.join(pairs)}}}" if pairs else ""
+            lines.append(f"{self.name}_sum{selector} {data['sum']}")
+            lines.append(f"{self.name}_count{selector} {total}")
+        return lines
+
+
+def escape(value) -> str:
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace('"', '\\"')
+        .replace("\n", "\\n")
+    )
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling requests, per view.",
+    ("view", "method", "status"),
+    DURATION_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "SQL queries run per request, per view.",
+    ("view",),
+    COUNT_BUCKETS,
+)
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent in SQL per request, per view.",
+    ("view",),
+    DURATION_BUCKETS,
+)
+EXTERNAL_CALL_DURATION = Histogram(
+    "external_call_duration_seconds",
+    "Time spent in calls to third-party APIs.",
+    ("service",),
+    DURATION_BUCKETS,
+)
+HISTOGRAMS = (
+    REQUEST_DURATION,
+    REQUEST_QUERIES,
+    REQUEST_DB_DURATION,
+    EXTERNAL_CALL_DURATION,
+)
+
+
+def record(*observations) -> None:
+    """Store `(histogram, value, *labels)` observations in one round trip."""
+    try:
+        with get_redis().pipeline(transaction=False) as pipeline:
+            for histogram, value, *labels in observations:
+                histogram.observe(pipeline, value, *labels)
+            pipeline.execute()
+    except RedisError:
+        logger.warning("Could not record metrics")
+
+
+def render() -> str:
+    redis = get_redis()
+    with redis.pipeline(transaction=False) as pipeline:
+        for histogram in HISTOGRAMS:
+            pipeline.hgetall(histogram.key)
+        values = pipeline.execute()
+
+    lines = []
+    for histogram, fields in zip(HISTOGRAMS, values):
+        lines.extend(histogram.render(fields))
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    get_redis().delete(*(histogram.key for histogram in HISTOGRAMS))
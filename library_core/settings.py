@@ -43,27 +43,45 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework",
-    "debug_toolbar",
     "drf_spectacular",
     "user",
     "book",
     "borrowing",
     "django_celery_beat",
     "payment",
+    "notification",
+    "reporting",
+    "benchmark",
 ]
 
 MIDDLEWARE = [
+    "library_core.instrumentation.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "library_core.db.ReplicaPinMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# The toolbar slows every request down, so it only runs in development
+if DEBUG:
+    INSTALLED_APPS.append("debug_toolbar")
+    MIDDLEWARE.insert(2, "debug_toolbar.middleware.DebugToolbarMiddleware")
+
+# Query counts, DB and third-party API time per request, reported in
+# logs, a Prometheus endpoint and optionally a Server-Timing header
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED") == "True"
+INSTRUMENTATION_SERVER_TIMING = (
+    os.getenv("INSTRUMENTATION_SERVER_TIMING") == "True"
+)
+# Bearer token required to scrape /metrics/ when set
+INSTRUMENTATION_METRICS_TOKEN = os.getenv("INSTRUMENTATION_METRICS_TOKEN")
+
 ROOT_URLCONF = "library_core.urls"
 
 TEMPLATES = [
@@ -99,6 +117,24 @@ DATABASES = {
     }
 }
 
+# Safe viewset reads go to a streaming replica when one is configured
+if os.getenv("POSTGRES_REPLICA_HOST"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "HOST": os.getenv("POSTGRES_REPLICA_HOST"),
+        "PORT": os.getenv("POSTGRES_REPLICA_PORT", os.getenv("POSTGRES_PORT")),
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["library_core.db.ReplicaRouter"]
+REPLICA_DATABASE = "replica" if "replica" in DATABASES else None
+# A user reads from the primary for this long after each write
+REPLICA_PIN_SECONDS = 5
+# Seconds of replica lag after which all reads go to the primary
+REPLICA_MAX_LAG = 2
+REPLICA_LAG_CHECK_INTERVAL = 5
+
+TEST_RUNNER = "library_core.test_runner.PrimaryReadsTestRunner"
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -140,7 +176,7 @@ STATIC_URL = "static/"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.StatelessJWTAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
@@ -163,13 +199,34 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=5),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=10),
     "AUTH_HEADER_NAME": "HTTP_AUTHORIZE",
+    # Tokens carry a hash of the password they were issued under, so a
+    # password change revokes them
+    "TOKEN_OBTAIN_SERIALIZER": "user.serializers.TokenObtainPairSerializer",
 }
+# Users resolved from access tokens are cached this long; saving a user
+# drops the entries at once
+AUTH_USER_CACHE_TIMEOUT = 60
 
 
 INTERNAL_IPS = [
     "127.0.0.1",
 ]
 
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "library_core.instrumentation": {
+            "handlers": ["console"],
+            "level": "INFO",
+            "propagate": False,
+        },
+    },
+}
+
 
 CACHES = {
     "default": {
@@ -184,6 +241,16 @@ CACHES = {
 
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+# Telegram allows about one message per second to the same chat
+TELEGRAM_MESSAGE_INTERVAL = 1.0
+
+NOTIFICATION_BATCH_SIZE = 200
+NOTIFICATION_MAX_ATTEMPTS = 8
+NOTIFICATION_RETRY_DELAY = timedelta(seconds=30)
+NOTIFICATION_MAX_RETRY_DELAY = timedelta(hours=1)
+# How long a dispatcher run owns the rows it claimed. Keep it above the
+# time a batch takes to send, or rows may be sent twice.
+NOTIFICATION_CLAIM_TIMEOUT = timedelta(minutes=5)
 
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL")
 CELERY_TIMEZONE = "Europe/Kiev"
@@ -199,14 +266,50 @@ CELERY_BEAT_SCHEDULE = {
         "task": "payment.tasks.check_payment_expiration",
         "schedule": timedelta(seconds=20),
     },
+    "process_stripe_events": {
+        "task": "payment.tasks.process_stripe_events",
+        "schedule": timedelta(minutes=1),
+    },
+    "send_pending_notifications": {
+        "task": "notification.tasks.send_pending_notifications",
+        "schedule": timedelta(seconds=10),
+    },
+    "rollup_reports": {
+        "task": "reporting.tasks.rollup_reports",
+        "schedule": timedelta(minutes=15),
+    },
+    "reconcile_book_availability": {
+        "task": "book.tasks.reconcile_book_availability",
+        "schedule": timedelta(minutes=5),
+    },
 }
 
 STRIPE_PUBLIC_KEY = os.getenv("STRIPE_PUBLIC_KEY")
 STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+# Lets load tests point Stripe calls at a local stub
+STRIPE_API_BASE = os.getenv("STRIPE_API_BASE", "https://api.stripe.com")
 PAYMENT_SUCCESS_URL = "/api/payments/success"
 PAYMENT_CANCEL_URL = "/api/payments/cancel"
 
+# Pending payments younger than this are not checked against Stripe yet
+PAYMENT_RECONCILE_MIN_AGE = timedelta(minutes=5)
+PAYMENT_RECONCILE_BATCH_SIZE = 100
+PAYMENT_RECONCILE_MAX_BATCHES = 10
+PAYMENT_RECONCILE_WORKERS = 8
+
+# Most borrowings accepted by one bulk checkout or bulk return request
+BORROWING_BULK_MAX_ITEMS = 100
+
+# Days refreshed by every run of the reporting rollup task
+REPORTING_ROLLUP_DAYS = 2
+REPORTING_DEFAULT_RANGE_DAYS = 30
+REPORTING_MAX_RANGE_DAYS = 366
+
+# Availability counters mirrored in Redis are reloaded a day after loading
+BOOK_AVAILABILITY_TIMEOUT = 60 * 60 * 24
+BOOK_AVAILABILITY_MAX_IDS = 200
+
 
 if not os.getenv("DOCKER", False):
     DATABASES["default"]["HOST"] = "127.0.0.1"
@@ -0,0 +1,71 @@
+"""
+Production settings profile.
+
+Select it with DJANGO_SETTINGS_MODULE=library_core.settings_production.
+The web server and Celery both read that variable, so workers run with
+the same database and template setup as the API.
+"""
+
+import os
+
+from library_core.settings import *  # noqa: F401,F403
+from library_core.settings import (
+    DATABASES,
+    INSTALLED_APPS,
+    MIDDLEWARE,
+    TEMPLATES,
+)
+
+DEBUG = False
+
+ALLOWED_HOSTS = [
+    host
+    for host in os.getenv("DJANGO_ALLOWED_HOSTS", "").split(",")
+    if host
+]
+
+# The base settings add the toolbar whenever DJANGO_DEBUG is not "False"
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app != "debug_toolbar"]
+MIDDLEWARE = [
+    middleware
+    for middleware in MIDDLEWARE
+    if not middleware.startswith("debug_toolbar.")
+]
+
+# Each process keeps a psycopg pool per database instead of connecting
+# on every request. Persistent connections are not used, as the ASGI
+# server runs each request in a fresh thread and would never reuse them.
+# Keep (web + Celery processes) * max_size below Postgres max_connections.
+DATABASE_POOL_OPTIONS = {
+    "min_size": int(os.getenv("DATABASE_POOL_MIN_SIZE", 2)),
+    "max_size": int(os.getenv("DATABASE_POOL_MAX_SIZE", 10)),
+    # Seconds a request waits for a free connection before failing
+    "timeout": float(os.getenv("DATABASE_POOL_TIMEOUT", 10)),
+}
+for database in DATABASES.values():
+    database["CONN_MAX_AGE"] = 0
+    # Pooled connections are checked before they are handed out
+    database["CONN_HEALTH_CHECKS"] = True
+    database["OPTIONS"] = {
+        **database.get("OPTIONS", {}),
+        "pool": DATABASE_POOL_OPTIONS,
+    }
+
+TEMPLATES = [
+    {
+        **TEMPLATES[0],
+        "APP_DIRS": False,
+        "OPTIONS": {
+            **TEMPLATES[0]["OPTIONS"],
+            "loaders": [
+                (
+                    "django.template.loaders.cached.Loader",
+                    [
+                        "django.template.loaders.filesystem.Loader",
+                        "django.template.loaders.app_directories.Loader",
+                    ],
+                ),
+            ],
+        },
+    }
+]
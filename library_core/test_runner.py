@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class PrimaryReadsTestRunner(DiscoverRunner):
+    """
+    Run tests with every read on the primary. Test cases only reach the
+    databases they declare, so only the ones listing the replica opt in
+    to replica reads, with `override_settings(REPLICA_DATABASE=...)`.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._replica_database = settings.REPLICA_DATABASE
+        settings.REPLICA_DATABASE = None
+
+    def teardown_test_environment(self, **kwargs):
+        settings.REPLICA_DATABASE = self._replica_database
+        super().teardown_test_environment(**kwargs)
@@ -14,8 +14,9 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from debug_toolbar.toolbar import debug_toolbar_urls
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import path, include
 from drf_spectacular.views import (
     SpectacularAPIView,
@@ -23,13 +24,17 @@ from drf_spectacular.views import (
     SpectacularRedocView,
 )
 
+from library_core.instrumentation import metrics_view
+
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("metrics/", metrics_view, name="metrics"),
     path("api/books/", include("book.urls", namespace="books")),
     path("api/borrowings/", include("borrowing.urls", namespace="borrowings")),
     path("api/users/", include("user.urls", namespace="users")),
     path("api/payments/", include("payment.urls", namespace="payments")),
+    path("api/reports/", include("reporting.urls", namespace="reports")),
     path(
         "api/doc/",
         SpectacularAPIView.as_view(),
@@ -45,4 +50,9 @@ urlpatterns = [
         SpectacularRedocView.as_view(url_name="schema"),
         name="redoc",
     ),
-] + debug_toolbar_urls()
+] + staticfiles_urlpatterns()
+
+if "debug_toolbar" in settings.INSTALLED_APPS:
+    from debug_toolbar.toolbar import debug_toolbar_urls
+
+    urlpatterns += debug_toolbar_urls()
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from notification.models import Notification
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ("chat_id", "created_at", "attempts", "sent_at")
+    list_filter = ("sent_at",)
+    search_fields = ("message",)
@@ -0,0 +1,171 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+import httpx
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from notification.models import Notification
+from notification.telegram_bot import TelegramBot
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\n\n"
+
+
+def build_chunks(
+    notifications: list[Notification], limit: int
+) -> list[tuple[str, list[Notification]]]:
+    """
+    Coalesce consecutive notifications into as few messages as possible
+    without exceeding Telegram's message length `limit`.
+    """
+    chunks = []
+    text, members = "", []
+    for notification in notifications:
+        message = notification.message
+        if len(message) > limit:
+            message = message[: limit - 1] + "…"
+
+        candidate = f"{text}{SEPARATOR}{message}" if text else message
+        if len(candidate) > limit:
+            chunks.append((text, members))
+            text, members = message, []
+        else:
+            text = candidate
+        members.append(notification)
+
+    if members:
+        chunks.append((text, members))
+    return chunks
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    delay = settings.NOTIFICATION_RETRY_DELAY * 2 ** (attempts - 1)
+    return min(delay, settings.NOTIFICATION_MAX_RETRY_DELAY)
+
+
+def get_retry_after(response) -> int:
+    try:
+        return int(response.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        return 1
+
+
+async def send_chat(
+    bot: TelegramBot, chat_id: str, notifications: list, stats: dict
+) -> None:
+    """
+    Send the coalesced messages of one chat in order, keeping
+    `TELEGRAM_MESSAGE_INTERVAL` between them, and record the outcome on
+    the notifications.
+    """
+    chunks = build_chunks(notifications, bot.MAX_MESSAGE_LENGTH)
+    for index, (text, members) in enumerate(chunks):
+        if index:
+            await asyncio.sleep(settings.TELEGRAM_MESSAGE_INTERVAL)
+        try:
+            response = await bot.send_message_to_chat(chat_id, text)
+        except httpx.HTTPError as e:
+            logger.warning("Telegram request failed: %s", e)
+            response = None
+
+        if response is not None and response.is_success:
+            stats["messages"] += 1
+            stats["sent"] += len(members)
+            for notification in members:
+                notification.sent_at = timezone.now()
+            continue
+
+        if response is not None and response.status_code == 429:
+            retry_at = timezone.now() + timedelta(
+                seconds=get_retry_after(response)
+            )
+            for _, later in chunks[index:]:
+                stats["deferred"] += len(later)
+                for notification in later:
+                    notification.next_attempt_at = retry_at
+            return
+
+        stats["failed"] += len(members)
+        for notification in members:
+            notification.attempts += 1
+            notification.next_attempt_at = timezone.now() + get_retry_delay(
+                notification.attempts
+            )
+
+
+async def send_chats(
+    by_chat: dict[str, list], stats: dict, bot: TelegramBot = None
+) -> None:
+    """Send to all chats concurrently over one connection pool."""
+    own_bot = bot is None
+    if own_bot:
+        bot = TelegramBot(settings.TELEGRAM_BOT_TOKEN)
+    try:
+        await asyncio.gather(
+            *(
+                send_chat(bot, chat_id, notifications, stats)
+                for chat_id, notifications in by_chat.items()
+            )
+        )
+    finally:
+        if own_bot:
+            await bot.close()
+
+
+def claim_notifications() -> list[Notification]:
+    """
+    Lease a batch of due rows to this run by moving their
+    `next_attempt_at` past `NOTIFICATION_CLAIM_TIMEOUT`. Concurrent runs
+    skip them without waiting on a lock, and rows of a run that dies
+    before recording its outcome are sent again once the lease expires.
+    """
+    with transaction.atomic():
+        now = timezone.now()
+        pending = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(
+                sent_at__isnull=True,
+                next_attempt_at__lte=now,
+                attempts__lt=settings.NOTIFICATION_MAX_ATTEMPTS,
+            )
+            .order_by("id")[: settings.NOTIFICATION_BATCH_SIZE]
+        )
+        Notification.objects.filter(
+            id__in=[notification.id for notification in pending]
+        ).update(next_attempt_at=now + settings.NOTIFICATION_CLAIM_TIMEOUT)
+    return pending
+
+
+def dispatch_notifications(bot: TelegramBot = None) -> dict:
+    """
+    Send due outbox rows, each chat's in order and the chats at once,
+    over an async HTTP client.
+
+    Failed messages are retried with exponential backoff until
+    `NOTIFICATION_MAX_ATTEMPTS`. A 429 response postpones the rest of
+    the chat's messages by the `retry_after` Telegram asks for.
+
+    Rows are claimed and their outcomes saved in two short transactions,
+    so no lock is held while Telegram is called.
+    """
+    stats = {"sent": 0, "failed": 0, "deferred": 0, "messages": 0}
+    pending = claim_notifications()
+
+    by_chat = defaultdict(list)
+    for notification in pending:
+        by_chat[notification.chat_id].append(notification)
+    if by_chat:
+        async_to_sync(send_chats)(by_chat, stats, bot)
+
+    with transaction.atomic():
+        Notification.objects.bulk_update(
+            pending, ["sent_at", "attempts", "next_attempt_at"]
+        )
+
+    return stats
@@ -0,0 +1,45 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Notification(models.Model):
+    """
+    Outbox row for a Telegram message. Rows are written in the same
+    transaction as the change they announce and sent later by the
+    dispatcher, so request handling never waits on Telegram.
+    """
+
+    chat_id = models.CharField(max_length=64)
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(sent_at__isnull=True),
+                name="notification_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Notification to {self.chat_id} ({self.created_at})"
+
+
+class DigestCheckpoint(models.Model):
+    """
+    Progress of a digest run. It is saved in the same transaction as
+    the outbox rows it covers, so a crashed run resumes after the last
+    user whose messages were queued and never queues them twice.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    last_user_id = models.BigIntegerField(default=0)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,16 @@
+from django.conf import settings
+
+from notification.models import Notification
+
+
+def enqueue_notification(
+    message: str, chat_id: str = None
+) -> Notification | None:
+    """
+    Queue a Telegram message in the outbox. Nothing is queued when no
+    chat is configured.
+    """
+    chat_id = chat_id or settings.TELEGRAM_CHAT_ID
+    if not chat_id:
+        return None
+    return Notification.objects.create(chat_id=chat_id, message=message)
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from notification.dispatcher import dispatch_notifications
+
+
+@shared_task
+def send_pending_notifications() -> dict:
+    return dispatch_notifications()
@@ -1,12 +1,23 @@
-import requests
+import httpx
+
+from library_core.instrumentation import measure
 
 
 class TelegramBot:
-    def __init__(self, token):
-        self.token = token
+    API_URL = "https://api.telegram.org"
+    MAX_MESSAGE_LENGTH = 4096
 
-    def send_message_to_chat(self, chat_id: str, message: str):
-        return requests.post(
-            url=f"https://api.telegram.org/bot{self.token}/sendMessage",
-            data={"chat_id": chat_id, "text": message},
+    def __init__(self, token, timeout: float = 10):
+        self.token = token
+        self.client = httpx.AsyncClient(
+            base_url=f"{self.API_URL}/bot{token}", timeout=timeout
         )
+
+    async def send_message_to_chat(self, chat_id: str, message: str):
+        with measure("telegram"):
+            return await self.client.post(
+                "/sendMessage", data={"chat_id": chat_id, "text": message}
+            )
+
+    async def close(self):
+        await self.client.aclose()
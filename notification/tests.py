@@ -0,0 +1,122 @@
+from asgiref.sync import sync_to_async
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from book.models import Book
+from borrowing.models import Borrowing
+from notification.dispatcher import build_chunks, dispatch_notifications
+from notification.models import Notification
+from notification.services import enqueue_notification
+from user.models import User
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self.is_success = status_code == 200
+        self.payload = payload or {}
+
+    def json(self):
+        return self.payload
+
+
+class FakeBot:
+    MAX_MESSAGE_LENGTH = 50
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    async def send_message_to_chat(self, chat_id, message):
+        self.sent.append((chat_id, message))
+        if self.responses:
+            return self.responses.pop(0)
+        return FakeResponse(200)
+
+
+@override_settings(TELEGRAM_CHAT_ID="chat", TELEGRAM_MESSAGE_INTERVAL=0)
+class NotificationOutboxTests(TestCase):
+    def test_borrowing_creation_is_queued(self):
+        user = User.objects.create_user(
+            email="reader@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=1, daily_fee=1
+        )
+        borrowing = Borrowing.objects.create(
+            user=user, book=book, expected_return_date="2099-01-01"
+        )
+        borrowing.save()
+
+        notification = Notification.objects.get()
+        self.assertIn(user.email, notification.message)
+        self.assertIsNone(notification.sent_at)
+
+    def test_burst_is_coalesced(self):
+        for index in range(3):
+            enqueue_notification(f"message {index}")
+
+        bot = FakeBot()
+        stats = dispatch_notifications(bot=bot)
+
+        self.assertEqual(stats["messages"], 1)
+        self.assertEqual(
+            bot.sent, [("chat", "message 0\n\nmessage 1\n\nmessage 2")]
+        )
+        self.assertFalse(
+            Notification.objects.filter(sent_at__isnull=True).exists()
+        )
+
+    def test_chunks_respect_message_length(self):
+        notifications = [
+            Notification(message="x" * 30),
+            Notification(message="y" * 30),
+            Notification(message="z" * 80),
+        ]
+        chunks = build_chunks(notifications, limit=50)
+        self.assertEqual(len(chunks), 3)
+        self.assertTrue(all(len(text) <= 50 for text, _ in chunks))
+
+    def test_failure_is_retried_with_backoff(self):
+        enqueue_notification("message")
+
+        dispatch_notifications(bot=FakeBot(FakeResponse(500)))
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.attempts, 1)
+        self.assertIsNone(notification.sent_at)
+        self.assertEqual(dispatch_notifications(bot=FakeBot())["sent"], 0)
+
+    def test_rate_limit_defers_without_attempt(self):
+        enqueue_notification("message")
+
+        stats = dispatch_notifications(
+            bot=FakeBot(FakeResponse(429, {"parameters": {"retry_after": 5}}))
+        )
+
+        notification = Notification.objects.get()
+        self.assertEqual(stats["deferred"], 1)
+        self.assertEqual(notification.attempts, 0)
+        self.assertGreater(
+            notification.next_attempt_at, notification.created_at
+        )
+
+    def test_rows_are_claimed_while_sending(self):
+        enqueue_notification("message")
+        due = []
+
+        class ClaimCheckingBot(FakeBot):
+            async def send_message_to_chat(self, chat_id, message):
+                due.append(
+                    await sync_to_async(
+                        Notification.objects.filter(
+                            next_attempt_at__lte=timezone.now()
+                        ).exists
+                    )()
+                )
+                return await super().send_message_to_chat(chat_id, message)
+
+        stats = dispatch_notifications(bot=ClaimCheckingBot())
+
+        self.assertEqual(due, [False])
+        self.assertEqual(stats["sent"], 1)
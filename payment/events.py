@@ -0,0 +1,69 @@
+from django.db import transaction
+from django.utils import timezone
+
+from payment.models import Payment, StripeEvent
+from payment.services import save_status_changes
+
+EVENT_STATUSES = {
+    "checkout.session.completed": Payment.Status.PAID,
+    "checkout.session.async_payment_succeeded": Payment.Status.PAID,
+    "checkout.session.expired": Payment.Status.EXPIRED,
+}
+
+
+def record_stripe_event(event) -> bool:
+    """
+    Persist a verified webhook event. Stripe delivers events at least
+    once, so redeliveries are dropped by the unique `event_id`.
+    Returns whether the event was new.
+    """
+    _, created = StripeEvent.objects.get_or_create(
+        event_id=event["id"],
+        defaults={"type": event["type"], "payload": event},
+    )
+    return created
+
+
+def get_event_status(event: StripeEvent) -> str | None:
+    status = EVENT_STATUSES.get(event.type)
+    session = event.payload["data"]["object"]
+    is_paid = session.get("payment_status") == "paid"
+    if status == Payment.Status.PAID and not is_paid:
+        return None
+    return status
+
+
+@transaction.atomic
+def apply_stripe_events(batch_size: int = 500) -> int:
+    """
+    Apply a batch of unprocessed events to their payments in bulk.
+    Concurrent workers skip each other's locked rows. Returns the
+    number of events processed.
+    """
+    events = list(
+        StripeEvent.objects.select_for_update(skip_locked=True)
+        .filter(processed_at__isnull=True)
+        .order_by("id")[:batch_size]
+    )
+    if not events:
+        return 0
+
+    statuses = {}
+    for event in events:
+        status = get_event_status(event)
+        if status:
+            statuses[event.payload["data"]["object"]["id"]] = status
+
+    payments = Payment.objects.select_related(
+        "borrowing__user", "borrowing__book"
+    ).filter(session_id__in=statuses, status=Payment.Status.PENDING)
+    changed = []
+    for payment in payments:
+        payment.status = statuses[payment.session_id]
+        changed.append(payment)
+    save_status_changes(changed)
+
+    StripeEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+        processed_at=timezone.now()
+    )
+    return len(events)
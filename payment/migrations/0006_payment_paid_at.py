@@ -0,0 +1,45 @@
+# Generated by Django 5.0.8 on 2026-10-18 18:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+# created_at was filled with the time of 0003 for older payments, so paid
+# ones are dated by their borrowing instead: payments when the book was
+# borrowed and fines when it was returned, at midnight in TIME_ZONE.
+BACKFILL_SQL = """
+UPDATE payment_payment AS payment
+SET paid_at = (
+    CASE
+        WHEN payment.type = 'FINE'
+        THEN COALESCE(borrowing.actual_return_date, borrowing.borrow_date)
+        ELSE borrowing.borrow_date
+    END
+)::timestamp AT TIME ZONE %s
+FROM borrowing_borrowing AS borrowing
+WHERE borrowing.id = payment.borrowing_id
+    AND payment.status = 'PAID'
+    AND payment.paid_at IS NULL
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrowing', '0005_returned_date_index'),
+        ('payment', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='paid_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(condition=models.Q(('paid_at__isnull', False)), fields=['paid_at'], name='payment_paid_at_idx'),
+        ),
+        migrations.RunSQL(
+            [(BACKFILL_SQL, [settings.TIME_ZONE])], migrations.RunSQL.noop
+        ),
+    ]
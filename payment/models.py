@@ -28,11 +28,59 @@ class Payment(models.Model):
         Borrowing, on_delete=models.CASCADE, related_name="payments"
     )
     session_url = models.URLField(max_length=510, null=True, blank=True)
-    session_id = models.CharField(null=True, blank=True)
+    session_id = models.CharField(null=True, blank=True, unique=True)
     money_to_pay = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["borrowing"],
+                condition=models.Q(status="PENDING"),
+                name="payment_pending_borrowing_idx",
+            ),
+            models.Index(
+                fields=["id"],
+                condition=models.Q(status="PENDING"),
+                name="payment_pending_id_idx",
+            ),
+            models.Index(
+                fields=["paid_at"],
+                condition=models.Q(paid_at__isnull=False),
+                name="payment_paid_at_idx",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The stored status, to tell which payments left PENDING on save.
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
 
     def __str__(self):
         return (
             f"Payment for {self.borrowing.book.title} - "
             f"{self.type} - {self.status}"
         )
+
+
+class StripeEvent(models.Model):
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=255)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["id"],
+                condition=models.Q(processed_at__isnull=True),
+                name="stripe_event_unprocessed_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.type} - {self.event_id}"
@@ -0,0 +1,107 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from payment.models import Payment
+from payment.services import retrieve_checkout_session, save_status_changes
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_KEY = "payment:reconcile:watermark"
+
+
+def fetch_sessions(session_ids: list[str], workers: int) -> dict:
+    """
+    Retrieve checkout sessions concurrently. Sessions that fail to load
+    are left out and retried on the next pass.
+    """
+
+    def retrieve(session_id):
+        try:
+            return retrieve_checkout_session(session_id)
+        except stripe.error.StripeError as e:
+            logger.warning("Cannot retrieve session %s: %s", session_id, e)
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        sessions = pool.map(retrieve, session_ids)
+        return {
+            session_id: session
+            for session_id, session in zip(session_ids, sessions)
+            if session is not None
+        }
+
+
+def resolve_status(session) -> str | None:
+    if session.status == "expired":
+        return Payment.Status.EXPIRED
+    if session.status == "complete" and session.payment_status == "paid":
+        return Payment.Status.PAID
+    return None
+
+
+def reconcile_batch(payments: list[Payment], workers: int) -> list[Payment]:
+    sessions = fetch_sessions(
+        [payment.session_id for payment in payments], workers
+    )
+
+    changed = []
+    for payment in payments:
+        session = sessions.get(payment.session_id)
+        new_status = session and resolve_status(session)
+        if new_status:
+            payment.status = new_status
+            changed.append(payment)
+
+    return save_status_changes(changed)
+
+
+def reconcile_pending_payments(
+    batch_size: int = None, max_batches: int = None, workers: int = None
+) -> dict:
+    """
+    Bring the status of pending payments in line with Stripe.
+
+    Only payments older than `PAYMENT_RECONCILE_MIN_AGE` are checked,
+    in id order, `batch_size` at a time and for at most `max_batches`
+    batches. The last id seen is kept as a watermark, so the next run
+    picks up where this one stopped and wraps around at the end.
+    """
+    batch_size = batch_size or settings.PAYMENT_RECONCILE_BATCH_SIZE
+    max_batches = max_batches or settings.PAYMENT_RECONCILE_MAX_BATCHES
+    workers = workers or settings.PAYMENT_RECONCILE_WORKERS
+
+    pending = Payment.objects.select_related(
+        "borrowing__user", "borrowing__book"
+    ).filter(
+        status=Payment.Status.PENDING,
+        session_id__isnull=False,
+        created_at__lte=timezone.now() - settings.PAYMENT_RECONCILE_MIN_AGE,
+    )
+
+    start = watermark = cache.get(WATERMARK_KEY, 0)
+    wrapped = start == 0
+    stats = {"checked": 0, "paid": 0, "expired": 0}
+    for _ in range(max_batches):
+        queryset = pending.filter(id__gt=watermark)
+        if wrapped and start:
+            queryset = queryset.filter(id__lte=start)
+        batch = list(queryset.order_by("id")[:batch_size])
+        if not batch:
+            if wrapped:
+                break
+            wrapped, watermark = True, 0
+            continue
+
+        changed = reconcile_batch(batch, workers)
+        watermark = batch[-1].id
+        stats["checked"] += len(batch)
+        for payment in changed:
+            stats[payment.status.lower()] += 1
+
+    cache.set(WATERMARK_KEY, watermark, timeout=None)
+    return stats
@@ -1,13 +1,22 @@
 import re
+from collections import Counter
 
 import stripe
 from django.conf import settings
+from django.db import transaction
 from django.http import HttpRequest
+from django.utils import timezone
 
+from book.services import release_copy
+from borrowing.cache import invalidate_user_borrowings
 from borrowing.models import Borrowing
+from borrowing.services import record_pending_payments
+from borrowing.signals import payment_successful
+from library_core.instrumentation import measure
 from payment.models import Payment
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
+stripe.api_base = settings.STRIPE_API_BASE
 
 
 def sanitize_product_name(name: str) -> str:
@@ -15,52 +24,204 @@ def sanitize_product_name(name: str) -> str:
     return sanitized_name[:127]
 
 
-def create_payment_session(
-    borrowing: Borrowing,
-    request: HttpRequest,
-    payment_type: Payment.Type,
-    save=True,
-) -> Payment:
+def get_checkout_urls(request: HttpRequest) -> tuple[str, str]:
+    success_url = request.build_absolute_uri(settings.PAYMENT_SUCCESS_URL)
+    cancel_url = request.build_absolute_uri(settings.PAYMENT_CANCEL_URL)
+    return success_url, cancel_url
+
 
+def build_payment(borrowing: Borrowing, payment_type: Payment.Type) -> Payment:
     if payment_type == Payment.Type.PAYMENT:
         total_price = borrowing.get_payment_amount()
-        product_name = borrowing.book.title
     else:
         total_price = borrowing.get_fine_amount()
-        product_name = f"Fine for {borrowing.book.title}"
 
-    product_name = sanitize_product_name(product_name)
+    return Payment(
+        borrowing=borrowing,
+        money_to_pay=total_price,
+        type=payment_type,
+    )
 
-    success_url = request.build_absolute_uri(settings.PAYMENT_SUCCESS_URL)
-    cancel_url = request.build_absolute_uri(settings.PAYMENT_CANCEL_URL)
 
-    session = stripe.checkout.Session.create(
-        payment_method_types=["card"],
-        line_items=[
+def get_session_params(
+    payment: Payment, success_url: str, cancel_url: str
+) -> dict:
+    if payment.type == Payment.Type.PAYMENT:
+        product_name = payment.borrowing.book.title
+    else:
+        product_name = f"Fine for {payment.borrowing.book.title}"
+
+    return {
+        "payment_method_types": ["card"],
+        "line_items": [
             {
                 "price_data": {
                     "currency": "usd",
                     "product_data": {
-                        "name": product_name,
+                        "name": sanitize_product_name(product_name),
                     },
-                    "unit_amount": total_price,
+                    "unit_amount": int(payment.money_to_pay),
                 },
                 "quantity": 1,
             }
         ],
-        mode="payment",
-        success_url=success_url + "?session_id={CHECKOUT_SESSION_ID}",
-        cancel_url=cancel_url,
-    )
+        "mode": "payment",
+        "success_url": success_url + "?session_id={CHECKOUT_SESSION_ID}",
+        "cancel_url": cancel_url,
+    }
 
-    payment = Payment(
-        borrowing=borrowing,
-        session_url=session.url,
-        session_id=session.id,
-        money_to_pay=total_price,
-        type=payment_type,
-    )
+
+def create_checkout_session(
+    payment: Payment, success_url: str, cancel_url: str
+) -> Payment:
+    """
+    Open a Stripe checkout session for `payment` and store its id and
+    url on the instance. The caller decides when to save it.
+    """
+    with measure("stripe"):
+        session = stripe.checkout.Session.create(
+            **get_session_params(payment, success_url, cancel_url)
+        )
+    payment.session_url = session.url
+    payment.session_id = session.id
+    return payment
+
+
+async def acreate_checkout_session(
+    payment: Payment, success_url: str, cancel_url: str
+) -> Payment:
+    """
+    `create_checkout_session` over Stripe's async HTTP client. The
+    payment's borrowing and book must already be loaded.
+    """
+    with measure("stripe"):
+        session = await stripe.checkout.Session.create_async(
+            **get_session_params(payment, success_url, cancel_url)
+        )
+    payment.session_url = session.url
+    payment.session_id = session.id
+    return payment
+
+
+def retrieve_checkout_session(session_id: str) -> stripe.checkout.Session:
+    with measure("stripe"):
+        return stripe.checkout.Session.retrieve(session_id)
+
+
+async def aretrieve_checkout_session(
+    session_id: str,
+) -> stripe.checkout.Session:
+    with measure("stripe"):
+        return await stripe.checkout.Session.retrieve_async(session_id)
+
+
+def create_payment_session(
+    borrowing: Borrowing,
+    request: HttpRequest,
+    payment_type: Payment.Type,
+    save=True,
+) -> Payment:
+    payment = build_payment(borrowing, payment_type)
+    create_checkout_session(payment, *get_checkout_urls(request))
     if save:
         payment.save()
 
     return payment
+
+
+async def acreate_payment_session(
+    borrowing: Borrowing,
+    request: HttpRequest,
+    payment_type: Payment.Type,
+    save=True,
+) -> Payment:
+    payment = build_payment(borrowing, payment_type)
+    await acreate_checkout_session(payment, *get_checkout_urls(request))
+    if save:
+        await payment.asave()
+
+    return payment
+
+
+@transaction.atomic
+def cancel_borrowing_checkout(payment: Payment) -> None:
+    """
+    Undo a borrowing whose checkout session could not be created and
+    put the reserved copy back in stock.
+    """
+    borrowing = payment.borrowing
+    borrowing.delete()
+    release_copy(borrowing.book_id)
+
+
+def create_pending_payments(
+    borrowings: list[Borrowing], payment_type: Payment.Type
+) -> list[Payment]:
+    """
+    Insert one pending payment per borrowing in a single query. Their
+    checkout sessions are left to `create_payment_checkout_session`.
+    """
+    if not borrowings:
+        return []
+
+    payments = Payment.objects.bulk_create(
+        build_payment(borrowing, payment_type) for borrowing in borrowings
+    )
+    record_pending_payments(
+        Counter(borrowing.user_id for borrowing in borrowings)
+    )
+    invalidate_user_borrowings(
+        *{borrowing.user_id for borrowing in borrowings}
+    )
+    return payments
+
+
+@transaction.atomic
+def save_status_changes(payments: list[Payment]) -> list[Payment]:
+    """
+    Persist new statuses of `payments` in one query and run the side
+    effects `Payment.save()` would otherwise trigger.
+
+    The success redirect, the webhook and reconciliation can settle the
+    same payment at once, so the rows are locked and their stored status
+    read again first. Only payments whose stored status differs are
+    written. Those leaving PENDING are taken off their users' loan
+    state, and newly paid ones are stamped with `paid_at` and announced.
+    Returns the payments that changed.
+    """
+    if not payments:
+        return []
+
+    stored = dict(
+        Payment.objects.select_for_update()
+        .filter(pk__in=[payment.pk for payment in payments])
+        .order_by("pk")
+        .values_list("pk", "status")
+    )
+    changed = [
+        payment
+        for payment in payments
+        if stored.get(payment.pk, payment.status) != payment.status
+    ]
+    if not changed:
+        return []
+
+    now = timezone.now()
+    for payment in changed:
+        if payment.status == Payment.Status.PAID and not payment.paid_at:
+            payment.paid_at = now
+    Payment.objects.bulk_update(changed, ["status", "paid_at"])
+    settled = Counter()
+    for payment in changed:
+        was_pending = stored[payment.pk] == Payment.Status.PENDING
+        is_pending = payment.status == Payment.Status.PENDING
+        settled[payment.borrowing.user_id] += is_pending - was_pending
+        payment._loaded_status = payment.status
+    record_pending_payments(settled)
+    invalidate_user_borrowings(
+        *{payment.borrowing.user_id for payment in changed}
+    )
+    for payment in changed:
+        if payment.status == Payment.Status.PAID:
+            payment_successful.send(Payment, instance=payment)
+    return changed
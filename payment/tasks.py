@@ -1,24 +1,50 @@
+import logging
+
 import stripe
 from celery import shared_task
 
+from payment.events import apply_stripe_events
 from payment.models import Payment
+from payment.reconciliation import reconcile_pending_payments
+from payment.services import cancel_borrowing_checkout, create_checkout_session
 
+logger = logging.getLogger(__name__)
 
-@shared_task
-def check_payment_expiration() -> None:
-    payments = Payment.objects.filter(
-        status="PENDING"
+
+@shared_task(bind=True, max_retries=5)
+def create_payment_checkout_session(
+    self, payment_id: int, success_url: str, cancel_url: str
+) -> None:
+    payment = (
+        Payment.objects.select_related("borrowing__book")
+        .filter(pk=payment_id, session_id__isnull=True)
+        .first()
     )
-    for payment in payments:
-        try:
-            session = stripe.checkout.Session.retrieve(
-                payment.session_id
-            )
-        except stripe.error.InvalidRequestError as e:
-            print(f"Invalid session: {e}")
-        except Exception as e:
-            print(e)
-
-        if session.status == "expired":
-            print(f"Found expired session: {session.id}")
-            payment.status = Payment.Status.EXPIRED
+    if payment is None:
+        return
+
+    try:
+        create_checkout_session(payment, success_url, cancel_url)
+    except stripe.error.StripeError as exc:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=exc, countdown=2**self.request.retries)
+        if payment.type == Payment.Type.FINE:
+            logger.error("Cannot open fine session for %s: %s", payment, exc)
+        else:
+            cancel_borrowing_checkout(payment)
+        return
+
+    payment.save(update_fields=["session_url", "session_id"])
+
+
+@shared_task
+def check_payment_expiration() -> dict:
+    return reconcile_pending_payments()
+
+
+@shared_task
+def process_stripe_events() -> int:
+    processed = 0
+    while batch := apply_stripe_events():
+        processed += batch
+    return processed
@@ -1 +1,499 @@
-# Create your tests here.
+import hashlib
+import hmac
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import stripe
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from book.models import Book
+from borrowing.models import Borrowing
+from library_core import metrics
+from payment.events import apply_stripe_events
+from payment.models import Payment, StripeEvent
+from payment.reconciliation import WATERMARK_KEY, reconcile_pending_payments
+from user.models import User
+
+
+class FakeStripeServer:
+    """
+    Minimal stand-in for the Stripe API creating and serving checkout
+    sessions from an in-memory dict, for use with `stripe.api_base`.
+    """
+
+    def __init__(self):
+        self.sessions = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(self.path)
+                session_id = self.path.rstrip("/").rsplit("/", 1)[-1]
+                session = server.sessions.get(session_id)
+                if session is None:
+                    self.respond(404, {"error": {
+                        "type": "invalid_request_error",
+                        "message": f"No such checkout.session: {session_id}",
+                    }})
+                else:
+                    self.respond(200, {
+                        "id": session_id,
+                        "object": "checkout.session",
+                        **session,
+                    })
+
+            def do_POST(self):
+                server.requests.append(self.path)
+                self.rfile.read(int(self.headers["Content-Length"]))
+                session_id = f"cs_test_{len(server.sessions)}"
+                server.sessions[session_id] = {
+                    "status": "open",
+                    "payment_status": "unpaid",
+                    "url": f"https://checkout.stripe.com/c/{session_id}",
+                }
+                self.respond(200, {
+                    "id": session_id,
+                    "object": "checkout.session",
+                    **server.sessions[session_id],
+                })
+
+            def respond(self, code, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        self.patches = [
+            mock.patch.object(stripe, "api_base", self.url),
+            mock.patch.object(stripe, "api_key", "sk_test_fake"),
+        ]
+        for patch in self.patches:
+            patch.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for patch in self.patches:
+            patch.stop()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class PaymentCheckoutTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="payer@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=1, daily_fee=1
+        )
+        borrowing = Borrowing.objects.create(
+            user=self.user, book=book, expected_return_date="2099-01-01"
+        )
+        self.payment = Payment.objects.create(
+            borrowing=borrowing, money_to_pay=100
+        )
+        self.url = reverse(
+            "payments:payments-payment-checkout", args=[self.payment.id]
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_checkout_pending_session(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response["Retry-After"], "1")
+
+    def test_checkout_ready_session(self):
+        self.payment.session_id = "cs_test"
+        self.payment.session_url = "https://checkout.stripe.com/c/cs_test"
+        self.payment.save()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["session_url"], self.payment.session_url
+        )
+
+    def test_checkout_of_other_user_payment(self):
+        other = User.objects.create_user(
+            email="other@example.com", password="password"
+        )
+        self.client.force_authenticate(user=other)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PaymentSessionTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="session@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=1, daily_fee=1
+        )
+        borrowing = Borrowing.objects.create(
+            user=self.user, book=book, expected_return_date="2099-01-01"
+        )
+        self.payment = Payment.objects.create(
+            borrowing=borrowing, money_to_pay=100, session_id="cs_paid"
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_success_marks_payment_paid(self):
+        url = reverse("payments:payments-payment-success")
+        with FakeStripeServer() as fake_stripe, mock.patch(
+            "payment.services.payment_successful"
+        ) as signal:
+            fake_stripe.sessions["cs_paid"] = {
+                "status": "complete", "payment_status": "paid"
+            }
+            response = self.client.get(url, {"session_id": "cs_paid"})
+            repeated = self.client.get(url, {"session_id": "cs_paid"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(repeated.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(len(fake_stripe.requests), 1)
+        signal.send.assert_called_once()
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, Payment.Status.PAID)
+        self.assertIsNotNone(self.payment.paid_at)
+
+    def test_success_of_unknown_session(self):
+        with FakeStripeServer() as fake_stripe:
+            response = self.client.get(
+                reverse("payments:payments-payment-success"),
+                {"session_id": "cs_unknown"},
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(fake_stripe.requests, [])
+
+    def test_renew_expired_payment(self):
+        self.payment.status = Payment.Status.EXPIRED
+        self.payment.save()
+        url = reverse(
+            "payments:payments-payment-renew", args=[self.payment.id]
+        )
+
+        with FakeStripeServer() as fake_stripe:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(fake_stripe.requests, ["/v1/checkout/sessions"])
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.session_id, "cs_test_0")
+        self.assertEqual(
+            self.payment.session_url,
+            "https://checkout.stripe.com/c/cs_test_0",
+        )
+
+
+class PaymentReconciliationTests(APITestCase):
+    def setUp(self):
+        cache.delete(WATERMARK_KEY)
+        user = User.objects.create_user(
+            email="pending@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=5, daily_fee=1
+        )
+        self.borrowing = Borrowing.objects.create(
+            user=user, book=book, expected_return_date="2099-01-01"
+        )
+
+    def create_payment(self, session_id, age=timedelta(hours=1)):
+        payment = Payment.objects.create(
+            borrowing=self.borrowing, money_to_pay=100, session_id=session_id
+        )
+        Payment.objects.filter(pk=payment.pk).update(
+            created_at=timezone.now() - age
+        )
+        return payment
+
+    def test_statuses_are_saved(self):
+        expired = self.create_payment("cs_expired")
+        paid = self.create_payment("cs_paid")
+        still_open = self.create_payment("cs_open")
+        missing = self.create_payment("cs_missing")
+
+        with FakeStripeServer() as fake_stripe, mock.patch(
+            "payment.services.payment_successful"
+        ) as signal:
+            fake_stripe.sessions.update(
+                cs_expired={"status": "expired", "payment_status": "unpaid"},
+                cs_paid={"status": "complete", "payment_status": "paid"},
+                cs_open={"status": "open", "payment_status": "unpaid"},
+            )
+            stats = reconcile_pending_payments(batch_size=2)
+
+        self.assertEqual(stats, {"checked": 4, "paid": 1, "expired": 1})
+        signal.send.assert_called_once()
+        for payment, expected in [
+            (expired, Payment.Status.EXPIRED),
+            (paid, Payment.Status.PAID),
+            (still_open, Payment.Status.PENDING),
+            (missing, Payment.Status.PENDING),
+        ]:
+            payment.refresh_from_db()
+            self.assertEqual(payment.status, expected)
+
+    def test_recent_payments_are_skipped(self):
+        self.create_payment("cs_recent", age=timedelta(seconds=1))
+
+        with FakeStripeServer() as fake_stripe:
+            stats = reconcile_pending_payments()
+
+        self.assertEqual(stats["checked"], 0)
+        self.assertEqual(fake_stripe.requests, [])
+
+    def test_runs_are_incremental(self):
+        payments = [self.create_payment(f"cs_{i}") for i in range(3)]
+
+        with FakeStripeServer() as fake_stripe:
+            reconcile_pending_payments(batch_size=2, max_batches=1)
+            self.assertEqual(cache.get(WATERMARK_KEY), payments[1].id)
+            reconcile_pending_payments(batch_size=2, max_batches=1)
+
+        self.assertEqual(len(fake_stripe.requests), 3)
+        self.assertEqual(cache.get(WATERMARK_KEY), payments[2].id)
+
+
+WEBHOOK_SECRET = "whsec_test"
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class StripeWebhookTests(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(
+            email="hook@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=5, daily_fee=1
+        )
+        borrowing = Borrowing.objects.create(
+            user=user, book=book, expected_return_date="2099-01-01"
+        )
+        self.paid = Payment.objects.create(
+            borrowing=borrowing, money_to_pay=100, session_id="cs_paid"
+        )
+        self.expired = Payment.objects.create(
+            borrowing=borrowing, money_to_pay=100, session_id="cs_expired"
+        )
+        self.url = reverse("payments:stripe-webhook")
+
+    def post_event(self, event_id, event_type, session, secret=WEBHOOK_SECRET):
+        payload = json.dumps({
+            "id": event_id,
+            "object": "event",
+            "type": event_type,
+            "data": {"object": session},
+        })
+        timestamp = int(time.time())
+        signature = hmac.new(
+            secret.encode(),
+            f"{timestamp}.{payload}".encode(),
+            hashlib.sha256,
+        ).hexdigest()
+        return self.client.post(
+            self.url,
+            payload,
+            content_type="application/json",
+            HTTP_STRIPE_SIGNATURE=f"t={timestamp},v1={signature}",
+        )
+
+    def test_invalid_signature_is_rejected(self):
+        response = self.post_event(
+            "evt_1", "checkout.session.expired", {"id": "cs_expired"},
+            secret="whsec_wrong",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    @override_settings(STRIPE_WEBHOOK_SECRET=None)
+    def test_missing_secret_is_unavailable(self):
+        with self.assertLogs("payment.views", "ERROR"):
+            response = self.post_event(
+                "evt_1", "checkout.session.expired", {"id": "cs_expired"}
+            )
+        self.assertEqual(
+            response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_redelivered_event_is_stored_once(self):
+        for _ in range(2):
+            response = self.post_event(
+                "evt_1", "checkout.session.expired", {"id": "cs_expired"}
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+
+    @mock.patch("payment.services.payment_successful")
+    def test_events_are_applied_in_bulk(self, signal):
+        self.post_event(
+            "evt_1",
+            "checkout.session.completed",
+            {"id": "cs_paid", "payment_status": "paid"},
+        )
+        self.post_event(
+            "evt_2", "checkout.session.expired", {"id": "cs_expired"}
+        )
+
+        # savepoint, events, payments, savepoint, locked statuses,
+        # statuses, loan state, release, processed, release
+        with self.assertNumQueries(10):
+            self.assertEqual(apply_stripe_events(), 2)
+
+        self.paid.refresh_from_db()
+        self.expired.refresh_from_db()
+        self.assertEqual(self.paid.status, Payment.Status.PAID)
+        self.assertEqual(self.expired.status, Payment.Status.EXPIRED)
+        signal.send.assert_called_once()
+        self.assertFalse(
+            StripeEvent.objects.filter(processed_at__isnull=True).exists()
+        )
+        self.assertEqual(apply_stripe_events(), 0)
+
+
+@override_settings(
+    INSTRUMENTATION_ENABLED=True, INSTRUMENTATION_SERVER_TIMING=True
+)
+class PaymentInstrumentationTests(APITestCase):
+    def setUp(self):
+        user = User.objects.create_user(
+            email="timing@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Test Book", author="Test Author", inventory=1, daily_fee=1
+        )
+        borrowing = Borrowing.objects.create(
+            user=user, book=book, expected_return_date="2099-01-01"
+        )
+        Payment.objects.create(
+            borrowing=borrowing, money_to_pay=100, session_id="cs_paid"
+        )
+        self.client.force_authenticate(user=user)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def pay(self):
+        with FakeStripeServer() as fake_stripe, mock.patch(
+            "payment.services.payment_successful"
+        ):
+            fake_stripe.sessions["cs_paid"] = {
+                "status": "complete", "payment_status": "paid"
+            }
+            return self.client.get(
+                reverse("payments:payments-payment-success"),
+                {"session_id": "cs_paid"},
+            )
+
+    def test_request_reports_queries_and_stripe_time(self):
+        with self.assertLogs("library_core.instrumentation", "INFO") as logs:
+            response = self.pay()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^db;dur=[\d.]+;desc="[1-9]\d* queries", '
+            r"stripe;dur=[\d.]+, total;dur=[\d.]+$",
+        )
+        entry = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(entry["view"], "payments:payments-payment-success")
+        self.assertEqual(entry["status"], 200)
+        self.assertGreater(entry["queries"], 0)
+        self.assertEqual(list(entry["external_ms"]), ["stripe"])
+
+    def test_metrics_endpoint_renders_histograms(self):
+        with self.assertLogs("library_core.instrumentation", "INFO"):
+            self.pay()
+            response = self.client.get(reverse("metrics"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        body = response.content.decode()
+        self.assertIn(
+            "http_request_duration_seconds_count{"
+            'view="payments:payments-payment-success",'
+            'method="GET",status="200"} 1',
+            body,
+        )
+        self.assertIn(
+            'external_call_duration_seconds_bucket{service="stripe",'
+            'le="+Inf"} 1',
+            body,
+        )
+
+    @override_settings(INSTRUMENTATION_METRICS_TOKEN="scrape-token")
+    def test_metrics_endpoint_requires_token(self):
+        with self.assertLogs("library_core.instrumentation", "INFO"):
+            denied = self.client.get(reverse("metrics"))
+            allowed = self.client.get(
+                reverse("metrics"), HTTP_AUTHORIZATION="Bearer scrape-token"
+            )
+
+        self.assertEqual(denied.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(allowed.status_code, status.HTTP_200_OK)
+
+    @override_settings(INSTRUMENTATION_ENABLED=False)
+    def test_disabled_instrumentation(self):
+        response = self.pay()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(
+            self.client.get(reverse("metrics")).status_code,
+            status.HTTP_404_NOT_FOUND,
+        )
+        self.assertNotIn("_count{", metrics.render())
+
+
+class PaymentExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email="reader@example.com", password="password"
+        )
+        other = User.objects.create_user(
+            email="other@example.com", password="password"
+        )
+        book = Book.objects.create(
+            title="Test Book", author="Author", inventory=5, daily_fee=1
+        )
+        for user in (self.user, other):
+            borrowing = Borrowing.objects.create(
+                user=user, book=book, expected_return_date="2099-01-01"
+            )
+            Payment.objects.create(borrowing=borrowing, money_to_pay=150)
+
+    def test_ndjson_contains_own_payments_only(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            reverse("payments:payments-export", args=["ndjson"])
+        )
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["borrowing__user__email"], self.user.email)
+        self.assertEqual(rows[0]["money_to_pay"], "150.00")
@@ -1,10 +1,13 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from payment.views import PaymentViewSet
+from payment.views import PaymentViewSet, StripeWebhookView
 
 router = DefaultRouter()
 router.register(r"", PaymentViewSet, basename="payments")
 
-urlpatterns = router.urls
+urlpatterns = [
+    path("webhook/", StripeWebhookView.as_view(), name="stripe-webhook"),
+] + router.urls
 
 app_name = "payments"
@@ -1,28 +1,58 @@
+import logging
+
 import stripe
-from django.shortcuts import get_object_or_404
+from adrf.viewsets import GenericViewSet
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.shortcuts import aget_object_or_404
 from drf_spectacular.utils import extend_schema
-from rest_framework import mixins, viewsets, status
+from rest_framework import mixins, status
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from borrowing.mixins import GenericMethodsMixin
-from borrowing.signals import payment_successful
+from borrowing.export import (
+    EXPORT_FORMATS,
+    ExportContentNegotiation,
+    export_response,
+)
+from borrowing.mixins import GenericMethodsMixin, KeysetPaginationMixin
+from borrowing.models import Borrowing
+from borrowing.pagination import PaymentKeysetPagination
+from library_core.db import ReplicaReadMixin
+from payment.events import record_stripe_event
 from payment.models import Payment
 from payment.serializers import PaymentSerializer, PaymentDetailSerializer
-from payment.services import create_payment_session
+from payment.services import (
+    acreate_payment_session,
+    aretrieve_checkout_session,
+    save_status_changes,
+)
+from payment.tasks import process_stripe_events
+
+logger = logging.getLogger(__name__)
 
 
 @extend_schema(tags=["Payments"])
 class PaymentViewSet(
+    ReplicaReadMixin,
     GenericMethodsMixin,
+    KeysetPaginationMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
-    viewsets.GenericViewSet,
+    GenericViewSet,
 ):
-    queryset = Payment.objects.all()
+    """
+    `success` and `renew` wait on Stripe and are served asynchronously;
+    the other actions run in a worker thread as before.
+    """
+
+    queryset = Payment.objects.order_by("id")
     serializer_class = PaymentSerializer
     permission_classes = [IsAuthenticated]
+    keyset_pagination_class = PaymentKeysetPagination
     action_serializers = {"retrieve": PaymentDetailSerializer}
 
     def get_queryset(self):
@@ -33,13 +63,45 @@ class PaymentViewSet(
 
         return queryset
 
+    @extend_schema(
+        summary="Export payments",
+        description="Stream every payment visible to the user as CSV or"
+        " NDJSON.",
+        responses={
+            (200, media_type): str for media_type in EXPORT_FORMATS.values()
+        },
+    )
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path=r"export/(?P<export_format>csv|ndjson)",
+        url_name="export",
+        content_negotiation_class=ExportContentNegotiation,
+    )
+    def export(self, request, export_format=None):
+        return export_response(
+            self.filter_queryset(self.get_queryset()),
+            [
+                "id",
+                "status",
+                "type",
+                "borrowing_id",
+                "borrowing__user__email",
+                "money_to_pay",
+                "session_id",
+                "created_at",
+            ],
+            export_format,
+            filename="payments",
+        )
+
     @action(
         detail=False,
         methods=["GET"],
         url_path="success",
         url_name="payment-success",
     )
-    def success(self, request):
+    async def success(self, request):
         session_id = request.GET.get("session_id")
         if not session_id:
             return Response(
@@ -47,19 +109,21 @@ class PaymentViewSet(
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        session = stripe.checkout.Session.retrieve(session_id)
-        payment = get_object_or_404(Payment, session_id=session_id)
+        payment = await aget_object_or_404(
+            Payment.objects.select_related("borrowing"),
+            session_id=session_id,
+        )
 
-        if payment.status == "Paid":
+        if payment.status == Payment.Status.PAID:
             return Response(
                 {"message": "Payment is already paid"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        session = await aretrieve_checkout_session(session_id)
         if session.payment_status == "paid":
             payment.status = Payment.Status.PAID
-            payment.save()
-            payment_successful.send(Payment, instance=payment)
+            await sync_to_async(save_status_changes)([payment])
 
             return Response(
                 {"message": "Payment was successful"},
@@ -70,6 +134,32 @@ class PaymentViewSet(
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    @action(
+        detail=True,
+        methods=["GET"],
+        url_path="checkout",
+        url_name="payment-checkout",
+    )
+    def checkout(self, request, pk=None) -> Response:
+        payment = self.get_object()
+        if payment.status != Payment.Status.PENDING:
+            return Response(
+                {"detail": f"Payment is {payment.status.lower()}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if not payment.session_url:
+            return Response(
+                {"detail": "Payment session is being created"},
+                status=status.HTTP_202_ACCEPTED,
+                headers={"Retry-After": "1"},
+            )
+
+        return Response(
+            {"session_url": payment.session_url},
+            status=status.HTTP_200_OK,
+        )
+
     @action(
         detail=False,
         methods=["get"],
@@ -88,21 +178,62 @@ class PaymentViewSet(
         url_path="renew",
         url_name="payment-renew",
     )
-    def renew(self, request, pk=None) -> Response:
-        payment = self.get_object()
+    async def renew(self, request, pk=None) -> Response:
+        payment = await self.aget_object()
         if payment.status != Payment.Status.EXPIRED:
             return Response(
                 {"detail": "this payment not expired"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        new_payment = create_payment_session(
-            payment.borrowing, request, payment.type, save=False
+        borrowing = await Borrowing.objects.select_related("book").aget(
+            pk=payment.borrowing_id
+        )
+        new_payment = await acreate_payment_session(
+            borrowing, request, payment.type, save=False
         )
         payment.session_url = new_payment.session_url
         payment.session_id = new_payment.session_id
-        payment.save()
+        await payment.asave()
 
         return Response(
             {"detail": "renew was successful"}, status=status.HTTP_200_OK
         )
+
+
+@extend_schema(tags=["Payments"], exclude=True)
+class StripeWebhookView(APIView):
+    """
+    Receive Stripe webhook events. Events are verified, stored once per
+    event id and applied to payments in bulk by a Celery worker.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            logger.error(
+                "STRIPE_WEBHOOK_SECRET is not set; Stripe events cannot "
+                "be verified"
+            )
+            return Response(
+                {"error": "Webhook is not configured"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        try:
+            event = stripe.Webhook.construct_event(
+                request.body,
+                request.headers.get("Stripe-Signature", ""),
+                settings.STRIPE_WEBHOOK_SECRET,
+            )
+        except (ValueError, stripe.error.SignatureVerificationError):
+            return Response(
+                {"error": "Invalid payload or signature"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if record_stripe_event(event):
+            transaction.on_commit(process_stripe_events.delay)
+        return Response(status=status.HTTP_200_OK)
@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+from reporting.models import BookDailyStats
+
+
+@admin.register(BookDailyStats)
+class BookDailyStatsAdmin(admin.ModelAdmin):
+    list_display = (
+        "date",
+        "book",
+        "checkouts",
+        "returns",
+        "overdue",
+        "revenue",
+        "fines",
+    )
+    list_filter = ("date",)
+    list_select_related = ("book",)
@@ -0,0 +1,37 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+
+from borrowing.models import Borrowing
+from reporting.services import rollup_daily_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily reporting stats for a range of days, by "
+        "default from the first borrowing until today."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", type=date.fromisoformat)
+        parser.add_argument("--until", type=date.fromisoformat)
+
+    def handle(self, *args, **options):
+        until = options["until"] or timezone.now().date()
+        since = options["since"] or Borrowing.objects.aggregate(
+            Min("borrow_date")
+        )["borrow_date__min"]
+        if since is None:
+            self.stdout.write("No borrowings to report on")
+            return
+        if since > until:
+            raise CommandError("--since must not be after --until")
+
+        rows = rollup_daily_stats(since, until)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rolled up {rows} rows from {since} to {until}"
+            )
+        )
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.8 on 2026-10-18 18:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('book', '0003_book_natural_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('checkouts', models.PositiveIntegerField(default=0)),
+                ('returns', models.PositiveIntegerField(default=0)),
+                ('overdue', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('fines', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='book.book')),
+            ],
+            options={
+                'verbose_name_plural': 'book daily stats',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bookdailystats',
+            constraint=models.UniqueConstraint(fields=('date', 'book'), name='book_daily_stats_uniq'),
+        ),
+    ]
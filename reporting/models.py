@@ -0,0 +1,32 @@
+from django.db import models
+
+from book.models import Book
+
+
+class BookDailyStats(models.Model):
+    """
+    Activity of one book on one day, rolled up from the borrowing and
+    payment tables so reports never scan them. Amounts are in the units
+    of `Payment.money_to_pay`.
+    """
+
+    date = models.DateField()
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="daily_stats"
+    )
+    checkouts = models.PositiveIntegerField(default=0)
+    returns = models.PositiveIntegerField(default=0)
+    overdue = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    fines = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "book daily stats"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["date", "book"], name="book_daily_stats_uniq"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} on {self.date}"
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+
+from reporting.services import REPORT_FIELDS
+
+
+class ReportRangeSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        end = attrs.get("end") or timezone.now().date()
+        start = attrs.get("start") or end - timedelta(
+            days=settings.REPORTING_DEFAULT_RANGE_DAYS - 1
+        )
+        if start > end:
+            raise serializers.ValidationError(
+                {"start": "Start date must not be after end date."}
+            )
+        if (end - start).days >= settings.REPORTING_MAX_RANGE_DAYS:
+            raise serializers.ValidationError(
+                "Reports cover at most "
+                f"{settings.REPORTING_MAX_RANGE_DAYS} days."
+            )
+        return {**attrs, "start": start, "end": end}
+
+
+class BookReportQuerySerializer(ReportRangeSerializer):
+    ordering = serializers.ChoiceField(
+        choices=REPORT_FIELDS, default="checkouts"
+    )
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=10)
+
+
+class ReportTotalsSerializer(serializers.Serializer):
+    checkouts = serializers.IntegerField(source="total_checkouts")
+    returns = serializers.IntegerField(source="total_returns")
+    overdue = serializers.IntegerField(source="total_overdue")
+    revenue = serializers.DecimalField(
+        max_digits=14, decimal_places=2, source="total_revenue"
+    )
+    fines = serializers.DecimalField(
+        max_digits=14, decimal_places=2, source="total_fines"
+    )
+
+
+class DailyReportRowSerializer(ReportTotalsSerializer):
+    date = serializers.DateField()
+
+
+class DailyReportSerializer(serializers.Serializer):
+    start = serializers.DateField()
+    end = serializers.DateField()
+    totals = ReportTotalsSerializer()
+    days = DailyReportRowSerializer(many=True)
+
+
+class BookReportRowSerializer(ReportTotalsSerializer):
+    book_id = serializers.IntegerField()
+    title = serializers.CharField(source="book__title")
+    author = serializers.CharField(source="book__author")
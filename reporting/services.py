@@ -0,0 +1,146 @@
+from datetime import date, datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from borrowing.models import Borrowing
+from payment.models import Payment
+from reporting.models import BookDailyStats
+
+REPORT_FIELDS = ("checkouts", "returns", "overdue", "revenue", "fines")
+
+
+def get_day_bounds(start: date, end: date) -> tuple[datetime, datetime]:
+    """Aware datetimes from the start of `start` to the end of `end`."""
+    until = end + timedelta(days=1)
+    return (
+        timezone.make_aware(datetime.combine(start, time.min)),
+        timezone.make_aware(datetime.combine(until, time.min)),
+    )
+
+
+def collect_daily_stats(start: date, end: date) -> list[BookDailyStats]:
+    """
+    Aggregate the activity of every book from `start` to `end`, both
+    inclusive, straight from the borrowing and payment tables.
+
+    Checkouts and returns are counted on their dates and payments on
+    the day they were paid. A borrowing is overdue on a day if it was
+    due before that day and still out at its end.
+    """
+    stats = {}
+
+    def get_row(day, book_id) -> BookDailyStats:
+        if (day, book_id) not in stats:
+            stats[day, book_id] = BookDailyStats(date=day, book_id=book_id)
+        return stats[day, book_id]
+
+    borrowings = Borrowing.objects.order_by()
+    checkouts = (
+        borrowings.filter(borrow_date__range=(start, end))
+        .values_list("borrow_date", "book_id")
+        .annotate(Count("id"))
+    )
+    for day, book_id, count in checkouts:
+        get_row(day, book_id).checkouts = count
+
+    returns = (
+        borrowings.filter(actual_return_date__range=(start, end))
+        .values_list("actual_return_date", "book_id")
+        .annotate(Count("id"))
+    )
+    for day, book_id, count in returns:
+        get_row(day, book_id).returns = count
+
+    day = start
+    while day <= end:
+        overdue = (
+            borrowings.filter(
+                Q(actual_return_date__isnull=True)
+                | Q(actual_return_date__gt=day),
+                expected_return_date__lt=day,
+                borrow_date__lte=day,
+            )
+            .values_list("book_id")
+            .annotate(Count("id"))
+        )
+        for book_id, count in overdue:
+            get_row(day, book_id).overdue = count
+        day += timedelta(days=1)
+
+    paid_from, paid_until = get_day_bounds(start, end)
+    payments = (
+        Payment.objects.order_by()
+        .filter(paid_at__gte=paid_from, paid_at__lt=paid_until)
+        .values_list(TruncDate("paid_at"), "borrowing__book_id")
+        .annotate(
+            revenue=Sum(
+                "money_to_pay", filter=Q(type=Payment.Type.PAYMENT)
+            ),
+            fines=Sum("money_to_pay", filter=Q(type=Payment.Type.FINE)),
+        )
+    )
+    for day, book_id, revenue, fines in payments:
+        row = get_row(day, book_id)
+        row.revenue = revenue or 0
+        row.fines = fines or 0
+
+    return list(stats.values())
+
+
+@transaction.atomic
+def rollup_daily_stats(start: date, end: date) -> int:
+    """
+    Replace the stored stats from `start` to `end` with freshly
+    aggregated ones. Returns the number of rows written.
+    """
+    stats = collect_daily_stats(start, end)
+    BookDailyStats.objects.filter(date__range=(start, end)).delete()
+    BookDailyStats.objects.bulk_create(
+        stats,
+        update_conflicts=True,
+        unique_fields=["date", "book"],
+        update_fields=REPORT_FIELDS,
+        batch_size=1000,
+    )
+    return len(stats)
+
+
+def get_rollup_start(today: date) -> date:
+    """
+    First day the periodic rollup has to refresh: the last
+    `REPORTING_ROLLUP_DAYS` days, reaching back to the latest rolled up
+    day if the task has not run for longer.
+    """
+    start = today - timedelta(days=settings.REPORTING_ROLLUP_DAYS - 1)
+    latest = BookDailyStats.objects.aggregate(Max("date"))["date__max"]
+    if latest and latest < start:
+        return latest
+    return start
+
+
+def get_totals(queryset):
+    return queryset.annotate(
+        **{f"total_{field}": Sum(field) for field in REPORT_FIELDS}
+    )
+
+
+def get_daily_report(start: date, end: date):
+    """Library-wide totals per day from `start` to `end`."""
+    return get_totals(
+        BookDailyStats.objects.filter(date__range=(start, end))
+        .values("date")
+        .order_by("date")
+    )
+
+
+def get_book_report(start: date, end: date, ordering: str, limit: int):
+    """The `limit` books with the highest `ordering` total in the range."""
+    return get_totals(
+        BookDailyStats.objects.filter(date__range=(start, end)).values(
+            "book_id", "book__title", "book__author"
+        )
+    ).order_by(f"-total_{ordering}", "book_id")[:limit]
@@ -0,0 +1,11 @@
+from celery import shared_task
+from django.utils import timezone
+
+from reporting.services import get_rollup_start, rollup_daily_stats
+
+
+@shared_task
+def rollup_reports() -> int:
+    """Refresh the daily stats of the last few days."""
+    today = timezone.now().date()
+    return rollup_daily_stats(get_rollup_start(today), today)
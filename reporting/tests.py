@@ -0,0 +1,180 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from book.models import Book
+from borrowing.models import Borrowing
+from payment.models import Payment
+from payment.services import save_status_changes
+from reporting.models import BookDailyStats
+from reporting.services import (
+    get_day_bounds,
+    get_rollup_start,
+    rollup_daily_stats,
+)
+from reporting.tasks import rollup_reports
+from user.models import User
+
+DAY = date(2026, 3, 10)
+
+
+class ReportingTests(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            email="admin@example.com", password="password"
+        )
+        self.user = User.objects.create_user(
+            email="reader@example.com", password="password"
+        )
+        self.dune = Book.objects.create(
+            title="Dune", author="Herbert", inventory=5, daily_fee=1
+        )
+        self.emma = Book.objects.create(
+            title="Emma", author="Austen", inventory=5, daily_fee=1
+        )
+        # Out the day before, returned on DAY
+        self.returned = self.borrow(
+            self.dune, DAY - timedelta(days=1), DAY + timedelta(days=3)
+        )
+        self.returned.actual_return_date = DAY
+        self.returned.save()
+        self.borrow(self.dune, DAY, DAY + timedelta(days=5))
+        # Due two days before DAY and still out
+        self.borrow(
+            self.emma, DAY - timedelta(days=9), DAY - timedelta(days=2)
+        )
+        self.pay(self.returned, Payment.Type.PAYMENT, "400.00", DAY)
+        self.pay(self.returned, Payment.Type.FINE, "150.00", DAY)
+        Payment.objects.create(
+            borrowing=self.returned, money_to_pay="999.00"
+        )
+
+    def borrow(self, book, borrow_date, expected_return_date):
+        borrowing = Borrowing.objects.create(
+            user=self.user, book=book, expected_return_date="2099-01-01"
+        )
+        Borrowing.objects.filter(pk=borrowing.pk).update(
+            borrow_date=borrow_date,
+            expected_return_date=expected_return_date,
+        )
+        borrowing.refresh_from_db()
+        return borrowing
+
+    def pay(self, borrowing, payment_type, amount, day):
+        return Payment.objects.create(
+            borrowing=borrowing,
+            type=payment_type,
+            status=Payment.Status.PAID,
+            money_to_pay=amount,
+            paid_at=get_day_bounds(day, day)[0],
+        )
+
+    def get_stats(self, book, day):
+        return BookDailyStats.objects.get(book=book, date=day)
+
+    def test_rollup_aggregates_each_book_and_day(self):
+        rows = rollup_daily_stats(DAY - timedelta(days=1), DAY)
+
+        self.assertEqual(rows, 4)
+        dune = self.get_stats(self.dune, DAY)
+        self.assertEqual(
+            (dune.checkouts, dune.returns, dune.overdue), (1, 1, 0)
+        )
+        self.assertEqual(dune.revenue, Decimal("400.00"))
+        self.assertEqual(dune.fines, Decimal("150.00"))
+        self.assertEqual(
+            self.get_stats(self.dune, DAY - timedelta(days=1)).checkouts, 1
+        )
+        emma = self.get_stats(self.emma, DAY)
+        self.assertEqual((emma.checkouts, emma.overdue), (0, 1))
+        self.assertEqual(
+            self.get_stats(self.emma, DAY - timedelta(days=1)).overdue, 1
+        )
+
+    def test_rollup_replaces_stale_rows(self):
+        rollup_daily_stats(DAY, DAY)
+        self.returned.payments.all().delete()
+        BookDailyStats.objects.filter(book=self.emma).update(checkouts=50)
+
+        rollup_daily_stats(DAY, DAY)
+
+        self.assertEqual(self.get_stats(self.dune, DAY).revenue, 0)
+        self.assertEqual(self.get_stats(self.emma, DAY).checkouts, 0)
+        self.assertEqual(BookDailyStats.objects.count(), 2)
+
+    def test_paid_payments_are_stamped(self):
+        payment = Payment.objects.get(status=Payment.Status.PENDING)
+        payment.status = Payment.Status.PAID
+        save_status_changes([payment])
+
+        payment.refresh_from_db()
+        self.assertIsNotNone(payment.paid_at)
+
+    def test_periodic_rollup_catches_up_from_latest_day(self):
+        today = timezone.now().date()
+        self.assertEqual(get_rollup_start(today), today - timedelta(days=1))
+
+        BookDailyStats.objects.create(book=self.dune, date=DAY)
+        self.assertEqual(get_rollup_start(today), DAY)
+
+        rollup_reports()
+        self.assertTrue(
+            BookDailyStats.objects.filter(date=today, book=self.emma).exists()
+        )
+
+    def test_daily_report(self):
+        rollup_daily_stats(DAY - timedelta(days=1), DAY)
+        self.client.force_authenticate(user=self.admin_user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                reverse("reports:reports-daily"),
+                {"start": DAY - timedelta(days=1), "end": DAY},
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["totals"],
+            {
+                "checkouts": 2,
+                "returns": 1,
+                "overdue": 2,
+                "revenue": "400.00",
+                "fines": "150.00",
+            },
+        )
+        self.assertEqual(
+            [day["date"] for day in response.data["days"]],
+            [str(DAY - timedelta(days=1)), str(DAY)],
+        )
+
+    def test_book_report_orders_by_requested_total(self):
+        rollup_daily_stats(DAY - timedelta(days=1), DAY)
+        self.client.force_authenticate(user=self.admin_user)
+        url = reverse("reports:reports-books")
+        params = {"start": DAY - timedelta(days=1), "end": DAY}
+
+        response = self.client.get(url, params)
+        self.assertEqual(
+            [(row["title"], row["checkouts"]) for row in response.data],
+            [("Dune", 2), ("Emma", 0)],
+        )
+
+        response = self.client.get(url, {**params, "ordering": "overdue"})
+        self.assertEqual(response.data[0]["title"], "Emma")
+
+    def test_reports_are_admin_only_and_validate_range(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(reverse("reports:reports-daily"))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.get(
+            reverse("reports:reports-daily"),
+            {"start": DAY, "end": DAY - timedelta(days=1)},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,10 @@
+from rest_framework.routers import DefaultRouter
+
+from reporting.views import ReportViewSet
+
+router = DefaultRouter()
+router.register(r"", ReportViewSet, basename="reports")
+
+urlpatterns = router.urls
+
+app_name = "reports"
@@ -0,0 +1,67 @@
+from drf_spectacular.utils import extend_schema
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from reporting.serializers import (
+    BookReportQuerySerializer,
+    BookReportRowSerializer,
+    DailyReportSerializer,
+    ReportRangeSerializer,
+)
+from reporting.services import (
+    REPORT_FIELDS,
+    get_book_report,
+    get_daily_report,
+)
+
+
+@extend_schema(tags=["Reports"])
+class ReportViewSet(viewsets.GenericViewSet):
+    """
+    Read-only reports over a date range, answered from the daily stats
+    kept by the `rollup_reports` task rather than the raw tables.
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get_query_params(self, serializer_class) -> dict:
+        serializer = serializer_class(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    @extend_schema(
+        summary="Daily activity report",
+        description="Checkouts, returns, overdue loans, revenue and fines"
+        " per day and in total. The range defaults to the last 30 days.",
+        parameters=[ReportRangeSerializer],
+        responses=DailyReportSerializer,
+    )
+    @action(detail=False, methods=["GET"], url_path="daily")
+    def daily(self, request):
+        params = self.get_query_params(ReportRangeSerializer)
+        days = list(get_daily_report(params["start"], params["end"]))
+        totals = {
+            f"total_{field}": sum(day[f"total_{field}"] for day in days)
+            for field in REPORT_FIELDS
+        }
+        serializer = DailyReportSerializer(
+            {**params, "totals": totals, "days": days}
+        )
+        return Response(serializer.data)
+
+    @extend_schema(
+        summary="Top books report",
+        description="Books with the highest total of `ordering` in the"
+        " range, e.g. the most borrowed titles or the most fined ones.",
+        parameters=[BookReportQuerySerializer],
+        responses=BookReportRowSerializer(many=True),
+    )
+    @action(detail=False, methods=["GET"], url_path="books")
+    def books(self, request):
+        params = self.get_query_params(BookReportQuerySerializer)
+        books = get_book_report(
+            params["start"], params["end"], params["ordering"], params["limit"]
+        )
+        return Response(BookReportRowSerializer(books, many=True).data)
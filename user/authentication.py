@@ -0,0 +1,99 @@
+"""
+JWT authentication without a user query on every request.
+
+Tokens are validated by simplejwt as before; only the user lookup that
+follows is replaced. Every user has a cache namespace whose version is
+bumped whenever the user is saved or deleted, so a password change,
+deactivation or new staff status is seen on the next request.
+
+`CachedJWTAuthentication` keeps the user resolved for a token for
+`AUTH_USER_CACHE_TIMEOUT` seconds, keyed by the user id and the
+namespace version. `StatelessJWTAuthentication` also skips the cache
+on list and retrieve requests, building the user from the token claims
+when the token was issued at the current namespace version.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from library_core.cache import get_namespace_version, invalidate_namespace
+from user.models import User
+
+USER_CLAIMS = ("email", "is_staff", "is_superuser")
+VERSION_CLAIM = "user_version"
+
+
+def get_user_namespace(user_id) -> str:
+    return f"auth:user:{user_id}"
+
+
+def invalidate_user(user_id) -> None:
+    """Drop cached resolutions of the user once the transaction commits."""
+    invalidate_namespace(get_user_namespace(user_id))
+
+
+def add_user_claims(token, user: User):
+    """Stamp `token` with the claims stateless reads build users from."""
+    for claim in USER_CLAIMS:
+        token[claim] = getattr(user, claim)
+    token[VERSION_CLAIM] = get_namespace_version(get_user_namespace(user.pk))
+    return token
+
+
+def build_user(user_id, validated_token) -> User:
+    """
+    A `User` with only the id and the claimed fields loaded. Other
+    fields are fetched on first access, and `save()` writes only the
+    loaded ones.
+    """
+    return User.from_db(
+        DEFAULT_DB_ALIAS,
+        ["id", "is_active", *USER_CLAIMS],
+        [user_id, True, *(validated_token[claim] for claim in USER_CLAIMS)],
+    )
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        version = get_namespace_version(get_user_namespace(user_id))
+        return self.resolve_user(validated_token, user_id, version)
+
+    def resolve_user(self, validated_token, user_id, version: int) -> User:
+        key = f"{get_user_namespace(user_id)}:{version}"
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+
+class StatelessJWTAuthentication(CachedJWTAuthentication):
+    """
+    Build the user of viewset list and retrieve requests from the token
+    claims. Other safe-method actions are not trusted to be read-only,
+    as GET `payments/success` and `payments/{id}/renew` write. Views
+    that need more of the user than its id, email and staff flags
+    should use `CachedJWTAuthentication`.
+    """
+
+    READ_ACTIONS = ("list", "retrieve")
+
+    def authenticate(self, request):
+        view = request.parser_context.get("view")
+        self.read_only = (
+            request.method in SAFE_METHODS
+            and getattr(view, "action", None) in self.READ_ACTIONS
+        )
+        return super().authenticate(request)
+
+    def resolve_user(self, validated_token, user_id, version):
+        if self.read_only and validated_token.get(VERSION_CLAIM) == version:
+            return build_user(user_id, validated_token)
+        return super().resolve_user(validated_token, user_id, version)
@@ -1,13 +1,21 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from rest_framework import status
 from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from user.serializers import TokenObtainPairSerializer
 
 
 CREATE_USER_URL = reverse("users:user_create")
 ME_URL = reverse("users:user_manage")
+TOKEN_URL = reverse("users:token_obtain_pair")
+PAYMENTS_URL = reverse("payments:payments-list")
 
 
 def create_user(**params):
@@ -116,3 +124,94 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.email, payload["email"])
         self.assertTrue(self.user.check_password(payload["password"]))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class JWTAuthenticationTests(TestCase):
+    """Test resolving token users from the cache and from claims"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user(email="jwt@test.com", password="testpass")
+        self.client = APIClient()
+        token = TokenObtainPairSerializer.get_token(self.user).access_token
+        self.authorize(str(token))
+
+    def authorize(self, token):
+        self.client.credentials(HTTP_AUTHORIZE=f"Bearer {token}")
+
+    def save_user(self, **fields):
+        for name, value in fields.items():
+            setattr(self.user, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+    def get_user_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(url)
+        table = get_user_model()._meta.db_table
+        return res, [q for q in queries if f'FROM "{table}"' in q["sql"]]
+
+    def test_login_token_carries_user_claims(self):
+        res = self.client.post(
+            TOKEN_URL, {"email": "jwt@test.com", "password": "testpass"}
+        )
+
+        token = AccessToken(res.data["access"])
+        self.assertEqual(token["email"], self.user.email)
+        self.assertFalse(token["is_staff"])
+        self.assertIn("user_version", token)
+
+    def test_user_is_cached_between_requests(self):
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data["email"], self.user.email)
+
+    def test_saved_user_is_resolved_again(self):
+        self.client.get(ME_URL)
+        self.save_user(first_name="Changed")
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data["first_name"], "Changed")
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(PAYMENTS_URL)
+        self.save_user(is_active=False)
+
+        res = self.client.get(PAYMENTS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_reads_build_user_from_claims(self):
+        res, user_queries = self.get_user_queries(PAYMENTS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(user_queries, [])
+
+    def test_claims_of_saved_user_are_not_trusted(self):
+        self.save_user(is_staff=True)
+
+        res, user_queries = self.get_user_queries(PAYMENTS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(user_queries), 1)
+
+    def test_token_without_claims_uses_cached_user(self):
+        self.authorize(str(AccessToken.for_user(self.user)))
+
+        _, first = self.get_user_queries(PAYMENTS_URL)
+        _, second = self.get_user_queries(PAYMENTS_URL)
+
+        self.assertEqual(len(first), 1)
+        self.assertEqual(second, [])
+
+    def test_actions_beyond_list_and_retrieve_load_the_user(self):
+        url = reverse("payments:payments-payment-renew", args=[0])
+
+        res, user_queries = self.get_user_queries(url)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(len(user_queries), 1)